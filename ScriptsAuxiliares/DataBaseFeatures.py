@@ -1,5 +1,6 @@
 import sqlalchemy as sa
 from conf.db_session import createSession
+from models.model_base import ModelBase
 
 
 class DataBaseFeatures:
@@ -26,3 +27,45 @@ class DataBaseFeatures:
             print(f'Erro ao tentar encontrar tabelas com FK para "{table_name}": {e}')
             return []
 
+    @staticmethod
+    def getDependenciasFk() -> dict[str, set[str]]:
+        """Monta o grafo de dependências entre as tabelas dos modelos a partir das FKs declaradas.
+        :return: dict[str, set[str]]: para cada tabela, o conjunto de tabelas referenciadas por suas FKs
+        """
+        # garante que todas as tabelas estejam registradas no metadata antes de montar o grafo
+        import models.__all_models
+
+        dependencias: dict[str, set[str]] = {}
+        for tabela in ModelBase.metadata.sorted_tables:
+            dependencias[tabela.name] = {fk.column.table.name for fk in tabela.foreign_keys
+                                         if fk.column.table.name != tabela.name}
+        return dependencias
+
+    @staticmethod
+    def getEstagiosFk(tabelas: list[str] = None,
+                      dependencias: dict[str, set[str]] = None) -> list[list[str]]:
+        """Agrupa as tabelas em estágios pela ordem das FKs: as tabelas de um estágio só dependem de tabelas
+        dos estágios anteriores, portanto as tabelas de um mesmo estágio são independentes entre si.
+        :param tabelas: list[str]: tabelas a considerar, por padrão todas as do grafo
+        :param dependencias: dict[str, set[str]]: grafo de dependências, por padrão o das FKs dos modelos (ver
+        getDependenciasFk)
+        :return: list[list[str]]: lista de estágios, cada um com os nomes das suas tabelas
+        :raises RuntimeError: Se existir dependência circular entre as tabelas
+        """
+        if dependencias is None:
+            dependencias = DataBaseFeatures.getDependenciasFk()
+        if tabelas is not None:
+            dependencias = {tabela: dependencias.get(tabela, set()) & set(tabelas) for tabela in tabelas}
+
+        estagios: list[list[str]] = []
+        resolvidas: set[str] = set()
+        pendentes = dict(dependencias)
+        while pendentes:
+            estagio = sorted(tabela for tabela, deps in pendentes.items() if deps <= resolvidas)
+            if not estagio:
+                raise RuntimeError(f'Dependência circular entre as tabelas: {sorted(pendentes)}')
+            for tabela in estagio:
+                del pendentes[tabela]
+            resolvidas.update(estagio)
+            estagios.append(estagio)
+        return estagios
@@ -0,0 +1,54 @@
+import argparse
+import sys
+import time
+
+from conf.backup import criarBackup, listarBackups, restaurarBackup
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Backup online do banco sqlite com a API de backup do sqlite, com '
+                                                 'rodízio dos arquivos, e restauração com troca atômica do arquivo.')
+    parser.add_argument('--banco', default=None, help='arquivo do banco, por padrão o da camada de acesso')
+    parser.add_argument('--diretorio', default=None, help='diretório dos backups, por padrão db_bk')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    backup = subparsers.add_parser('backup', help='cria um backup, ou um a cada --intervalo segundos')
+    backup.add_argument('--paginas-por-passo', type=int, default=256,
+                        help='páginas copiadas por passo, -1 para copiar tudo de uma vez')
+    backup.add_argument('--pausa-ms', type=float, default=5, help='pausa entre os passos, em milissegundos')
+    backup.add_argument('--manter', type=int, default=7, help='quantidade de backups mantidos, 0 para todos')
+    backup.add_argument('--intervalo', type=float, default=None,
+                        help='se informado, repete o backup a cada intervalo, em segundos, até ser interrompido')
+
+    restaurar = subparsers.add_parser('restaurar', help='substitui o banco por um backup')
+    restaurar.add_argument('backup', help='arquivo de backup')
+
+    subparsers.add_parser('listar', help='lista os backups do diretório')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+
+    if args.comando == 'listar':
+        for backup in listarBackups(args.diretorio):
+            print(f'{backup} ({backup.stat().st_size / 1024:.0f} KiB)')
+        return 0
+
+    if args.comando == 'restaurar':
+        restaurarBackup(args.backup, db_path=args.banco)
+        return 0
+
+    while True:
+        criarBackup(db_path=args.banco, diretorio=args.diretorio, paginas_por_passo=args.paginas_por_passo,
+                    pausa_ms=args.pausa_ms, manter=args.manter)
+        if args.intervalo is None:
+            return 0
+        try:
+            time.sleep(args.intervalo)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.crud import CENARIOS, OPERACOES, comparar, executar
+from benchmarks.gerador_base import gerar_base
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'benchmark')
+# O baseline versionado foi gerado com os bancos de 1.000 e 100.000 linhas por tabela e as iterações padrão:
+#     python benchmark_main.py --tamanhos 1000 100000 --salvar-baseline
+# Ele só é comparável com execuções dos mesmos tamanhos na mesma máquina, e deve ser regravado ao trocar de máquina.
+BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Mede latência (p50/p95/p99) e vazão das operações de CRUD de '
+                                                 'cada modelo em bancos com tamanhos diferentes e compara com um '
+                                                 'baseline.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[1_000, 100_000, 1_000_000],
+                        help='quantidade de linhas por tabela de cada banco medido')
+    parser.add_argument('--iteracoes', type=int, default=200, help='chamadas medidas por operação')
+    parser.add_argument('--iteracoes-select-all', type=int, default=5,
+                        help='chamadas medidas do select_all, que lê a tabela inteira')
+    parser.add_argument('--modelos', nargs='+', choices=sorted(CENARIOS), default=None,
+                        help='modelos a medir, por padrão todos')
+    parser.add_argument('--diretorio', default=DIRETORIO_PADRAO, help='diretório dos bancos gerados')
+    parser.add_argument('--reaproveitar-bases', action='store_true',
+                        help='usa os bancos já gerados no diretório em vez de gerá-los novamente')
+    parser.add_argument('--saida', default=None, help='arquivo JSON onde os resultados serão gravados')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO, help='arquivo JSON de referência para comparação')
+    parser.add_argument('--salvar-baseline', action='store_true',
+                        help='grava os resultados desta execução como o novo baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help='variação relativa do p50 tolerada antes de apontar regressão ou melhoria')
+    parser.add_argument('--falhar-em-regressao', action='store_true',
+                        help='termina com código de saída 1 caso alguma operação tenha regredido')
+    return parser.parse_args(argv)
+
+
+def _imprimir_resultados(resultados: dict) -> None:
+    print(f'\n{"linhas":>9} {"modelo":<26} {"operacao":<11} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"ops/s":>10} {"erros":>6}')
+    for tamanho, modelos in resultados.items():
+        for modelo, operacoes in modelos.items():
+            for operacao in OPERACOES:
+                if operacao not in operacoes:
+                    continue
+                r = operacoes[operacao]
+                print(f'{tamanho:>9} {modelo:<26} {operacao:<11} {r["p50_ms"]:>9.3f} {r["p95_ms"]:>9.3f} '
+                      f'{r["p99_ms"]:>9.3f} {r["ops_seg"]:>10.1f} {r["erros"]:>6}')
+
+
+def _imprimir_comparacao(comparacao: list[dict]) -> None:
+    alteradas = [c for c in comparacao if c['situacao'] != 'estavel']
+    print(f'\nComparação com o baseline: {len(comparacao)} operações, '
+          f'{sum(c["situacao"] == "regressao" for c in comparacao)} regressões, '
+          f'{sum(c["situacao"] == "melhoria" for c in comparacao)} melhorias')
+    for c in sorted(alteradas, key=lambda c: -abs(c['variacao'])):
+        print(f'  {c["situacao"].upper():<10} {c["tamanho"]:>9} {c["modelo"]:<26} {c["operacao"]:<11} '
+              f'{c["p50_ms_baseline"]:.3f} ms -> {c["p50_ms"]:.3f} ms ({c["variacao"]:+.1%})')
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+
+    resultados: dict[str, dict] = {}
+    for tamanho in args.tamanhos:
+        db_path = os.path.join(args.diretorio, f'benchmark_{tamanho}.sqlite')
+        # as operações de escrita alteram o banco, então cada execução parte de uma base nova, salvo se pedido
+        if not (args.reaproveitar_bases and Path(db_path).exists()):
+            gerar_base(db_path, tamanho)
+        resultados[str(tamanho)] = executar(db_path, tamanho, modelos=args.modelos, iteracoes=args.iteracoes,
+                                            iteracoes_select_all=args.iteracoes_select_all)
+
+    _imprimir_resultados(resultados)
+
+    documento = {'data': datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+                 'iteracoes': args.iteracoes, 'resultados': resultados}
+    saida = args.saida or os.path.join(args.diretorio, f'resultado_{datetime.now():%Y%m%d_%H%M%S}.json')
+    Path(saida).parent.mkdir(parents=True, exist_ok=True)
+    Path(saida).write_text(json.dumps(documento, indent=2), encoding='utf-8')
+    print(f'\nResultados gravados em {saida}')
+
+    regressoes = 0
+    if Path(args.baseline).exists():
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        comparacao = comparar(resultados, baseline['resultados'], tolerancia=args.tolerancia)
+        _imprimir_comparacao(comparacao)
+        regressoes = sum(c['situacao'] == 'regressao' for c in comparacao)
+    else:
+        print(f'\nBaseline {args.baseline} não encontrado, nenhuma comparação feita')
+
+    if args.salvar_baseline:
+        Path(args.baseline).write_text(json.dumps(documento, indent=2), encoding='utf-8')
+        print(f'Baseline atualizado em {args.baseline}')
+
+    return 1 if (args.falhar_em_regressao and regressoes) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
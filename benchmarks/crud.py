@@ -0,0 +1,356 @@
+# Este módulo mede a latência e a vazão dos métodos de CRUD de cada modelo sobre um banco gerado por
+# benchmarks.gerador_base. Os métodos são chamados exatamente como a aplicação os chama (createSession, validações,
+# carregamento dos relacionamentos e prints), então mudanças nessas camadas aparecem como regressão ou ganho.
+
+import contextlib
+import math
+import os
+import random
+from time import perf_counter_ns
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+
+from benchmarks.gerador_base import fk_associada
+from conf.db_session import createEngine, disposeEngine
+from models.aditivo_nutritivo import AditivoNutritivo
+from models.aditivo_nutritivo_picole import AditivoNutritivoPicole
+from models.conservante import Conservante
+from models.conservante_picole import ConservantePicole
+from models.ingrediente import Ingrediente
+from models.ingrediente_picole import IngredientePicole
+from models.lote import Lote
+from models.lote_nota_fiscal import LoteNotaFiscal
+from models.nota_fiscal import NotaFiscal
+from models.picole import Picole
+from models.revendedor import Revendedor
+from models.sabor import Sabor
+from models.tipo_embalagem import TipoEmbalagem
+from models.tipo_picole import TipoPicole
+
+# Ordem em que as operações são medidas. As inserções vêm primeiro porque update e delete atuam somente sobre os
+# registros inseridos pelo próprio benchmark, preservando os dados gerados (e as FKs que apontam para eles).
+OPERACOES: list[str] = ['insert', 'select_id', 'select_fk', 'select_all', 'update', 'delete']
+
+
+class ContextoBenchmark:
+    """Estado compartilhado entre as operações de um modelo durante uma rodada do benchmark"""
+
+    def __init__(self, linhas: int, semente: int = 42):
+        """
+        :param linhas: int: quantidade de registros por tabela no banco gerado
+        :param semente: int: semente do gerador de números aleatórios, para rodadas reproduzíveis
+        """
+        self.linhas = linhas
+        self.aleatorio = random.Random(semente)
+        self.inseridos: list[int] = []
+        self.extra: dict = {}
+
+    def idAleatorio(self) -> int:
+        """:return: int: id de um registro gerado, escolhido ao acaso"""
+        return self.aleatorio.randint(1, self.linhas)
+
+    def inserido(self, k: int) -> int:
+        """:return: int: id do k-ésimo registro inserido pelo benchmark"""
+        return self.inseridos[k % len(self.inseridos)]
+
+
+def _preparar_lotes(contexto: ContextoBenchmark, quantidade: int) -> None:
+    """Cria lotes ainda não vinculados a notas fiscais, já que cada lote só pode estar em uma nota fiscal"""
+    tabela = Lote.__table__
+    with createEngine().begin() as conexao:
+        inicio = conexao.execute(sa.select(sa.func.max(tabela.c.id))).scalar() or 0
+        conexao.execute(tabela.insert(), [{'picole_fk': contexto.idAleatorio(), 'quantidade': 1}
+                                          for _ in range(quantidade)])
+    contexto.extra['lotes'] = list(range(inicio + 1, inicio + quantidade + 1))
+
+
+# Cada cenário descreve como exercitar as operações de um modelo. A chave 'preparar', quando existe, roda antes das
+# medições e fora delas. Operações ausentes (como select_fk nas tabelas sem FK) não são medidas.
+CENARIOS: dict[str, dict[str, Callable]] = {
+    'aditivo_nutritivo': {
+        'insert': lambda ctx, k: AditivoNutritivo.insertAditivoNutritivo(nome=f'BENCH ADITIVO {k}',
+                                                                         formula_quimica=f'BENCH FORMULA {k}'),
+        'select_id': lambda ctx, k: AditivoNutritivo.selectAditivoNutritivoPorId(
+            id_aditivo_nutritivo=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: AditivoNutritivo.selectAllAditivosNutritivos(),
+        'update': lambda ctx, k: AditivoNutritivo.updateAditivoNutritivo(id_aditivo_nutritivo=ctx.inserido(k),
+                                                                         nome=f'BENCH ADITIVO UPD {k}'),
+        'delete': lambda ctx, k: AditivoNutritivo.deleteAditivoNutritivoById(id_aditivo_nutritivo=ctx.inserido(k)),
+    },
+    'conservante': {
+        'insert': lambda ctx, k: Conservante.insertConservante(nome=f'BENCH CONSERVANTE {k}',
+                                                               descricao=f'BENCH DESCRICAO {k}'),
+        'select_id': lambda ctx, k: Conservante.selectConservantePorID(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Conservante.selectAllConservantes(),
+        'update': lambda ctx, k: Conservante.updateConservante(id_conservante=ctx.inserido(k),
+                                                               nome=f'BENCH CONSERVANTE UPD {k}'),
+        'delete': lambda ctx, k: Conservante.deleteConservanteById(id_conservante=ctx.inserido(k)),
+    },
+    'ingrediente': {
+        'insert': lambda ctx, k: Ingrediente.insertIngrediente(nome=f'BENCH INGREDIENTE {k}'),
+        'select_id': lambda ctx, k: Ingrediente.selectIngredientePorId(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Ingrediente.selectAllIngredientes(),
+        'update': lambda ctx, k: Ingrediente.updateIngrediente(id_ingrediente=ctx.inserido(k),
+                                                               nome=f'BENCH INGREDIENTE UPD {k}'),
+        'delete': lambda ctx, k: Ingrediente.deleteIngredienteById(id_ingrediente=ctx.inserido(k)),
+    },
+    'revendedor': {
+        'insert': lambda ctx, k: Revendedor.insertRevendedor(nome=f'BENCH REVENDEDOR {k}', cnpj=f'B{k:013d}',
+                                                             razao_social=f'BENCH RAZAO {k}',
+                                                             contato=f'BENCH CONTATO {k}'),
+        'select_id': lambda ctx, k: Revendedor.selectRevendedorPorId(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Revendedor.selectAllRevendedores(),
+        'update': lambda ctx, k: Revendedor.updateRevendedor(id_revendedor=ctx.inserido(k),
+                                                             nome=f'BENCH REVENDEDOR UPD {k}', cnpj=f'U{k:013d}',
+                                                             razao_social=f'BENCH RAZAO UPD {k}',
+                                                             contato=f'BENCH CONTATO UPD {k}'),
+        'delete': lambda ctx, k: Revendedor.deleteRevendedorById(id_revendedor=ctx.inserido(k)),
+    },
+    'sabor': {
+        'insert': lambda ctx, k: Sabor.insertSabor(nome=f'BENCH SABOR {k}'),
+        'select_id': lambda ctx, k: Sabor.selectSaborPorId(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Sabor.selectAllSabores(),
+        'update': lambda ctx, k: Sabor.updateSabor(id_sabor=ctx.inserido(k), nome=f'BENCH SABOR UPD {k}'),
+        'delete': lambda ctx, k: Sabor.deleteSaborById(id_sabor=ctx.inserido(k)),
+    },
+    'tipo_embalagem': {
+        'insert': lambda ctx, k: TipoEmbalagem.insertTipoEmbalagem(nome=f'BENCH EMBALAGEM {k}'),
+        'select_id': lambda ctx, k: TipoEmbalagem.selectTipoEmbalagemPorId(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: TipoEmbalagem.selectAllTipoEmbalagens(),
+        'update': lambda ctx, k: TipoEmbalagem.updateTipoEmbalagem(id_tipo_embalagem=ctx.inserido(k),
+                                                                   nome=f'BENCH EMBALAGEM UPD {k}'),
+        'delete': lambda ctx, k: TipoEmbalagem.deleteTipoEmbalagemById(id_tipo_embalagem=ctx.inserido(k)),
+    },
+    'tipo_picole': {
+        'insert': lambda ctx, k: TipoPicole.insertTipoPicole(nome=f'BENCH TIPO {k}'),
+        'select_id': lambda ctx, k: TipoPicole.selectTipoPicolePorId(id=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: TipoPicole.selectAllTipoPicoles(),
+        'update': lambda ctx, k: TipoPicole.updateTipoPicole(id_tipo_picole=ctx.inserido(k),
+                                                             nome=f'BENCH TIPO UPD {k}'),
+        'delete': lambda ctx, k: TipoPicole.deleteTipoPicoleById(id_tipo_picole=ctx.inserido(k)),
+    },
+    'nota_fiscal': {
+        'insert': lambda ctx, k: NotaFiscal.insertNotaFiscal(valor=10.5, numero_serie=f'BENCH NF {k}',
+                                                             descricao=f'BENCH NOTA {k}',
+                                                             revendedor_fk=ctx.idAleatorio()),
+        'select_id': lambda ctx, k: NotaFiscal.selectNotaFiscalPorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: NotaFiscal.selectNotasFiscaisPorRevendedorFk(revendedor_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: NotaFiscal.selectAllNotasFiscal(),
+        'update': lambda ctx, k: NotaFiscal.updateNotaFiscal(id_nf=ctx.inserido(k), valor=20.5,
+                                                             revendedor_fk=ctx.idAleatorio(),
+                                                             numero_serie=f'BENCH NF UPD {k}'),
+        'delete': lambda ctx, k: NotaFiscal.deleteNotaFiscalById(id_nota_fiscal=ctx.inserido(k)),
+    },
+    'picole': {
+        # o sabor varia a cada inserção e o deslocamento 1 no tipo_picole evita as combinações já geradas
+        'insert': lambda ctx, k: Picole.insertPicole(preco=3.5, sabor_fk=(k % ctx.linhas) + 1,
+                                                     tipo_embalagem_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas),
+                                                     tipo_picole_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 1)),
+        'select_id': lambda ctx, k: Picole.selectPicolePorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: Picole.selectPicolePorSabor(sabor_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Picole.selectAllPicoles(),
+        'update': lambda ctx, k: Picole.updatePicole(id_picole=ctx.inserido(k), preco=4.5,
+                                                     sabor_fk=(k % ctx.linhas) + 1,
+                                                     tipo_embalagem_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas),
+                                                     tipo_picole_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 2)),
+        'delete': lambda ctx, k: Picole.deletePicoleById(id_picole=ctx.inserido(k)),
+    },
+    'lote': {
+        'insert': lambda ctx, k: Lote.insertLote(picole_fk=ctx.idAleatorio(), quantidade=10),
+        'select_id': lambda ctx, k: Lote.selectLotePorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: Lote.selectLotesPorPicoleFk(picole_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: Lote.selectAllLotes(),
+        'update': lambda ctx, k: Lote.updateLote(id_lote=ctx.inserido(k), picole_fk=None, quantidade=20),
+        'delete': lambda ctx, k: Lote.deleteLoteById(id_lote=ctx.inserido(k)),
+    },
+    'ingrediente_picole': {
+        'insert': lambda ctx, k: IngredientePicole.insertIngredientePicole(
+            picole_fk=(k % ctx.linhas) + 1, ingrediente_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 1)),
+        'select_id': lambda ctx, k: IngredientePicole.selectIngredientePicolePorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: IngredientePicole.selectAllIngPicPorPicoleFK(picole_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: IngredientePicole.selectAllIngredientePicole(),
+        'update': lambda ctx, k: IngredientePicole.updateIngredientePicole(
+            id_ing_picole=ctx.inserido(k), picole_fk=None,
+            ingrediente_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 2)),
+        'delete': lambda ctx, k: IngredientePicole.deleteIngredientePicoleById(id_ingr_picole=ctx.inserido(k)),
+    },
+    'conservante_picole': {
+        'insert': lambda ctx, k: ConservantePicole.insertConservantePicole(
+            picole_fk=(k % ctx.linhas) + 1, conservante_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 1)),
+        'select_id': lambda ctx, k: ConservantePicole.selectConservantePicolePorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: ConservantePicole.selectAllConservantePicolePorPicole(
+            picole_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: ConservantePicole.selectAllConservantePicole(),
+        'update': lambda ctx, k: ConservantePicole.updateConservantePicole(
+            id_cons_picole=ctx.inserido(k), picole_fk=None,
+            conservante_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 2)),
+        'delete': lambda ctx, k: ConservantePicole.deleteConservantePicoleById(id_cons_picole=ctx.inserido(k)),
+    },
+    'aditivo_nutritivo_picole': {
+        'insert': lambda ctx, k: AditivoNutritivoPicole.insertAditivoNutritivoPicole(
+            picole_fk=(k % ctx.linhas) + 1, aditivo_nutritivo_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 1)),
+        'select_id': lambda ctx, k: AditivoNutritivoPicole.selectAditivoNutritivoPorId(
+            id_adit_nutritivo=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: AditivoNutritivoPicole.selectAllAdiNutPicPorPicoleFK(picole_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: AditivoNutritivoPicole.selectAllAditivoNutritivoPicole(),
+        'update': lambda ctx, k: AditivoNutritivoPicole.updateAditivoNutritivoPicole(
+            id_adit_nut_picole=ctx.inserido(k), picole_fk=None,
+            aditivo_nutritivo_fk=fk_associada((k % ctx.linhas) + 1, ctx.linhas, 2)),
+        'delete': lambda ctx, k: AditivoNutritivoPicole.deleteAditivoNutritivoPicoleById(
+            id_adit_nut_picole=ctx.inserido(k)),
+    },
+    'lote_nota_fiscal': {
+        'preparar': lambda ctx, iteracoes: _preparar_lotes(ctx, iteracoes),
+        'insert': lambda ctx, k: LoteNotaFiscal.insertLoteNotaFiscal(nota_fiscal_fk=ctx.idAleatorio(),
+                                                                     lote_fk=ctx.extra['lotes'][k]),
+        'select_id': lambda ctx, k: LoteNotaFiscal.selectLoteNotaFiscalPorId(id=ctx.idAleatorio()),
+        'select_fk': lambda ctx, k: LoteNotaFiscal.selectAllLoteNotaFiscalPorNotaFiscal(
+            nota_fiscal_fk=ctx.idAleatorio()),
+        'select_all': lambda ctx, k: LoteNotaFiscal.selectAllLoteNotaFiscal(),
+        'update': lambda ctx, k: LoteNotaFiscal.updateLoteNotaFiscal(id_lote_nf=ctx.inserido(k), lote_fk=None,
+                                                                     nota_fiscal_fk=ctx.idAleatorio()),
+        'delete': lambda ctx, k: LoteNotaFiscal.deleteLoteNotaFiscalById(id_lote_nf=ctx.inserido(k)),
+    },
+}
+
+
+def percentil(amostras_ordenadas: list[float], p: float) -> float:
+    """Percentil pelo método nearest-rank
+    :param amostras_ordenadas: list[float]: amostras em ordem crescente
+    :param p: float: percentil desejado, entre 0 e 100
+    :return: float: valor do percentil, 0.0 se não houver amostras
+    """
+    if not amostras_ordenadas:
+        return 0.0
+    posicao = max(math.ceil(p / 100 * len(amostras_ordenadas)) - 1, 0)
+    return amostras_ordenadas[posicao]
+
+
+def resumir(latencias_ns: list[int], erros: int = 0) -> dict[str, float]:
+    """Resume as latências medidas de uma operação
+    :param latencias_ns: list[int]: latência de cada chamada, em nanossegundos
+    :param erros: int: quantidade de chamadas que falharam
+    :return: dict[str, float]: quantidade de chamadas, erros, p50/p95/p99/média/máximo em ms e operações por segundo
+    """
+    ordenadas = sorted(latencias_ns)
+    total_ns = sum(ordenadas)
+    return {
+        'chamadas': len(ordenadas),
+        'erros': erros,
+        'p50_ms': percentil(ordenadas, 50) / 1e6,
+        'p95_ms': percentil(ordenadas, 95) / 1e6,
+        'p99_ms': percentil(ordenadas, 99) / 1e6,
+        'media_ms': (total_ns / len(ordenadas)) / 1e6 if ordenadas else 0.0,
+        'max_ms': (ordenadas[-1] / 1e6) if ordenadas else 0.0,
+        'ops_seg': (len(ordenadas) / (total_ns / 1e9)) if total_ns else 0.0,
+    }
+
+
+def _medir(operacao: Callable, contexto: ContextoBenchmark, iteracoes: int,
+           ao_concluir: Optional[Callable] = None) -> dict[str, float]:
+    """Executa a operação iteracoes vezes e mede cada chamada. Falhas (exceções ou None, que é como os métodos de
+    inserção reportam erros inesperados) são contadas como erros e não entram nas latências.
+    """
+    latencias: list[int] = []
+    erros = 0
+    for k in range(iteracoes):
+        inicio = perf_counter_ns()
+        try:
+            resultado = operacao(contexto, k)
+        except Exception:
+            erros += 1
+            continue
+        duracao = perf_counter_ns() - inicio
+        if resultado is None:
+            erros += 1
+            continue
+        latencias.append(duracao)
+        if ao_concluir is not None:
+            ao_concluir(resultado)
+    return resumir(latencias, erros)
+
+
+def executar_modelo(modelo: str, linhas: int, iteracoes: int = 200,
+                    iteracoes_select_all: int = 5) -> dict[str, dict[str, float]]:
+    """Mede as operações de CRUD de um modelo sobre o banco configurado na engine atual
+    :param modelo: str: nome da tabela do modelo, chave de CENARIOS
+    :param linhas: int: quantidade de registros por tabela no banco
+    :param iteracoes: int: chamadas medidas por operação
+    :param iteracoes_select_all: int: chamadas medidas do select_all, que lê a tabela inteira
+    :return: dict[str, dict[str, float]]: resumo de cada operação
+    """
+    cenario = CENARIOS[modelo]
+    contexto = ContextoBenchmark(linhas=linhas)
+    iteracoes = min(iteracoes, linhas)
+    if 'preparar' in cenario:
+        cenario['preparar'](contexto, iteracoes)
+
+    resultados: dict[str, dict[str, float]] = {}
+    # os métodos dos modelos imprimem cada operação, o que poluiria a saída e não é o que se quer medir aqui
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        # aquece a engine e o cache de compilação do SQLAlchemy antes das medições
+        for k in range(min(5, iteracoes)):
+            cenario['select_id'](contexto, k)
+
+        for operacao in OPERACOES:
+            if operacao not in cenario:
+                continue
+            if operacao in ('update', 'delete') and not contexto.inseridos:
+                continue
+            vezes = iteracoes_select_all if operacao == 'select_all' else iteracoes
+            if operacao in ('update', 'delete'):
+                vezes = min(vezes, len(contexto.inseridos))
+            ao_concluir = (lambda objeto: contexto.inseridos.append(objeto.id)) if operacao == 'insert' else None
+            resultados[operacao] = _medir(cenario[operacao], contexto, vezes, ao_concluir)
+    return resultados
+
+
+def executar(db_path: str, linhas: int, modelos: Optional[list[str]] = None, iteracoes: int = 200,
+             iteracoes_select_all: int = 5) -> dict[str, dict[str, dict[str, float]]]:
+    """Aponta a camada de modelos para o banco informado e mede todos os modelos
+    :param db_path: str: caminho do banco gerado por benchmarks.gerador_base
+    :param linhas: int: quantidade de registros por tabela no banco
+    :param modelos: list[str]: modelos a medir, por padrão todos os de CENARIOS
+    :param iteracoes: int: chamadas medidas por operação
+    :param iteracoes_select_all: int: chamadas medidas do select_all
+    :return: dict[str, dict[str, dict[str, float]]]: resumo de cada operação de cada modelo
+    """
+    disposeEngine()
+    createEngine(sqlite=True, db_path=db_path)
+    try:
+        resultados = {}
+        for modelo in modelos or list(CENARIOS):
+            print(f'Medindo {modelo} ({linhas} linhas)...')
+            resultados[modelo] = executar_modelo(modelo, linhas, iteracoes, iteracoes_select_all)
+        return resultados
+    finally:
+        disposeEngine()
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float = 0.10) -> list[dict]:
+    """Compara os resultados com um baseline, operação a operação, pelo p50 da latência
+    :param atual: dict: resultados no formato {tamanho: {modelo: {operacao: resumo}}}
+    :param baseline: dict: resultados de referência no mesmo formato
+    :param tolerancia: float: variação relativa do p50 abaixo da qual a operação é considerada estável
+    :return: list[dict]: uma entrada por operação presente nos dois resultados, com a variação e a classificação
+    (regressao, melhoria ou estavel)
+    """
+    comparacao = []
+    for tamanho, modelos in atual.items():
+        for modelo, operacoes in modelos.items():
+            for operacao, resumo in operacoes.items():
+                referencia = baseline.get(tamanho, {}).get(modelo, {}).get(operacao)
+                if not referencia or not referencia.get('p50_ms') or not resumo.get('chamadas'):
+                    continue
+                variacao = (resumo['p50_ms'] - referencia['p50_ms']) / referencia['p50_ms']
+                if variacao > tolerancia:
+                    situacao = 'regressao'
+                elif variacao < -tolerancia:
+                    situacao = 'melhoria'
+                else:
+                    situacao = 'estavel'
+                comparacao.append({'tamanho': tamanho, 'modelo': modelo, 'operacao': operacao,
+                                   'p50_ms_baseline': referencia['p50_ms'], 'p50_ms': resumo['p50_ms'],
+                                   'variacao': variacao, 'situacao': situacao})
+    return comparacao
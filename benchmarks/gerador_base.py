@@ -0,0 +1,102 @@
+# Este módulo gera bancos sqlite sintéticos, com uma quantidade fixa de linhas por tabela, usados pelos benchmarks e
+# pelo simulador de carga. As linhas são determinísticas (derivadas do número da linha), então as FKs sempre apontam
+# para registros existentes e as chaves únicas nunca se repetem, e são inseridas via Core em lotes, sem passar pelos
+# métodos dos modelos, para que a geração de 1M de linhas leve segundos e não horas.
+
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+import sqlalchemy as sa
+
+from models.model_base import ModelBase
+
+
+def fk_associada(linha: int, linhas: int, deslocamento: int = 0) -> int:
+    """Calcula uma FK determinística para a linha, espalhada pelos ids de 1 a linhas. Deslocamentos diferentes
+    geram valores diferentes para a mesma linha, o que permite criar combinações novas sem violar chaves únicas.
+    :param linha: int: número da linha
+    :param linhas: int: quantidade de linhas da tabela referenciada
+    :param deslocamento: int: deslocamento aplicado ao valor
+    :return: int: id entre 1 e linhas
+    """
+    return ((linha * 7 + deslocamento) % linhas) + 1
+
+
+def _linhas_tabelas(linhas: int, agora: datetime) -> dict[str, Callable[[int], dict]]:
+    """Funções que geram o registro número i de cada tabela"""
+    datas = {'data_criacao': agora, 'data_atualizacao': agora}
+    return {
+        'aditivo_nutritivo': lambda i: {'nome': f'ADITIVO {i}', 'formula_quimica': f'FORMULA {i}', **datas},
+        'conservante': lambda i: {'nome': f'CONSERVANTE {i}', 'descricao': f'DESCRICAO {i}', **datas},
+        'ingrediente': lambda i: {'nome': f'INGREDIENTE {i}', **datas},
+        'revendedor': lambda i: {'nome': f'REVENDEDOR {i}', 'cnpj': f'{i:014d}',
+                                 'razao_social': f'RAZAO SOCIAL {i}', 'contato': f'CONTATO {i}', **datas},
+        'sabor': lambda i: {'nome': f'SABOR {i}', **datas},
+        'tipo_embalagem': lambda i: {'nome': f'EMBALAGEM {i}', **datas},
+        'tipo_picole': lambda i: {'nome': f'TIPO {i}', **datas},
+        'nota_fiscal': lambda i: {'valor': round(10 + (i % 990) + 0.25, 2), 'numero_serie': f'NF{i:012d}',
+                                  'descricao': f'NOTA FISCAL {i}', 'revendedor_fk': fk_associada(i, linhas),
+                                  **datas},
+        'picole': lambda i: {'preco': round(1 + (i % 9) + 0.5, 2), 'sabor_fk': i,
+                             'tipo_embalagem_fk': fk_associada(i, linhas), 'tipo_picole_fk': fk_associada(i, linhas),
+                             'sabor_tipoPicole_tipoEmbalagem': f'{i}_{fk_associada(i, linhas)}_'
+                                                               f'{fk_associada(i, linhas)}',
+                             **datas},
+        'lote': lambda i: {'picole_fk': fk_associada(i, linhas), 'quantidade': (i % 100) + 1, **datas},
+        'ingrediente_picole': lambda i: {'picole_fk': i, 'ingrediente_fk': fk_associada(i, linhas),
+                                         'ingrediente_picole': f'{fk_associada(i, linhas)}-{i}', **datas},
+        'conservante_picole': lambda i: {'picole_fk': i, 'conservante_fk': fk_associada(i, linhas),
+                                         'conservante_picole': f'{fk_associada(i, linhas)}-{i}', **datas},
+        'aditivo_nutritivo_picole': lambda i: {'picole_fk': i, 'aditivo_nutritivo_fk': fk_associada(i, linhas),
+                                               'picole_aditivo_nutritivo': f'{i}-{fk_associada(i, linhas)}',
+                                               **datas},
+        'lote_nota_fiscal': lambda i: {'lote_fk': i, 'nota_fiscal_fk': fk_associada(i, linhas),
+                                       'lote_nota_fiscal': f'{i}-{fk_associada(i, linhas)}', **datas},
+    }
+
+
+def gerar_base(db_path: str, linhas: int, tamanho_lote: int = 50_000, sobrescrever: bool = True) -> dict[str, int]:
+    """Cria um banco sqlite com o schema dos modelos e linhas registros em cada tabela de domínio
+    :param db_path: str: caminho do arquivo do banco a ser gerado
+    :param linhas: int: quantidade de registros por tabela
+    :param tamanho_lote: int: quantidade de registros inseridos por comando
+    :param sobrescrever: bool: se True, apaga o arquivo caso ele já exista
+    :return: dict[str, int]: quantidade de registros inseridos por tabela
+    :raises ValueError: Se linhas ou tamanho_lote não forem positivos
+    """
+    if linhas <= 0 or tamanho_lote <= 0:
+        raise ValueError('linhas e tamanho_lote devem ser maiores que zero!')
+
+    # garante que todas as tabelas estejam registradas no metadata
+    import models.__all_models
+
+    caminho = Path(db_path)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    if sobrescrever and caminho.exists():
+        caminho.unlink()
+
+    engine = sa.create_engine(f'sqlite:///{caminho}')
+    ModelBase.metadata.create_all(engine)
+    geradores = _linhas_tabelas(linhas, datetime.now())
+
+    inseridas: dict[str, int] = {}
+    inicio = perf_counter()
+    with engine.connect() as conexao:
+        # o banco é descartável, então durabilidade não importa durante a geração
+        conexao.exec_driver_sql('PRAGMA journal_mode=OFF')
+        conexao.exec_driver_sql('PRAGMA synchronous=OFF')
+        for tabela in ModelBase.metadata.sorted_tables:
+            if tabela.name not in geradores:
+                continue
+            gerar = geradores[tabela.name]
+            with conexao.begin():
+                for primeira in range(1, linhas + 1, tamanho_lote):
+                    ultima = min(primeira + tamanho_lote, linhas + 1)
+                    conexao.execute(tabela.insert(), [gerar(i) for i in range(primeira, ultima)])
+            inseridas[tabela.name] = linhas
+
+    engine.dispose()
+    print(f'Base {caminho} gerada com {linhas} linhas por tabela em {perf_counter() - inicio:.1f}s')
+    return inseridas
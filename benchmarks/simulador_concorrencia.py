@@ -0,0 +1,254 @@
+# Este módulo simula carga concorrente sobre os métodos de CRUD dos modelos para reproduzir a disputa de locks do
+# sqlite ("database is locked" e latências de cauda longa). N threads ou processos executam, por um tempo fixo, uma
+# mistura configurável das operações de benchmarks.crud sobre um banco gerado, e o resultado traz vazão, percentis de
+# latência, tempo de espera por lock e erros de lock por operação, permitindo comparar journal_mode, pool e timeout.
+
+import contextlib
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter, perf_counter_ns
+from typing import Optional
+
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool
+
+from benchmarks.crud import CENARIOS, ContextoBenchmark, resumir
+from conf.db_session import createEngine, disposeEngine
+
+POOLS: dict[str, type] = {'null': NullPool, 'queue': QueuePool, 'singleton': SingletonThreadPool}
+
+MISTURA_PADRAO: dict[str, int] = {'select_id': 50, 'select_fk': 20, 'insert': 15, 'update': 10, 'delete': 5}
+
+ESCRITAS = ('insert', 'update', 'delete')
+
+# mesmos intervalos, em ms, usados pelo busy handler padrão do sqlite (sqliteDefaultBusyCallback)
+_ESPERAS_MS = (1, 2, 5, 10, 15, 20, 25, 25, 25, 50, 50, 100)
+
+# contadores da operação em andamento em cada thread, preenchidos pelas conexões instrumentadas
+_estado = threading.local()
+
+
+def _zerar_estado() -> None:
+    _estado.espera_ns = 0
+    _estado.erros_lock = 0
+
+
+def _somar_espera(espera_ns: int, erro_lock: bool = False) -> None:
+    _estado.espera_ns = getattr(_estado, 'espera_ns', 0) + espera_ns
+    _estado.erros_lock = getattr(_estado, 'erros_lock', 0) + int(erro_lock)
+
+
+def _executar_aguardando_lock(espera_maxima: float, funcao, *args):
+    """Executa a chamada ao sqlite repetindo-a enquanto o banco estiver bloqueado, como faria o busy handler do
+    sqlite, mas contabilizando o tempo de espera e os estouros do timeout na thread atual.
+    """
+    inicio = None
+    tentativa = 0
+    while True:
+        try:
+            resultado = funcao(*args)
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            if inicio is None:
+                inicio = perf_counter_ns()
+            espera = _ESPERAS_MS[min(tentativa, len(_ESPERAS_MS) - 1)] / 1000
+            if (perf_counter_ns() - inicio) / 1e9 + espera > espera_maxima:
+                _somar_espera(perf_counter_ns() - inicio, erro_lock=True)
+                raise
+            time.sleep(espera)
+            tentativa += 1
+        else:
+            if inicio is not None:
+                _somar_espera(perf_counter_ns() - inicio)
+            return resultado
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que aguarda o lock do banco medindo a espera, no lugar do busy handler do sqlite"""
+
+    def execute(self, sql, parameters=()):
+        return _executar_aguardando_lock(self.connection.espera_maxima, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _executar_aguardando_lock(self.connection.espera_maxima, super().executemany, sql, seq_of_parameters)
+
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """Conexão sqlite que desliga o busy handler nativo (timeout=0) e o reproduz em Python, nos cursores e no commit,
+    para que o tempo gasto esperando locks e os erros de lock possam ser atribuídos à operação que os sofreu.
+    """
+
+    def __init__(self, *args, timeout: float = 5.0, **kwargs):
+        super().__init__(*args, timeout=0, **kwargs)
+        self.espera_maxima = timeout
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def commit(self):
+        return _executar_aguardando_lock(self.espera_maxima, super().commit)
+
+
+def configurar_engine(db_path: str, journal_mode: Optional[str] = None, pool: str = 'null',
+                      timeout: float = 30, trabalhadores: int = 1) -> None:
+    """Aponta a camada de modelos para o banco informado usando conexões instrumentadas
+    :param db_path: str: caminho do banco gerado por benchmarks.gerador_base
+    :param journal_mode: str: journal_mode das conexões (DELETE, WAL, ...), por padrão o do arquivo
+    :param pool: str: pool de conexões, uma das chaves de POOLS
+    :param timeout: float: tempo máximo, em segundos, que cada comando aguarda o lock do banco
+    :param trabalhadores: int: quantidade de threads, usada como tamanho do QueuePool
+    """
+    disposeEngine()
+    createEngine(sqlite=True, db_path=db_path, timeout=timeout, journal_mode=journal_mode,
+                 poolclass=POOLS[pool], pool_size=trabalhadores if pool == 'queue' else None,
+                 connect_args={'factory': ConexaoInstrumentada})
+
+
+def _escolhas(mistura: dict[str, int], modelos: list[str]) -> tuple[list[tuple[str, str]], list[int]]:
+    """Pares (modelo, operação) sorteáveis e seus pesos. Modelos que precisam de preparação antes das inserções
+    (lote_nota_fiscal consome um lote novo a cada inserção) participam apenas das leituras.
+    """
+    escolhas, pesos = [], []
+    for modelo in modelos:
+        cenario = CENARIOS[modelo]
+        for operacao, peso in mistura.items():
+            if operacao not in cenario or ('preparar' in cenario and operacao in ESCRITAS):
+                continue
+            escolhas.append((modelo, operacao))
+            pesos.append(peso)
+    if not escolhas:
+        raise ValueError('Nenhuma operação da mistura se aplica aos modelos informados!')
+    return escolhas, pesos
+
+
+def _trabalhar(indice: int, config: dict) -> dict[str, dict]:
+    """Laço de um trabalhador (thread ou processo): sorteia e executa operações até o fim da duração
+    :param indice: int: número do trabalhador, usado para que as chaves únicas não colidam entre trabalhadores
+    :param config: dict: parâmetros da simulação, montados por simular
+    :return: dict[str, dict]: amostras brutas por operação
+    """
+    with contextlib.ExitStack() as pilha:
+        if config['modo'] == 'processos':
+            configurar_engine(config['db_path'], config['journal_mode'], config['pool'], config['timeout'])
+            pilha.callback(disposeEngine)
+            pilha.enter_context(contextlib.redirect_stdout(pilha.enter_context(open(os.devnull, 'w'))))
+
+        aleatorio = random.Random(config['semente'] + indice)
+        contextos = {modelo: ContextoBenchmark(config['linhas'], semente=config['semente'] + indice)
+                     for modelo in config['modelos']}
+        escolhas, pesos = _escolhas(config['mistura'], config['modelos'])
+        amostras = {operacao: {'latencias': [], 'erros': 0, 'erros_lock': 0, 'espera_ns': 0}
+                    for operacao in config['mistura']}
+
+        contador = 0
+        fim = time.monotonic() + config['duracao']
+        while time.monotonic() < fim:
+            modelo, operacao = aleatorio.choices(escolhas, pesos)[0]
+            contexto = contextos[modelo]
+            if operacao in ('update', 'delete') and not contexto.inseridos:
+                continue
+            k = contador * config['trabalhadores'] + indice
+            contador += 1
+
+            _zerar_estado()
+            inicio = perf_counter_ns()
+            try:
+                resultado = CENARIOS[modelo][operacao](contexto, k)
+            except Exception:
+                resultado = None
+            duracao = perf_counter_ns() - inicio
+
+            amostra = amostras[operacao]
+            amostra['espera_ns'] += _estado.espera_ns
+            amostra['erros_lock'] += _estado.erros_lock
+            if resultado is None:
+                amostra['erros'] += 1
+                continue
+            amostra['latencias'].append(duracao)
+            if operacao == 'insert':
+                contexto.inseridos.append(resultado.id)
+            elif operacao == 'delete' and resultado.id in contexto.inseridos:
+                contexto.inseridos.remove(resultado.id)
+        return amostras
+
+
+def simular(db_path: str, linhas: int, trabalhadores: int = 8, duracao: float = 30, modo: str = 'threads',
+            mistura: Optional[dict[str, int]] = None, modelos: Optional[list[str]] = None,
+            journal_mode: Optional[str] = None, pool: str = 'null', timeout: float = 30,
+            semente: int = 42) -> dict:
+    """Executa a simulação e consolida os resultados por operação
+    :param db_path: str: caminho do banco gerado por benchmarks.gerador_base, que será alterado pela simulação
+    :param linhas: int: quantidade de registros por tabela no banco
+    :param trabalhadores: int: quantidade de threads ou processos executando operações ao mesmo tempo
+    :param duracao: float: duração da simulação, em segundos
+    :param modo: str: 'threads' (uma engine compartilhada) ou 'processos' (uma engine por processo)
+    :param mistura: dict[str, int]: peso de cada operação no sorteio, padrão MISTURA_PADRAO
+    :param modelos: list[str]: modelos exercitados, por padrão todos os de CENARIOS
+    :param journal_mode: str: journal_mode das conexões, por padrão o do arquivo
+    :param pool: str: pool de conexões, uma das chaves de POOLS
+    :param timeout: float: tempo máximo, em segundos, que cada comando aguarda o lock do banco
+    :param semente: int: semente dos sorteios
+    :return: dict: configuração usada, resumo de cada operação e o total
+    :raises ValueError: Se o modo ou o pool forem desconhecidos
+    """
+    if modo not in ('threads', 'processos'):
+        raise ValueError(f'Modo {modo} desconhecido, use threads ou processos!')
+    if pool not in POOLS:
+        raise ValueError(f'Pool {pool} desconhecido, use um de {sorted(POOLS)}!')
+
+    config = {'db_path': db_path, 'linhas': linhas, 'trabalhadores': trabalhadores, 'duracao': duracao,
+              'modo': modo, 'mistura': mistura or dict(MISTURA_PADRAO), 'modelos': modelos or list(CENARIOS),
+              'journal_mode': journal_mode, 'pool': pool, 'timeout': timeout, 'semente': semente}
+
+    inicio = perf_counter()
+    if modo == 'threads':
+        configurar_engine(db_path, journal_mode, pool, timeout, trabalhadores)
+        try:
+            # os métodos dos modelos imprimem cada operação; redirecionar aqui, e não em cada thread, evita que as
+            # threads restaurem o stdout umas das outras
+            with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo), \
+                    ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+                parciais = list(executor.map(_trabalhar, range(trabalhadores), [config] * trabalhadores))
+        finally:
+            disposeEngine()
+    else:
+        with ProcessPoolExecutor(max_workers=trabalhadores,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            parciais = list(executor.map(_trabalhar, range(trabalhadores), [config] * trabalhadores))
+    decorrido = perf_counter() - inicio
+
+    operacoes = {}
+    todas_latencias, total_erros, total_lock, total_espera = [], 0, 0, 0
+    for operacao in config['mistura']:
+        latencias = [lat for parcial in parciais for lat in parcial[operacao]['latencias']]
+        erros = sum(parcial[operacao]['erros'] for parcial in parciais)
+        erros_lock = sum(parcial[operacao]['erros_lock'] for parcial in parciais)
+        espera_ns = sum(parcial[operacao]['espera_ns'] for parcial in parciais)
+        operacoes[operacao] = _consolidar(latencias, erros, erros_lock, espera_ns, duracao)
+        todas_latencias += latencias
+        total_erros += erros
+        total_lock += erros_lock
+        total_espera += espera_ns
+
+    return {'configuracao': {chave: valor for chave, valor in config.items() if chave != 'db_path'},
+            'duracao_real_seg': decorrido, 'operacoes': operacoes,
+            'total': _consolidar(todas_latencias, total_erros, total_lock, total_espera, duracao)}
+
+
+def _consolidar(latencias: list[int], erros: int, erros_lock: int, espera_ns: int, duracao: float) -> dict:
+    """Resumo de uma operação: percentis de benchmarks.crud.resumir mais a vazão sob concorrência e os locks"""
+    resumo = resumir(latencias, erros)
+    chamadas = len(latencias) + erros
+    resumo.update({
+        # com vários trabalhadores a vazão é a de todos juntos, e não o inverso da latência média
+        'ops_seg': len(latencias) / duracao,
+        'erros_lock': erros_lock,
+        'espera_lock_ms_total': espera_ns / 1e6,
+        'espera_lock_ms_media': (espera_ns / chamadas) / 1e6 if chamadas else 0.0,
+    })
+    return resumo
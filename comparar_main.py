@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from conf.comparacao_bancos import compararBancos, possuiDiferencas
+from ScriptsAuxiliares.Auxiliar import Auxiliar
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Compara duas cópias sqlite do banco por hashes de blocos de ids e '
+                                                 'aponta os ids inseridos, apagados e alterados de cada tabela.')
+    parser.add_argument('alvo', help='arquivo do banco comparado, ex.: db_bk/picoles_BK.sqlite')
+    parser.add_argument('--base', default=f'{Auxiliar.getProjectRootDir()}//db/picoles.sqlite',
+                        help='arquivo do banco de referência, por padrão db/picoles.sqlite')
+    parser.add_argument('--tabelas', nargs='+', default=None, help='tabelas comparadas, por padrão todas')
+    parser.add_argument('--ramificacao', type=int, default=16, help='em quantos blocos cada bloco diferente é dividido')
+    parser.add_argument('--tamanho-folha', type=int, default=256,
+                        help='quantidade de ids a partir da qual as linhas são comparadas uma a uma')
+    parser.add_argument('--saida', default=None, help='arquivo JSON onde as diferenças serão gravadas')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+    resultado = compararBancos(args.base, args.alvo, tabelas=args.tabelas, ramificacao=args.ramificacao,
+                               tamanho_folha=args.tamanho_folha)
+
+    for chave, descricao in (('apenas_base', 'apenas na base'), ('apenas_alvo', 'apenas no alvo'),
+                             ('sem_id_inteiro', 'não comparadas, sem chave primária inteira')):
+        if resultado[chave]:
+            print(f'Tabelas {descricao}: {", ".join(resultado[chave])}')
+    for tabela, colunas in resultado['colunas_diferentes'].items():
+        print(f'Tabela {tabela} com colunas diferentes: {colunas}')
+
+    if args.saida:
+        Path(args.saida).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.saida).write_text(json.dumps({'data': datetime.now().isoformat(timespec='seconds'),
+                                                'base': args.base, 'alvo': args.alvo, **resultado}, indent=2),
+                                    encoding='utf-8')
+        print(f'Diferenças gravadas em {args.saida}')
+
+    if possuiDiferencas(resultado):
+        print('\nOs bancos são diferentes')
+        return 1
+    print('\nOs bancos são iguais')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+# Este módulo faz cópias de segurança do banco sqlite com a API de backup do sqlite, que copia as páginas do banco
+# de forma consistente mesmo com escritas acontecendo, ao contrário da cópia do arquivo. A cópia é feita em passos
+# de algumas páginas, com uma pausa entre eles, para não segurar o lock do banco e deixar as escritas avançarem; se o
+# banco for alterado por outra conexão durante a cópia, o sqlite a recomeça do início; com escritas contínuas ela
+# poderia nunca terminar, então, depois de max_reinicios, a cópia é refeita em um único passo, que no modo WAL não
+# bloqueia as escritas e no modo DELETE as bloqueia apenas durante a cópia.
+#
+# Cada backup gera um arquivo picoles_AAAAMMDD_HHMMSS.sqlite no diretório db_bk, e apenas os mais recentes são
+# mantidos. As cópias feitas manualmente no diretório, com outros nomes, não são tocadas pelo rodízio.
+
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from conf.db_session import disposeEngine, sqlitePath
+from ScriptsAuxiliares.Auxiliar import Auxiliar
+
+_SUFIXOS_SQLITE = ('-wal', '-shm', '-journal')
+
+
+class _CopiaReiniciadaError(Exception):
+    """Interrompe a cópia em passos que foi reiniciada vezes demais pelas escritas no banco"""
+
+
+def diretorioPadrao() -> Path:
+    """:return: Path: diretório db_bk na raiz do projeto"""
+    return Path(f'{Auxiliar.getProjectRootDir()}//db_bk')
+
+
+def _padrao_nome(prefixo: str) -> re.Pattern:
+    return re.compile(rf'^{re.escape(prefixo)}_\d{{8}}_\d{{6}}(_\d+)?\.sqlite$')
+
+
+def listarBackups(diretorio: Optional[str] = None, prefixo: str = 'picoles') -> list[Path]:
+    """Backups gerados por criarBackup no diretório, do mais antigo para o mais recente
+    :param diretorio: str: diretório dos backups, padrão db_bk na raiz do projeto
+    :param prefixo: str: prefixo do nome dos arquivos
+    :return: list[Path]
+    """
+    diretorio = Path(diretorio) if diretorio is not None else diretorioPadrao()
+    if not diretorio.exists():
+        return []
+    padrao = _padrao_nome(prefixo)
+    return sorted(arquivo for arquivo in diretorio.iterdir() if padrao.match(arquivo.name))
+
+
+def verificarIntegridade(db_path: str) -> None:
+    """Confere a estrutura do arquivo com o PRAGMA quick_check
+    :param db_path: str: caminho do arquivo do sqlite
+    :raises RuntimeError: Se o arquivo estiver corrompido
+    """
+    conexao = sqlite3.connect(db_path)
+    try:
+        resultado = conexao.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        conexao.close()
+    if resultado != 'ok':
+        raise RuntimeError(f'Backup {db_path} corrompido: {resultado}')
+
+
+def _sincronizar_disco(caminho: Path) -> None:
+    """Garante que o arquivo esteja gravado em disco antes de ser renomeado"""
+    descritor = os.open(caminho, os.O_RDONLY)
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+
+def criarBackup(db_path: Optional[str] = None, diretorio: Optional[str] = None, prefixo: str = 'picoles',
+                paginas_por_passo: int = 256, pausa_ms: float = 5, manter: int = 7, timeout: float = 30,
+                max_reinicios: int = 3) -> dict:
+    """Copia o banco para um novo arquivo de backup, em passos, sem impedir as escritas, e apaga os backups além dos
+    manter mais recentes
+    :param db_path: str: banco copiado, padrão o da camada de acesso (ver conf.db_session.sqlitePath)
+    :param diretorio: str: diretório dos backups, padrão db_bk na raiz do projeto
+    :param prefixo: str: prefixo do nome dos arquivos
+    :param paginas_por_passo: int: páginas copiadas por passo, -1 para copiar tudo de uma vez
+    :param pausa_ms: float: pausa entre os passos, em milissegundos, em que as escritas podem avançar, e também a
+    espera antes de tentar de novo um passo que encontrou o banco bloqueado
+    :param manter: int: quantidade de backups mantidos no diretório, 0 para não apagar nenhum
+    :param timeout: float: espera máxima por lock ao abrir o banco, em segundos
+    :param max_reinicios: int: reinícios da cópia em passos, causados por escritas de outras conexões, tolerados
+    antes de copiar o restante em um único passo
+    :return: dict: caminho, paginas, passos, reinicios, bytes, segundos e paginas_seg
+    :raises ValueError: Se paginas_por_passo for 0 ou menor que -1, ou se pausa_ms ou manter forem negativos
+    :raises RuntimeError: Se o backup gerado não passar na verificação de integridade
+    """
+    if paginas_por_passo == 0 or paginas_por_passo < -1:
+        raise ValueError('paginas_por_passo deve ser positivo, ou -1 para copiar tudo de uma vez!')
+    if pausa_ms < 0 or manter < 0:
+        raise ValueError('pausa_ms e manter não podem ser negativos!')
+
+    origem_path = sqlitePath(db_path)
+    diretorio = Path(diretorio) if diretorio is not None else diretorioPadrao()
+    diretorio.mkdir(parents=True, exist_ok=True)
+    nome = f'{prefixo}_{datetime.now():%Y%m%d_%H%M%S}'
+    destino_path = diretorio / f'{nome}.sqlite'
+    sequencia = 1
+    while destino_path.exists():
+        destino_path = diretorio / f'{nome}_{sequencia}.sqlite'
+        sequencia += 1
+    provisorio = destino_path.with_name(destino_path.name + '.tmp')
+
+    progresso = {'passos': 0, 'paginas': 0, 'restantes': None, 'reinicios': 0}
+
+    def _progresso(status, restantes, total):
+        progresso['passos'] += 1
+        progresso['paginas'] = total
+        if progresso['restantes'] is not None and restantes > progresso['restantes']:
+            progresso['reinicios'] += 1
+            if progresso['reinicios'] > max_reinicios:
+                raise _CopiaReiniciadaError()
+        progresso['restantes'] = restantes
+        if restantes and pausa_ms:
+            time.sleep(pausa_ms / 1000)
+
+    inicio = time.perf_counter()
+    origem = sqlite3.connect(origem_path, timeout=timeout)
+    destino = sqlite3.connect(provisorio)
+    try:
+        try:
+            origem.backup(destino, pages=paginas_por_passo, progress=_progresso, sleep=pausa_ms / 1000)
+        except _CopiaReiniciadaError:
+            print(f'Backup reiniciado {progresso["reinicios"]} vezes pelas escritas, copiando em um único passo')
+            progresso['restantes'] = None
+            origem.backup(destino, pages=-1, progress=_progresso, sleep=pausa_ms / 1000)
+    except Exception:
+        destino.close()
+        provisorio.unlink(missing_ok=True)
+        raise
+    finally:
+        origem.close()
+    destino.close()
+    segundos = time.perf_counter() - inicio
+
+    verificarIntegridade(str(provisorio))
+    _sincronizar_disco(provisorio)
+    os.replace(provisorio, destino_path)
+
+    apagados = []
+    if manter:
+        for antigo in listarBackups(diretorio, prefixo)[:-manter]:
+            antigo.unlink()
+            apagados.append(str(antigo))
+
+    resultado = {'caminho': str(destino_path), 'paginas': progresso['paginas'], 'passos': progresso['passos'],
+                 'reinicios': progresso['reinicios'], 'bytes': destino_path.stat().st_size, 'segundos': segundos,
+                 'paginas_seg': progresso['paginas'] / segundos if segundos > 0 else 0.0, 'apagados': apagados}
+    print(f'Backup {destino_path} criado: {resultado["paginas"]} páginas em {resultado["passos"]} passos, '
+          f'{segundos:.2f} s ({resultado["paginas_seg"]:.0f} páginas/s)')
+    return resultado
+
+
+def restaurarBackup(backup_path: str, db_path: Optional[str] = None) -> Path:
+    """Substitui o banco pelo backup. O backup é copiado para um arquivo ao lado do banco, verificado e só então
+    renomeado sobre ele, de modo que o banco nunca fica pela metade. As conexões da camada de acesso são fechadas
+    antes; outros processos com o banco aberto devem ser encerrados antes da restauração.
+    :param backup_path: str: arquivo de backup
+    :param db_path: str: banco substituído, padrão o da camada de acesso (ver conf.db_session.sqlitePath)
+    :return: Path: caminho do banco restaurado
+    :raises FileNotFoundError: Se o backup não existir
+    :raises RuntimeError: Se o backup não passar na verificação de integridade
+    """
+    backup_path = Path(backup_path)
+    if not backup_path.exists():
+        raise FileNotFoundError(f'Backup {backup_path} não encontrado!')
+
+    destino_path = sqlitePath(db_path)
+    destino_path.parent.mkdir(parents=True, exist_ok=True)
+    provisorio = destino_path.with_name(destino_path.name + '.restaurando')
+    origem = sqlite3.connect(backup_path)
+    destino = sqlite3.connect(provisorio)
+    try:
+        origem.backup(destino)
+    finally:
+        destino.close()
+        origem.close()
+    try:
+        verificarIntegridade(str(provisorio))
+        _sincronizar_disco(provisorio)
+    except Exception:
+        provisorio.unlink(missing_ok=True)
+        raise
+
+    disposeEngine()
+    # o journal e o WAL do banco antigo não valem para o restaurado
+    for sufixo in _SUFIXOS_SQLITE:
+        Path(f'{destino_path}{sufixo}').unlink(missing_ok=True)
+    os.replace(provisorio, destino_path)
+    print(f'Banco {destino_path} restaurado a partir de {backup_path}')
+    return destino_path
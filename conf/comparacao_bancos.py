@@ -0,0 +1,190 @@
+# Este módulo compara duas cópias sqlite do banco (por exemplo db/picoles.sqlite e db_bk/picoles_BK.sqlite) sem ler
+# todas as linhas das duas. Cada tabela é dividida em blocos de ids e cada bloco é resumido, dentro do próprio
+# sqlite, em um hash: a soma dos hashes das suas linhas. Só os blocos com hashes diferentes nos dois bancos são
+# divididos de novo, como em uma árvore de Merkle, até blocos pequenos o bastante para que as linhas sejam
+# comparadas uma a uma. Tabelas iguais custam uma consulta por banco; tabelas com poucas diferenças leem
+# essencialmente hashes e apenas as linhas dos blocos alterados.
+
+import hashlib
+import math
+import time
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+
+_MASCARA_64 = (1 << 64) - 1
+
+
+def _hash_linha(*valores) -> int:
+    """Hash de 64 bits dos valores de uma linha, como inteiro com sinal, que é o que o sqlite armazena"""
+    texto = '\x1f'.join('\x00' if valor is None else f'{type(valor).__name__}:{valor}' for valor in valores)
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class _SomaHash:
+    """Agregação soma_hash do sqlite: soma dos hashes módulo 2^64, independente da ordem das linhas"""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, valor):
+        self.total = (self.total + valor) & _MASCARA_64
+
+    def finalize(self):
+        return self.total - (1 << 64) if self.total >= 1 << 63 else self.total
+
+
+def _registrar_funcoes(dbapi_connection, connection_record) -> None:
+    dbapi_connection.create_function('hash_linha', -1, _hash_linha, deterministic=True)
+    dbapi_connection.create_aggregate('soma_hash', 1, _SomaHash)
+
+
+def criarEngineComparacao(db_path: str) -> Engine:
+    """Engine de leitura de um arquivo sqlite com as funções hash_linha e soma_hash registradas
+    :param db_path: str: caminho do arquivo do sqlite
+    :return: Engine
+    """
+    engine = sa.create_engine(f'sqlite:///{db_path}')
+    sa.event.listen(engine, 'connect', _registrar_funcoes)
+    return engine
+
+
+class _Lado:
+    """Consultas de hash de uma tabela em um dos bancos"""
+
+    def __init__(self, conexao: Connection, nome_tabela: str, colunas: list[str], coluna_id: str):
+        self.conexao = conexao
+        self.tabela = sa.table(nome_tabela, *[sa.column(coluna) for coluna in colunas])
+        self.id = self.tabela.c[coluna_id]
+        self.hash_linha = sa.func.hash_linha(*[self.tabela.c[coluna] for coluna in colunas])
+        self.consultas = 0
+        self.linhas_lidas = 0
+
+    def limites(self) -> tuple[Optional[int], Optional[int]]:
+        self.consultas += 1
+        return tuple(self.conexao.execute(sa.select(sa.func.min(self.id), sa.func.max(self.id))).one())
+
+    def hashBloco(self, inicio: int, fim: int) -> tuple:
+        self.consultas += 1
+        return tuple(self.conexao.execute(sa.select(sa.func.soma_hash(self.hash_linha), sa.func.count())
+                                          .where(self.id.between(inicio, fim))).one())
+
+    def hashesFilhos(self, inicio: int, fim: int, largura: int) -> dict[int, tuple]:
+        self.consultas += 1
+        bloco = ((self.id - inicio) / largura).label('bloco')
+        consulta = (sa.select(bloco, sa.func.soma_hash(self.hash_linha), sa.func.count())
+                    .where(self.id.between(inicio, fim)).group_by(bloco))
+        return {linha[0]: (linha[1], linha[2]) for linha in self.conexao.execute(consulta)}
+
+    def hashesLinhas(self, inicio: int, fim: int) -> dict[int, int]:
+        self.consultas += 1
+        consulta = sa.select(self.id, self.hash_linha).where(self.id.between(inicio, fim))
+        linhas = dict(self.conexao.execute(consulta).all())
+        self.linhas_lidas += len(linhas)
+        return linhas
+
+
+def compararTabela(conexao_base: Connection, conexao_alvo: Connection, nome_tabela: str, colunas: list[str],
+                   coluna_id: str = 'id', ramificacao: int = 16, tamanho_folha: int = 256) -> dict:
+    """Compara uma tabela nos dois bancos descendo apenas pelos blocos de ids com hashes diferentes
+    :param conexao_base: Connection: conexão com o banco de referência
+    :param conexao_alvo: Connection: conexão com o banco comparado
+    :param nome_tabela: str: nome da tabela
+    :param colunas: list[str]: colunas comparadas, presentes nos dois bancos
+    :param coluna_id: str: chave primária inteira usada para dividir a tabela em blocos
+    :param ramificacao: int: em quantos blocos cada bloco diferente é dividido
+    :param tamanho_folha: int: quantidade de ids a partir da qual as linhas do bloco são comparadas uma a uma
+    :return: dict: ids inseridos (só no alvo), apagados (só na base) e alterados, e consultas, blocos comparados e
+    linhas lidas em cada banco
+    """
+    base = _Lado(conexao_base, nome_tabela, colunas, coluna_id)
+    alvo = _Lado(conexao_alvo, nome_tabela, colunas, coluna_id)
+    inseridos, apagados, alterados = [], [], []
+    blocos = 0
+
+    limites = [limite for limite in base.limites() + alvo.limites() if limite is not None]
+    pendentes = [(min(limites), max(limites))] if limites else []
+    if pendentes and base.hashBloco(*pendentes[0]) == alvo.hashBloco(*pendentes[0]):
+        pendentes = []
+    while pendentes:
+        inicio, fim = pendentes.pop()
+        blocos += 1
+        if fim - inicio + 1 <= tamanho_folha:
+            linhas_base = base.hashesLinhas(inicio, fim)
+            linhas_alvo = alvo.hashesLinhas(inicio, fim)
+            inseridos += [id_linha for id_linha in linhas_alvo if id_linha not in linhas_base]
+            apagados += [id_linha for id_linha in linhas_base if id_linha not in linhas_alvo]
+            alterados += [id_linha for id_linha, hash_linha in linhas_base.items()
+                          if id_linha in linhas_alvo and linhas_alvo[id_linha] != hash_linha]
+            continue
+
+        largura = math.ceil((fim - inicio + 1) / ramificacao)
+        filhos_base = base.hashesFilhos(inicio, fim, largura)
+        filhos_alvo = alvo.hashesFilhos(inicio, fim, largura)
+        for bloco in sorted(set(filhos_base) | set(filhos_alvo), reverse=True):
+            if filhos_base.get(bloco) != filhos_alvo.get(bloco):
+                pendentes.append((inicio + bloco * largura, min(fim, inicio + (bloco + 1) * largura - 1)))
+
+    return {'inseridos': sorted(inseridos), 'apagados': sorted(apagados), 'alterados': sorted(alterados),
+            'blocos_comparados': blocos, 'consultas': base.consultas + alvo.consultas,
+            'linhas_lidas': base.linhas_lidas + alvo.linhas_lidas}
+
+
+def compararBancos(caminho_base: str, caminho_alvo: str, tabelas: Optional[list[str]] = None,
+                   ramificacao: int = 16, tamanho_folha: int = 256) -> dict:
+    """Compara as tabelas de dois arquivos sqlite
+    :param caminho_base: str: arquivo do banco de referência
+    :param caminho_alvo: str: arquivo do banco comparado
+    :param tabelas: list[str]: tabelas comparadas, por padrão todas as que existem nos dois bancos
+    :param ramificacao: int: em quantos blocos cada bloco diferente é dividido
+    :param tamanho_folha: int: quantidade de ids a partir da qual as linhas são comparadas uma a uma
+    :return: dict: resultado de cada tabela comparada (ver compararTabela) em 'tabelas', as tabelas que existem em
+    apenas um dos bancos, as que não têm chave primária inteira simples e as com colunas diferentes
+    :raises ValueError: Se ramificacao for menor que 2 ou tamanho_folha menor que 1
+    """
+    if ramificacao < 2 or tamanho_folha < 1:
+        raise ValueError('ramificacao deve ser ao menos 2 e tamanho_folha ao menos 1!')
+
+    engine_base = criarEngineComparacao(caminho_base)
+    engine_alvo = criarEngineComparacao(caminho_alvo)
+    try:
+        inspetor_base, inspetor_alvo = sa.inspect(engine_base), sa.inspect(engine_alvo)
+        nomes_base, nomes_alvo = set(inspetor_base.get_table_names()), set(inspetor_alvo.get_table_names())
+        resultado = {'tabelas': {}, 'apenas_base': sorted(nomes_base - nomes_alvo),
+                     'apenas_alvo': sorted(nomes_alvo - nomes_base), 'sem_id_inteiro': [],
+                     'colunas_diferentes': {}}
+        nomes = sorted(nomes_base & nomes_alvo) if tabelas is None else tabelas
+        with engine_base.connect() as conexao_base, engine_alvo.connect() as conexao_alvo:
+            for nome_tabela in nomes:
+                colunas_base = {c['name']: c for c in inspetor_base.get_columns(nome_tabela)}
+                colunas_alvo = {c['name'] for c in inspetor_alvo.get_columns(nome_tabela)}
+                chave = inspetor_base.get_pk_constraint(nome_tabela)['constrained_columns']
+                if len(chave) != 1 or not isinstance(colunas_base[chave[0]]['type'], sa.Integer):
+                    resultado['sem_id_inteiro'].append(nome_tabela)
+                    continue
+                if set(colunas_base) != colunas_alvo:
+                    resultado['colunas_diferentes'][nome_tabela] = {
+                        'apenas_base': sorted(set(colunas_base) - colunas_alvo),
+                        'apenas_alvo': sorted(colunas_alvo - set(colunas_base))}
+
+                inicio = time.perf_counter()
+                diferenca = compararTabela(conexao_base, conexao_alvo, nome_tabela,
+                                           sorted(set(colunas_base) & colunas_alvo), coluna_id=chave[0],
+                                           ramificacao=ramificacao, tamanho_folha=tamanho_folha)
+                diferenca['segundos'] = time.perf_counter() - inicio
+                resultado['tabelas'][nome_tabela] = diferenca
+                print(f'Tabela {nome_tabela}: {len(diferenca["inseridos"])} inseridos, '
+                      f'{len(diferenca["apagados"])} apagados, {len(diferenca["alterados"])} alterados '
+                      f'({diferenca["consultas"]} consultas, {diferenca["linhas_lidas"]} linhas lidas, '
+                      f'{diferenca["segundos"]:.2f} s)')
+    finally:
+        engine_base.dispose()
+        engine_alvo.dispose()
+    return resultado
+
+
+def possuiDiferencas(resultado: dict) -> bool:
+    """:return: bool: se o resultado de compararBancos apontou alguma diferença entre os bancos"""
+    return bool(resultado['apenas_base'] or resultado['apenas_alvo'] or resultado['colunas_diferentes'] or
+                any(t['inseridos'] or t['apagados'] or t['alterados'] for t in resultado['tabelas'].values()))
@@ -1,9 +1,15 @@
+import os
+import threading
+from contextlib import contextmanager
+
 import sqlalchemy as sa
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path  # usado no sqlite
-from typing import Optional
+from typing import Iterator, Optional
 from sqlalchemy.orm import Session
+from sqlalchemy.engine import Connection
 from sqlalchemy.future.engine import Engine
+from sqlalchemy.pool import Pool
 from models.model_base import ModelBase
 from ScriptsAuxiliares.Auxiliar import Auxiliar
 
@@ -28,21 +34,101 @@ from ScriptsAuxiliares.Auxiliar import Auxiliar
 # define the connection to the database itself.
 __engine: Optional[Engine] = None
 
+# sessão compartilhada pela thread atual, quando definida por ambientSession
+_ambiente = threading.local()
+
+
+class _AmbientSession:
+    """Sessão entregue por createSession enquanto houver uma sessão ambiente na thread. Os métodos dos modelos a usam
+    como uma sessão própria (with createSession() as session, session.commit()), mas o commit apenas envia as
+    alterações ao banco (flush) e o fechamento não faz nada: quem abriu a sessão ambiente decide quando confirmar.
+    Com savepoint=True, cada bloco with roda em um SAVEPOINT, desfeito se o bloco terminar com exceção, para que a
+    falha de um método não invalide a transação de quem abriu a sessão ambiente.
+    """
+
+    def __init__(self, session: Session, savepoint: bool = False):
+        self._session = session
+        self._savepoint = savepoint
+        self._savepoints = []
+
+    def __enter__(self) -> '_AmbientSession':
+        if self._savepoint:
+            self._savepoints.append(self._session.begin_nested())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if not self._savepoint:
+            return
+        savepoint = self._savepoints.pop()
+        if exc_type is None and savepoint.is_active:
+            savepoint.commit()
+        else:
+            savepoint.rollback()
+
+    def commit(self) -> None:
+        self._session.flush()
+
+    def close(self) -> None:
+        pass
+
+    def __getattr__(self, nome):
+        return getattr(self._session, nome)
+
+
+def postgresUrl() -> str:
+    """URL de conexão com o banco postgres do projeto
+    :return: str
+    """
+
+    db_user_name = 'postgres'
+    db_password = 'postgres'
+    local = 'localhost'
+    port = '5432'
+    db_name = 'picoles'
+    return f'postgresql://{db_user_name}:{db_password}@{local}:{port}/{db_name}'
+
+
+def sqlitePath(db_path: Optional[str] = None) -> Path:
+    """Caminho do arquivo do sqlite
+    :param db_path: str: caminho informado, que tem prioridade
+    :return: Path: db_path, ou o da variável de ambiente PICOLES_DB_PATH, ou db/picoles.sqlite na raiz do projeto
+    """
+
+    if db_path is None:
+        db_path = os.environ.get('PICOLES_DB_PATH')
+    if db_path is None:
+        root_path = Auxiliar.getProjectRootDir()
+        db_path = f'{root_path}//db/picoles.sqlite'
+    return Path(db_path)
+
 
-def createEngine(sqlite: bool = True, echo: bool = False, timeout: int = 30) -> Engine:
+def createEngine(sqlite: bool = True, echo: bool = False, timeout: int = 30,
+                 db_path: Optional[str] = None, journal_mode: Optional[str] = None,
+                 poolclass: Optional[type[Pool]] = None, pool_size: Optional[int] = None,
+                 connect_args: Optional[dict] = None) -> Engine:
     """Cria/Configura a engine de conexão com o banco de dados
     :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
     :param echo: bool: se True, mostra as queries executadas, se False, não mostra
     :param timeout: int: tempo limite para conexão, padrão 30 segundos
+    :param db_path: str: caminho do arquivo do sqlite, padrão o da variável de ambiente PICOLES_DB_PATH ou, se ela não
+    estiver definida, db/picoles.sqlite na raiz do projeto
+    :param journal_mode: str: journal_mode aplicado a cada conexão do sqlite (DELETE, WAL, ...), padrão o do arquivo
+    :param poolclass: type[Pool]: classe do pool de conexões, padrão a escolhida pelo dialeto
+    :param pool_size: int: tamanho do pool, apenas para pools que o aceitam (QueuePool)
+    :param connect_args: dict: argumentos extras repassados ao driver na abertura de cada conexão
     :return: Engine
     """
 
     global __engine
     if __engine is not None:
         return __engine
+    opcoes_pool = {}
+    if poolclass is not None:
+        opcoes_pool['poolclass'] = poolclass
+    if pool_size is not None:
+        opcoes_pool['pool_size'] = pool_size
     if sqlite:
-        root_path = Auxiliar.getProjectRootDir()
-        db_path = Path(f'{root_path}//db/picoles.sqlite')
+        db_path = sqlitePath(db_path)
         folder = Path(db_path).parent
         folder.mkdir(parents=True, exist_ok=True)
         conn_str = f'sqlite:///{db_path}'
@@ -54,20 +140,34 @@ def createEngine(sqlite: bool = True, echo: bool = False, timeout: int = 30) ->
             connect_args={
                 "check_same_thread": False,  # para permitir multi-thread
                 "timeout": timeout,  # tempo limite para conexão
-            }
+                **(connect_args or {}),
+            },
+            **opcoes_pool,
         )
+        if journal_mode is not None:
+            @sa.event.listens_for(__engine, 'connect')
+            def _journal_mode(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+                cursor.close()
     else:
         # opção para usar o postgres
-        db_user_name = 'postgres'
-        db_password = 'postgres'
-        local = 'localhost'
-        port = '5432'
-        db_name = 'picoles'
-        conn_str = f'postgresql://{db_user_name}:{db_password}@{local}:{port}/{db_name}'
-        __engine = sa.create_engine(url=conn_str, echo=echo)
+        conn_str = postgresUrl()
+        __engine = sa.create_engine(url=conn_str, echo=echo, connect_args=connect_args or {}, **opcoes_pool)
     return __engine
 
 
+def disposeEngine() -> None:
+    """Fecha as conexões da engine atual e a descarta, para que a próxima chamada de createEngine ou createSession
+    crie uma nova engine, por exemplo apontando para outro arquivo do banco.
+    """
+
+    global __engine
+    if __engine is not None:
+        __engine.dispose()
+        __engine = None
+
+
 def createSession(sqlite: bool = True, echo: bool = False, timeout: int = 30) -> Session:
     """Cria uma sessão com o banco de dados para realizar operações de CRUD
     :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
@@ -76,6 +176,10 @@ def createSession(sqlite: bool = True, echo: bool = False, timeout: int = 30) ->
     :return: Session
     """
 
+    ambiente = getattr(_ambiente, 'session', None)
+    if ambiente is not None:
+        return ambiente
+
     global __engine
     if __engine is None:
         __engine = createEngine(sqlite=sqlite, echo=echo, timeout=timeout)
@@ -91,6 +195,90 @@ def createSession(sqlite: bool = True, echo: bool = False, timeout: int = 30) ->
     return session
 
 
+@contextmanager
+def ambientSession(session: Session, savepoint: bool = False) -> Iterator[Session]:
+    """Faz com que, dentro do bloco e apenas na thread atual, createSession devolva a sessão informada em vez de abrir
+    uma nova, permitindo agrupar várias chamadas dos métodos dos modelos em uma única transação. Os commits feitos
+    pelos métodos viram flush; confirmar ou desfazer a transação fica a cargo de quem chamou.
+    :param session: Session: sessão a ser compartilhada
+    :param savepoint: bool: se True, cada with createSession() dos modelos roda em um SAVEPOINT próprio. No sqlite,
+    exige uma conexão aberta por savepointConnection
+    :return: Iterator[Session]: a própria sessão
+    """
+
+    anterior = getattr(_ambiente, 'session', None)
+    _ambiente.session = _AmbientSession(session, savepoint=savepoint)
+    try:
+        yield session
+    finally:
+        _ambiente.session = anterior
+
+
+@contextmanager
+def savepointConnection(sqlite: bool = True, engine: Optional[Engine] = None) -> Iterator[Connection]:
+    """Abre uma conexão da engine atual que aceita SAVEPOINT. No sqlite, o pysqlite controla as transações por conta
+    própria e impede o uso de SAVEPOINT, então a conexão passa para o modo autocommit do driver e o BEGIN é emitido
+    pelo SQLAlchemy, conforme a receita da documentação do dialeto. Ao sair do bloco, o modo do driver é restaurado
+    antes de a conexão voltar ao pool.
+    :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
+    :param engine: Engine: engine de outro banco; se informada, o banco é o dela e sqlite é ignorado
+    :return: Iterator[Connection]: a conexão
+    """
+
+    if engine is not None:
+        sqlite = engine.dialect.name == 'sqlite'
+    conexao = (engine or createEngine(sqlite=sqlite)).connect()
+    if sqlite:
+        conexao.connection.isolation_level = None
+        conexao.exec_driver_sql('PRAGMA foreign_keys=ON')
+        sa.event.listen(conexao, 'begin', lambda conn: conn.exec_driver_sql('BEGIN'))
+    try:
+        yield conexao
+    finally:
+        if sqlite:
+            conexao.connection.isolation_level = ''
+        conexao.close()
+
+
+@contextmanager
+def unitOfWork(sqlite: bool = True, savepoint: bool = True) -> Iterator[Session]:
+    """Unidade de trabalho: os métodos dos modelos chamados dentro do bloco, na thread atual, usam uma única sessão
+    e uma única transação (ver ambientSession), em vez de abrir e confirmar cada um a sua. O commit dos métodos vira
+    flush e tudo é confirmado uma vez, ao final do bloco, ou desfeito se o bloco terminar com exceção:
+
+        with unitOfWork():
+            nota = NotaFiscal.insertNotaFiscal(valor=10.0, numero_serie='NS-1', descricao='NOTA', revendedor_fk=1)
+            lote = Lote.insertLote(picole_fk=1, quantidade=10)
+            LoteNotaFiscal.insertLoteNotaFiscal(nota_fiscal_fk=nota.id, lote_fk=lote.id)
+
+    Uma unidade aberta dentro de outra se junta a ela e é confirmada junto com a de fora.
+    :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
+    :param savepoint: bool: se True, cada método roda em um SAVEPOINT, de modo que um método que falha e retorna
+    None desfaz apenas o que ele fez, sem invalidar a transação da unidade
+    :return: Iterator[Session]: a sessão da unidade
+    """
+
+    ambiente = getattr(_ambiente, 'session', None)
+    if ambiente is not None:
+        with ambiente:
+            yield ambiente._session
+        return
+
+    with savepointConnection(sqlite=sqlite) as conexao:
+        transacao = conexao.begin()
+        session = Session(bind=conexao, expire_on_commit=False)
+        try:
+            with ambientSession(session, savepoint=savepoint):
+                yield session
+            session.flush()
+            transacao.commit()
+        except BaseException:
+            transacao.rollback()
+            raise
+        finally:
+            session.close()
+
+
 def createTables(sqlite: bool = True) -> None:
     """Cria as tabelas no banco de dados
     :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
@@ -105,9 +293,9 @@ def createTables(sqlite: bool = True) -> None:
     ModelBase.metadata.create_all(__engine)
 
 
+# em desenvolvimento (MODO_DEV=1) a detecção de N+1 de conf.guarda_consultas é ligada junto com a camada de acesso
+if os.environ.get('MODO_DEV', '').lower() in ('1', 'true', 'sim'):
+    import conf.guarda_consultas
 
-
-
-
-
-
+# o log de alterações (exclusões, por padrão) é registrado por um evento da Session, ligado junto com a camada de acesso
+import conf.registro_alteracoes
@@ -0,0 +1,238 @@
+# Este módulo grava lotes de linhas com upsert, em um único comando por lote, em vez de um insert* do modelo por
+# linha. É usado pela sincronização (conf.sincronizacao), em que a chave do upsert é a chave primária, e pela
+# importação de arquivos (conf.importacao), em que a chave é a natural da tabela (nome, cnpj, numero_serie...).
+#
+# Um lote é gravado em uma transação. Se uma das linhas violar uma restrição do banco (numero_serie repetido, FK
+# inexistente...), o comando inteiro falha; em vez de desistir do lote ou regravar as linhas uma a uma, gravarLote
+# volta ao SAVEPOINT do lote e o divide ao meio, repetindo a divisão apenas nas metades que falharem, até isolar as
+# linhas ruins. Com k linhas ruins em n, são O(k log n) comandos; as linhas boas são confirmadas e as rejeitadas
+# devolvidas com o motivo dado pelo banco.
+#
+# O melhor tamanho de lote depende do banco (sqlite em disco local ou postgres pela rede) e da largura da tabela,
+# então gravarEmLotes o ajusta sozinho (LoteAdaptativo): começa pequeno, dobra o lote enquanto a latência de cada
+# um fica abaixo do alvo e, depois do primeiro lote lento, passa a crescer somando um incremento e a cair pela metade
+# a cada lote lento (AIMD, como o controle de congestionamento do TCP), sem passar do limite de parâmetros por
+# comando do banco.
+
+import sqlite3
+import time
+from itertools import islice
+from typing import Iterable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DataError, IntegrityError, ProgrammingError
+
+from conf.db_session import savepointConnection
+
+# código do postgres para 'ON CONFLICT DO UPDATE command cannot affect row a second time' (CardinalityViolation)
+_PGCODE_CARDINALIDADE = '21000'
+# parâmetros por comando aceitos pelo banco: 32766 no sqlite desde a 3.32 (999 antes) e 65535 no postgres
+_LIMITE_PARAMETROS = {'sqlite': 32_766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999, 'postgresql': 65_535}
+
+
+def upsert(conexao: Connection, tabela: sa.Table, linhas: list[dict], chave: Optional[list[str]] = None) -> None:
+    """Insere as linhas na tabela, atualizando as que já existirem com a mesma chave. São atualizadas as colunas
+    informadas nas linhas e as com onupdate (data_atualizacao); a chave primária e a data_criacao de uma linha já
+    existente são mantidas
+    :param conexao: Connection: conexão com o banco, postgres ou sqlite
+    :param tabela: sa.Table: tabela de destino
+    :param linhas: list[dict]: linhas a gravar, todas com as mesmas colunas
+    :param chave: list[str]: colunas de uma restrição unique que identificam a linha, padrão a chave primária
+    :raises ValueError: Se o banco não for postgres nem sqlite
+    """
+    if not linhas:
+        return
+    dialeto = conexao.dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f'Upsert não suportado para o banco {dialeto}!')
+
+    comando = insert(tabela)
+    chave = chave or [coluna.name for coluna in tabela.primary_key.columns]
+    mantidas = set(chave) | {coluna.name for coluna in tabela.primary_key.columns} | {'data_criacao'}
+    atualizadas = [coluna.name for coluna in tabela.columns if coluna.name not in mantidas and
+                   (coluna.name in linhas[0] or coluna.onupdate is not None)]
+    if atualizadas:
+        comando = comando.on_conflict_do_update(index_elements=chave,
+                                                set_={nome: comando.excluded[nome] for nome in atualizadas})
+    else:
+        comando = comando.on_conflict_do_nothing(index_elements=chave)
+    conexao.execute(comando, linhas)
+
+
+def motivoRejeicao(erro: sa.exc.DBAPIError) -> str:
+    """:return: str: mensagem do banco para a restrição violada, sem o comando e os parâmetros"""
+    return str(erro.orig).strip()
+
+
+def erroDeLinha(erro: sa.exc.DBAPIError) -> bool:
+    """Se o erro foi causado por linhas do lote, e não pelo banco ou pelo comando, e pode ser isolado por bissecção:
+    restrições violadas, dados inválidos e, no postgres, duas linhas do mesmo comando com a mesma chave do upsert
+    (o psycopg2 junta o lote em um único INSERT ... VALUES, e o SQLAlchemy entrega esse erro como ProgrammingError)
+    :param erro: sa.exc.DBAPIError: erro lançado pelo upsert
+    :return: bool
+    """
+    if isinstance(erro, (IntegrityError, DataError)):
+        return True
+    return isinstance(erro, ProgrammingError) and getattr(erro.orig, 'pgcode', None) == _PGCODE_CARDINALIDADE
+
+
+def _gravar_bisseccao(conexao: Connection, tabela: sa.Table, linhas: list[dict], chave: Optional[list[str]],
+                      deslocamento: int, resultado: dict) -> None:
+    """Grava as linhas em um SAVEPOINT; se falharem, desfaz o savepoint e grava cada metade da mesma forma"""
+    savepoint = conexao.begin_nested()
+    resultado['comandos'] += 1
+    try:
+        upsert(conexao, tabela, linhas, chave)
+    except (IntegrityError, DataError, ProgrammingError) as erro:
+        savepoint.rollback()
+        if not erroDeLinha(erro):
+            raise
+        if len(linhas) == 1:
+            resultado['rejeitadas'].append((deslocamento, motivoRejeicao(erro)))
+            return
+        meio = len(linhas) // 2
+        _gravar_bisseccao(conexao, tabela, linhas[:meio], chave, deslocamento, resultado)
+        _gravar_bisseccao(conexao, tabela, linhas[meio:], chave, deslocamento + meio, resultado)
+        return
+    savepoint.commit()
+    resultado['gravadas'] += len(linhas)
+
+
+def gravarLote(engine: Engine, tabela: sa.Table, linhas: list[dict], chave: Optional[list[str]] = None) -> dict:
+    """Grava as linhas com upsert em uma transação. Se o lote violar alguma restrição, as linhas que a violam são
+    isoladas por bissecção em savepoints e rejeitadas, e as demais são confirmadas
+    :param engine: Engine: engine do banco
+    :param tabela: sa.Table: tabela de destino
+    :param linhas: list[dict]: linhas a gravar, todas com as mesmas colunas
+    :param chave: list[str]: colunas que identificam a linha no upsert, padrão a chave primária
+    :return: dict: gravadas (quantidade), rejeitadas (posição em linhas e motivo de cada linha rejeitada, em ordem)
+    e comandos (upserts executados)
+    """
+    resultado = {'gravadas': 0, 'rejeitadas': [], 'comandos': 0}
+    if not linhas:
+        return resultado
+    with savepointConnection(engine=engine) as conexao, conexao.begin():
+        _gravar_bisseccao(conexao, tabela, linhas, chave, 0, resultado)
+    return resultado
+
+
+def maximoLinhasPorComando(engine: Engine, colunas: int) -> int:
+    """Quantidade de linhas que cabe em um comando sem passar do limite de parâmetros do banco
+    :param engine: Engine: engine do banco
+    :param colunas: int: colunas gravadas por linha
+    :return: int
+    """
+    return max(1, _LIMITE_PARAMETROS.get(engine.dialect.name, 999) // max(1, colunas))
+
+
+class LoteAdaptativo:
+    """Tamanho de lote ajustado pela latência observada de cada lote gravado"""
+
+    def __init__(self, inicial: int = 64, minimo: int = 1, maximo: int = 10_000, alvo_ms: float = 250,
+                 incremento: Optional[int] = None, fator_reducao: float = 0.5):
+        """
+        :param inicial: int: tamanho do primeiro lote
+        :param minimo: int: menor tamanho de lote
+        :param maximo: int: maior tamanho de lote, normalmente o de maximoLinhasPorComando
+        :param alvo_ms: float: latência máxima desejada por lote, em milissegundos
+        :param incremento: int: quanto o lote cresce depois do primeiro lote lento, padrão o tamanho inicial
+        :param fator_reducao: float: fator aplicado ao tamanho depois de um lote lento
+        :raises ValueError: Se os tamanhos forem inconsistentes ou o fator_reducao não estiver entre 0 e 1
+        """
+        if not 1 <= minimo <= inicial <= maximo:
+            raise ValueError('Os tamanhos devem respeitar 1 <= minimo <= inicial <= maximo!')
+        if not 0 < fator_reducao < 1:
+            raise ValueError('fator_reducao deve estar entre 0 e 1!')
+        self.tamanho = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.alvo_ms = alvo_ms
+        self.incremento = incremento or inicial
+        self.fator_reducao = fator_reducao
+        self.partida_lenta = True
+        self.curva: list[dict] = []
+
+    def registrar(self, linhas: int, segundos: float) -> int:
+        """Registra um lote gravado e ajusta o tamanho do próximo
+        :param linhas: int: linhas do lote
+        :param segundos: float: tempo de gravação do lote
+        :return: int: tamanho do próximo lote
+        """
+        ms = segundos * 1000
+        self.curva.append({'tamanho': self.tamanho, 'linhas': linhas, 'ms': ms,
+                           'linhas_seg': linhas / segundos if segundos > 0 else 0.0})
+        if ms > self.alvo_ms:
+            self.partida_lenta = False
+            self.tamanho = max(self.minimo, int(self.tamanho * self.fator_reducao))
+        elif self.partida_lenta:
+            self.tamanho = min(self.maximo, self.tamanho * 2)
+        else:
+            self.tamanho = min(self.maximo, self.tamanho + self.incremento)
+        return self.tamanho
+
+    def estatisticas(self) -> dict:
+        """:return: dict: tamanho_lote atual e a curva com tamanho, linhas, ms e linhas_seg de cada lote"""
+        return {'tamanho_lote': self.tamanho, 'curva': list(self.curva)}
+
+
+def controleDeLote(engine: Engine, tabela: sa.Table, tamanho_lote: Optional[int] = None,
+                   alvo_ms: float = 250) -> LoteAdaptativo:
+    """Controle do tamanho dos lotes gravados na tabela, limitado pelos parâmetros por comando do banco
+    :param engine: Engine: engine do banco
+    :param tabela: sa.Table: tabela de destino
+    :param tamanho_lote: int: tamanho fixo dos lotes, None para ajustar pela latência
+    :param alvo_ms: float: latência máxima desejada por lote, em milissegundos
+    :return: LoteAdaptativo
+    :raises ValueError: Se tamanho_lote não for positivo
+    """
+    if tamanho_lote is not None and tamanho_lote <= 0:
+        raise ValueError('tamanho_lote deve ser maior que zero!')
+    maximo = maximoLinhasPorComando(engine, len(tabela.columns))
+    if tamanho_lote is None:
+        return LoteAdaptativo(inicial=min(64, maximo), maximo=maximo, alvo_ms=alvo_ms)
+    tamanho_lote = min(tamanho_lote, maximo)
+    return LoteAdaptativo(inicial=tamanho_lote, minimo=tamanho_lote, maximo=tamanho_lote, alvo_ms=alvo_ms)
+
+
+def gravarEmLotes(engine: Engine, tabela: sa.Table, linhas: Iterable[dict], chave: Optional[list[str]] = None,
+                  tamanho_lote: Optional[int] = None, alvo_ms: float = 250) -> dict:
+    """Grava as linhas em lotes com gravarLote, uma transação por lote. Sem tamanho_lote, o tamanho é ajustado pela
+    latência de cada lote (ver LoteAdaptativo)
+    :param engine: Engine: engine do banco
+    :param tabela: sa.Table: tabela de destino
+    :param linhas: Iterable[dict]: linhas a gravar, todas com as mesmas colunas; podem vir de um gerador
+    :param chave: list[str]: colunas que identificam a linha no upsert, padrão a chave primária
+    :param tamanho_lote: int: tamanho fixo dos lotes, None para ajustar pela latência
+    :param alvo_ms: float: latência máxima desejada por lote, em milissegundos, quando o tamanho é ajustado
+    :return: dict: gravadas, rejeitadas (posição em linhas e motivo), comandos, lotes, tamanho_lote (o último
+    escolhido), curva (tamanho, linhas, ms e linhas_seg de cada lote), segundos e linhas_seg
+    :raises ValueError: Se tamanho_lote não for positivo
+    """
+    controle = controleDeLote(engine, tabela, tamanho_lote, alvo_ms)
+    resultado = {'gravadas': 0, 'rejeitadas': [], 'comandos': 0, 'lotes': 0}
+    linhas = iter(linhas)
+    lidas = 0
+    inicio = time.perf_counter()
+    while True:
+        lote = list(islice(linhas, controle.tamanho))
+        if not lote:
+            break
+        inicio_lote = time.perf_counter()
+        gravacao = gravarLote(engine, tabela, lote, chave)
+        controle.registrar(len(lote), time.perf_counter() - inicio_lote)
+        resultado['gravadas'] += gravacao['gravadas']
+        resultado['comandos'] += gravacao['comandos']
+        resultado['rejeitadas'] += [(lidas + posicao, motivo) for posicao, motivo in gravacao['rejeitadas']]
+        resultado['lotes'] += 1
+        lidas += len(lote)
+    segundos = time.perf_counter() - inicio
+
+    resultado.update(controle.estatisticas())
+    resultado['segundos'] = segundos
+    resultado['linhas_seg'] = lidas / segundos if segundos > 0 else 0.0
+    return resultado
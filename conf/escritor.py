@@ -0,0 +1,219 @@
+# Este módulo implementa o modo de escrita assíncrona (write-behind) para o sqlite, que aceita apenas um escritor por
+# vez. Em vez de cada insert*/update*/delete* abrir a própria sessão e disputar o lock do banco, as operações são
+# enfileiradas para uma única thread escritora, que as agrupa em uma transação a cada intervalo_ms ou max_operacoes
+# (group commit) e devolve a cada chamador um Future com o resultado, resolvido somente após o commit do grupo.
+
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError
+from time import monotonic
+from typing import Any, Callable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from conf.db_session import ambientSession, savepointConnection
+
+_PARAR = object()
+
+
+class _Operacao:
+    """Operação enfileirada: a função a executar, seus argumentos e o Future entregue ao chamador"""
+
+    __slots__ = ('funcao', 'args', 'kwargs', 'futuro')
+
+    def __init__(self, funcao: Callable, args: tuple, kwargs: dict):
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.futuro: Future = Future()
+
+
+class EscritorUnico:
+    """Thread escritora única com group commit.
+
+    Uso:
+        with EscritorUnico(intervalo_ms=20, max_operacoes=500) as escritor:
+            futuro = escritor.submeter(Sabor.insertSabor, nome='Morango')
+            sabor = futuro.result()
+
+    As funções submetidas são os próprios métodos dos modelos: dentro da thread escritora, createSession devolve a
+    sessão do grupo (ver conf.db_session.ambientSession), e cada operação roda em um SAVEPOINT próprio, de modo que a
+    falha de uma operação desfaz apenas ela e é entregue no seu Future, sem afetar as demais do grupo.
+    """
+
+    def __init__(self, intervalo_ms: float = 20, max_operacoes: int = 500, sqlite: bool = True,
+                 tamanho_fila: int = 0):
+        """
+        :param intervalo_ms: float: tempo máximo, em ms, que a primeira operação de um grupo espera pelas seguintes
+        :param max_operacoes: int: quantidade máxima de operações confirmadas em um mesmo commit
+        :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
+        :param tamanho_fila: int: limite de operações pendentes na fila, 0 para ilimitado; ao atingi-lo, submeter
+        bloqueia o chamador até a escritora abrir espaço
+        :raises ValueError: Se intervalo_ms for negativo ou max_operacoes não for positivo
+        """
+        if intervalo_ms < 0:
+            raise ValueError('intervalo_ms não pode ser negativo!')
+        if max_operacoes <= 0:
+            raise ValueError('max_operacoes deve ser maior que zero!')
+
+        self.intervalo = intervalo_ms / 1000
+        self.max_operacoes = max_operacoes
+        self.sqlite = sqlite
+        self.grupos_confirmados = 0
+        self.operacoes_confirmadas = 0
+        self._fila: queue.Queue = queue.Queue(maxsize=tamanho_fila)
+        self._thread: Optional[threading.Thread] = None
+        self._trava = threading.Lock()
+        # exceção que encerrou a thread escritora, entregue às operações pendentes e às submetidas depois
+        self._erro: Optional[BaseException] = None
+
+    def __enter__(self) -> 'EscritorUnico':
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.parar()
+
+    def iniciar(self) -> None:
+        """Inicia a thread escritora, caso ainda não esteja em execução"""
+        with self._trava:
+            if self._thread is None or not self._thread.is_alive():
+                self._erro = None
+                self._thread = threading.Thread(target=self._executar, name='EscritorUnico', daemon=True)
+                self._thread.start()
+
+    def parar(self, timeout: Optional[float] = None) -> None:
+        """Confirma as operações já enfileiradas e encerra a thread escritora
+        :param timeout: float: tempo máximo, em segundos, para aguardar o encerramento
+        """
+        with self._trava:
+            if self._thread is None:
+                return
+            if self._thread.is_alive():
+                self._fila.put(_PARAR)
+                self._thread.join(timeout)
+            self._thread = None
+
+    def submeter(self, funcao: Callable, *args, **kwargs) -> Future:
+        """Enfileira uma operação de escrita
+        :param funcao: Callable: método a executar, normalmente um insert*/update*/delete* de um modelo
+        :return: Future: resolvido com o retorno da função, ou com a exceção lançada por ela, após o commit do grupo
+        :raises RuntimeError: Se a thread escritora não estiver em execução ou tiver sido encerrada por um erro
+        """
+        operacao = _Operacao(funcao, args, kwargs)
+        while True:
+            self._verificar_thread()
+            try:
+                # com a fila cheia, a espera é repetida para não bloquear para sempre se a escritora morrer
+                self._fila.put(operacao, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        # a escritora pode ter morrido depois da verificação, sem ver esta operação
+        if not self._thread.is_alive():
+            self._falhar_pendentes()
+        return operacao.futuro
+
+    def _verificar_thread(self) -> None:
+        thread = self._thread
+        if thread is None:
+            raise RuntimeError('EscritorUnico não iniciado, chame iniciar() ou use-o em um bloco with!')
+        if not thread.is_alive():
+            raise RuntimeError(f'EscritorUnico encerrado por erro: {self._erro}') from self._erro
+
+    def _falhar_pendentes(self, grupo: Optional[list[_Operacao]] = None) -> None:
+        """Entrega o erro que encerrou a escritora às operações do grupo em andamento e às que restaram na fila"""
+        erro = RuntimeError(f'EscritorUnico encerrado por erro: {self._erro}')
+        erro.__cause__ = self._erro
+        operacoes = list(grupo or [])
+        while True:
+            try:
+                operacao = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if operacao is not _PARAR:
+                operacoes.append(operacao)
+        for operacao in operacoes:
+            try:
+                operacao.futuro.set_exception(erro)
+            except InvalidStateError:
+                # já resolvido (ou cancelado) antes de a escritora morrer
+                continue
+
+    def _proximo_grupo(self) -> tuple[list[_Operacao], bool]:
+        """Aguarda a próxima operação e junta a ela as que chegarem em até intervalo_ms, limitado a max_operacoes
+        :return: tuple[list[_Operacao], bool]: operações do grupo e se foi pedido o encerramento
+        """
+        primeira = self._fila.get()
+        if primeira is _PARAR:
+            return [], True
+
+        grupo = [primeira]
+        limite = monotonic() + self.intervalo
+        while len(grupo) < self.max_operacoes:
+            try:
+                restante = limite - monotonic()
+                operacao = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if operacao is _PARAR:
+                return grupo, True
+            grupo.append(operacao)
+        return grupo, False
+
+    def _executar(self) -> None:
+        grupo: list[_Operacao] = []
+        try:
+            # conexão exclusiva da escritora, com SAVEPOINT habilitado para isolar as operações do grupo
+            with savepointConnection(sqlite=self.sqlite) as conexao:
+                encerrar = False
+                while not encerrar:
+                    grupo, encerrar = self._proximo_grupo()
+                    if grupo:
+                        self._confirmar_grupo(conexao, grupo)
+                    grupo = []
+        except BaseException as exc:
+            # sem a escritora, ninguém mais resolveria os Futures e os chamadores em result() esperariam para sempre
+            self._erro = exc
+            self._falhar_pendentes(grupo)
+
+    def _confirmar_grupo(self, conexao: sa.engine.Connection, grupo: list[_Operacao]) -> None:
+        """Executa as operações do grupo em uma única transação e resolve os Futures após o commit"""
+        resultados: list[tuple[_Operacao, Any, Optional[BaseException]]] = []
+        session = Session(bind=conexao, expire_on_commit=False)
+        try:
+            with ambientSession(session):
+                for operacao in grupo:
+                    if not operacao.futuro.set_running_or_notify_cancel():
+                        continue
+                    savepoint = session.begin_nested()
+                    try:
+                        resultado = operacao.funcao(*operacao.args, **operacao.kwargs)
+                    except Exception as exc:
+                        savepoint.rollback()
+                        resultados.append((operacao, None, exc))
+                        continue
+                    # os métodos que capturam o erro e retornam None deixam o savepoint inválido, sem relançar
+                    if savepoint.is_active:
+                        savepoint.commit()
+                    else:
+                        savepoint.rollback()
+                    resultados.append((operacao, resultado, None))
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            for operacao in grupo:
+                if operacao.futuro.running():
+                    operacao.futuro.set_exception(exc)
+            return
+        finally:
+            session.close()
+
+        self.grupos_confirmados += 1
+        self.operacoes_confirmadas += len(resultados)
+        for operacao, resultado, erro in resultados:
+            if erro is not None:
+                operacao.futuro.set_exception(erro)
+            else:
+                operacao.futuro.set_result(resultado)
@@ -0,0 +1,333 @@
+# Este módulo mantém estatísticas por comando SQL emitido pela camada de modelos, no estilo do pg_stat_statements.
+# Os comandos são normalizados em fingerprints (literais e parâmetros viram ?, listas do IN viram ...) e, para cada
+# fingerprint, são acumulados chamadas, tempo total/médio/mínimo/máximo, linhas retornadas ou afetadas, erros e um
+# histograma de latência. Comandos acima do limite configurado vão para o log de consultas lentas. Os dados podem ser
+# exportados em JSON ou em tabela.
+#
+# Uso:
+#     from conf import estatisticas_sql
+#     estatisticas_sql.habilitar(limite_lento_ms=50, arquivo_lento='db/consultas_lentas.jsonl')
+#     ...
+#     print(estatisticas_sql.ESTATISTICAS.tabela(n=20))
+
+import hashlib
+import json
+import re
+import threading
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+
+# limites superiores, em ms, das faixas do histograma de latência; a última faixa é a de valores acima de 1s
+FAIXAS_HISTOGRAMA_MS: tuple[float, ...] = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_RE_TEXTO = re.compile(r"'(?:''|[^'])*'")
+_RE_NUMERO = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_RE_PARAMETRO = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_RE_LISTAS_REPETIDAS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql: str) -> str:
+    """Normaliza um comando SQL para que execuções com valores diferentes tenham o mesmo fingerprint
+    :param sql: str: comando SQL como enviado ao driver
+    :return: str: comando com literais e parâmetros trocados por ?, listas de valores por (...) e espaços colapsados
+    """
+    sql = _RE_TEXTO.sub('?', sql)
+    sql = _RE_PARAMETRO.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(...)', sql)
+    sql = _RE_LISTAS_REPETIDAS.sub('(...)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()
+
+
+def fingerprint(sql_normalizado: str) -> str:
+    """:return: str: identificador curto e estável do comando normalizado"""
+    return hashlib.md5(sql_normalizado.encode('utf-8')).hexdigest()[:16]
+
+
+class EstatisticaComando:
+    """Estatísticas acumuladas de um fingerprint"""
+
+    __slots__ = ('fingerprint', 'sql', 'chamadas', 'erros', 'tempo_total_ms', 'tempo_min_ms', 'tempo_max_ms',
+                 'linhas', 'histograma', 'primeira_execucao', 'ultima_execucao')
+
+    def __init__(self, id_fingerprint: str, sql: str):
+        self.fingerprint = id_fingerprint
+        self.sql = sql
+        self.chamadas = 0
+        self.erros = 0
+        self.tempo_total_ms = 0.0
+        self.tempo_min_ms = float('inf')
+        self.tempo_max_ms = 0.0
+        self.linhas = 0
+        self.histograma = [0] * (len(FAIXAS_HISTOGRAMA_MS) + 1)
+        self.primeira_execucao: Optional[datetime] = None
+        self.ultima_execucao: Optional[datetime] = None
+
+    @property
+    def tempo_medio_ms(self) -> float:
+        return self.tempo_total_ms / self.chamadas if self.chamadas else 0.0
+
+    def paraDict(self) -> dict:
+        """:return: dict: estatísticas em tipos serializáveis em JSON"""
+        faixas = [f'<={limite}ms' for limite in FAIXAS_HISTOGRAMA_MS] + [f'>{FAIXAS_HISTOGRAMA_MS[-1]}ms']
+        return {
+            'fingerprint': self.fingerprint,
+            'sql': self.sql,
+            'chamadas': self.chamadas,
+            'erros': self.erros,
+            'tempo_total_ms': round(self.tempo_total_ms, 3),
+            'tempo_medio_ms': round(self.tempo_medio_ms, 3),
+            'tempo_min_ms': round(self.tempo_min_ms, 3) if self.chamadas else 0.0,
+            'tempo_max_ms': round(self.tempo_max_ms, 3),
+            'linhas': self.linhas,
+            'histograma': dict(zip(faixas, self.histograma)),
+            'primeira_execucao': self.primeira_execucao.isoformat() if self.primeira_execucao else None,
+            'ultima_execucao': self.ultima_execucao.isoformat() if self.ultima_execucao else None,
+        }
+
+
+class _CursorContador:
+    """Envolve o cursor do driver para contar as linhas efetivamente lidas de um SELECT. Ao ser fechado, o que o
+    SQLAlchemy faz ao terminar de consumir o resultado, repassa a contagem ao registro.
+    """
+
+    def __init__(self, cursor, registro: 'EstatisticasSql', id_fingerprint: str):
+        self._cursor = cursor
+        self._registro = registro
+        self._fingerprint = id_fingerprint
+        self._linhas = 0
+        self._fechado = False
+
+    def fetchone(self):
+        linha = self._cursor.fetchone()
+        if linha is not None:
+            self._linhas += 1
+        return linha
+
+    def fetchmany(self, *args):
+        linhas = self._cursor.fetchmany(*args)
+        self._linhas += len(linhas)
+        return linhas
+
+    def fetchall(self):
+        linhas = self._cursor.fetchall()
+        self._linhas += len(linhas)
+        return linhas
+
+    def close(self):
+        if not self._fechado:
+            self._fechado = True
+            self._registro.somarLinhas(self._fingerprint, self._linhas)
+        self._cursor.close()
+
+    def __iter__(self):
+        for linha in self._cursor:
+            self._linhas += 1
+            yield linha
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+class EstatisticasSql:
+    """Registro das estatísticas por fingerprint, seguro para uso por várias threads"""
+
+    def __init__(self, limite_lento_ms: float = 100, tamanho_log_lento: int = 1000,
+                 arquivo_lento: Optional[str] = None, registrar_parametros: bool = False):
+        """
+        :param limite_lento_ms: float: duração a partir da qual o comando entra no log de consultas lentas
+        :param tamanho_log_lento: int: quantidade de consultas lentas mantidas em memória
+        :param arquivo_lento: str: arquivo JSONL onde as consultas lentas também são gravadas, opcional
+        :param registrar_parametros: bool: se True, grava os parâmetros das consultas lentas, que podem conter dados
+        sensíveis
+        """
+        self.limite_lento_ms = limite_lento_ms
+        self.arquivo_lento = arquivo_lento
+        self.registrar_parametros = registrar_parametros
+        self.consultas_lentas: deque = deque(maxlen=tamanho_log_lento)
+        self._comandos: dict[str, EstatisticaComando] = {}
+        self._cache_normalizacao: dict[str, tuple[str, str]] = {}
+        self._trava = threading.Lock()
+
+    def _identificar(self, sql: str) -> tuple[str, str]:
+        """Normaliza o comando, reaproveitando o resultado para textos já vistos (o SQLAlchemy repete o mesmo texto
+        a cada execução de um comando em cache, então a normalização roda uma vez por texto)
+        """
+        identificado = self._cache_normalizacao.get(sql)
+        if identificado is None:
+            normalizado = normalizar_sql(sql)
+            identificado = (fingerprint(normalizado), normalizado)
+            if len(self._cache_normalizacao) < 10_000:
+                self._cache_normalizacao[sql] = identificado
+        return identificado
+
+    def registrar(self, sql: str, duracao_ms: float, linhas: int = 0, erro: bool = False,
+                  parametros=None) -> str:
+        """Acumula uma execução do comando
+        :param sql: str: comando como enviado ao driver
+        :param duracao_ms: float: duração da execução
+        :param linhas: int: linhas afetadas (as linhas lidas de um SELECT são somadas depois, via somarLinhas)
+        :param erro: bool: se a execução falhou
+        :param parametros: parâmetros da execução, usados apenas no log de consultas lentas
+        :return: str: fingerprint do comando
+        """
+        id_fingerprint, normalizado = self._identificar(sql)
+        agora = datetime.now()
+        with self._trava:
+            estatistica = self._comandos.get(id_fingerprint)
+            if estatistica is None:
+                estatistica = self._comandos[id_fingerprint] = EstatisticaComando(id_fingerprint, normalizado)
+                estatistica.primeira_execucao = agora
+            estatistica.chamadas += 1
+            estatistica.erros += int(erro)
+            estatistica.tempo_total_ms += duracao_ms
+            estatistica.tempo_min_ms = min(estatistica.tempo_min_ms, duracao_ms)
+            estatistica.tempo_max_ms = max(estatistica.tempo_max_ms, duracao_ms)
+            estatistica.linhas += max(linhas, 0)
+            estatistica.histograma[bisect_left(FAIXAS_HISTOGRAMA_MS, duracao_ms)] += 1
+            estatistica.ultima_execucao = agora
+
+        if duracao_ms >= self.limite_lento_ms:
+            self._registrar_lenta(agora, id_fingerprint, sql, duracao_ms, parametros)
+        return id_fingerprint
+
+    def somarLinhas(self, id_fingerprint: str, linhas: int) -> None:
+        """Soma as linhas lidas de um SELECT ao fingerprint"""
+        with self._trava:
+            estatistica = self._comandos.get(id_fingerprint)
+            if estatistica is not None:
+                estatistica.linhas += linhas
+
+    def _registrar_lenta(self, agora: datetime, id_fingerprint: str, sql: str, duracao_ms: float,
+                         parametros) -> None:
+        entrada = {'data': agora.isoformat(), 'duracao_ms': round(duracao_ms, 3), 'fingerprint': id_fingerprint,
+                   'sql': sql}
+        if self.registrar_parametros and parametros is not None:
+            entrada['parametros'] = repr(parametros)[:1000]
+        self.consultas_lentas.append(entrada)
+        if self.arquivo_lento:
+            with self._trava, open(self.arquivo_lento, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+    def comandos(self, ordem: str = 'tempo_total_ms', n: Optional[int] = None) -> list[EstatisticaComando]:
+        """Estatísticas ordenadas da maior para a menor
+        :param ordem: str: atributo usado na ordenação (tempo_total_ms, tempo_medio_ms, tempo_max_ms, chamadas,
+        linhas ou erros)
+        :param n: int: quantidade de comandos retornados, por padrão todos
+        :return: list[EstatisticaComando]: estatísticas de cada fingerprint
+        :raises ValueError: Se a ordem não for um atributo conhecido
+        """
+        if ordem not in ('tempo_total_ms', 'tempo_medio_ms', 'tempo_max_ms', 'chamadas', 'linhas', 'erros'):
+            raise ValueError(f'Ordem {ordem} desconhecida!')
+        with self._trava:
+            comandos = list(self._comandos.values())
+        comandos.sort(key=lambda estatistica: getattr(estatistica, ordem), reverse=True)
+        return comandos[:n] if n is not None else comandos
+
+    def paraJson(self, caminho: Optional[str] = None, ordem: str = 'tempo_total_ms') -> str:
+        """Exporta as estatísticas e as consultas lentas em JSON
+        :param caminho: str: arquivo onde o JSON será gravado, opcional
+        :param ordem: str: ordenação dos comandos, ver comandos()
+        :return: str: o JSON gerado
+        """
+        documento = json.dumps({'data': datetime.now().isoformat(), 'limite_lento_ms': self.limite_lento_ms,
+                                'comandos': [estatistica.paraDict() for estatistica in self.comandos(ordem)],
+                                'consultas_lentas': list(self.consultas_lentas)}, indent=2, ensure_ascii=False)
+        if caminho:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(documento)
+        return documento
+
+    def tabela(self, n: int = 20, ordem: str = 'tempo_total_ms', largura_sql: int = 80) -> str:
+        """Formata os comandos mais custosos em uma tabela de texto
+        :param n: int: quantidade de comandos listados
+        :param ordem: str: ordenação dos comandos, ver comandos()
+        :param largura_sql: int: quantidade de caracteres do comando exibidos
+        :return: str: a tabela
+        """
+        linhas = [f'{"fingerprint":<16} {"chamadas":>9} {"total ms":>11} {"médio ms":>9} {"max ms":>9} '
+                  f'{"linhas":>9} {"erros":>6}  sql']
+        for e in self.comandos(ordem, n):
+            sql = e.sql if len(e.sql) <= largura_sql else e.sql[:largura_sql - 3] + '...'
+            linhas.append(f'{e.fingerprint:<16} {e.chamadas:>9} {e.tempo_total_ms:>11.2f} {e.tempo_medio_ms:>9.3f} '
+                          f'{e.tempo_max_ms:>9.2f} {e.linhas:>9} {e.erros:>6}  {sql}')
+        return '\n'.join(linhas)
+
+    def limpar(self) -> None:
+        """Descarta as estatísticas e as consultas lentas acumuladas"""
+        with self._trava:
+            self._comandos.clear()
+            self.consultas_lentas.clear()
+
+
+# registro usado pelos eventos instalados por habilitar()
+ESTATISTICAS = EstatisticasSql()
+
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('estatisticas_sql_inicio', []).append(perf_counter())
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    duracao_ms = (perf_counter() - conn.info['estatisticas_sql_inicio'].pop()) * 1000
+    if cursor.description is None:
+        # DML: o driver já informa as linhas afetadas
+        ESTATISTICAS.registrar(statement, duracao_ms, linhas=cursor.rowcount, parametros=parameters)
+        return
+    id_fingerprint = ESTATISTICAS.registrar(statement, duracao_ms, parametros=parameters)
+    if context is not None:
+        # o resultado é montado a partir de context.cursor logo após este evento, então as leituras passam a ser
+        # contadas pelo envoltório
+        context.cursor = _CursorContador(cursor, ESTATISTICAS, id_fingerprint)
+
+
+def _erro_execucao(exception_context):
+    inicios = exception_context.connection.info.get('estatisticas_sql_inicio') \
+        if exception_context.connection is not None else None
+    if not inicios or exception_context.statement is None:
+        return
+    duracao_ms = (perf_counter() - inicios.pop()) * 1000
+    ESTATISTICAS.registrar(exception_context.statement, duracao_ms, erro=True,
+                           parametros=exception_context.parameters)
+
+
+def habilitar(limite_lento_ms: Optional[float] = None, arquivo_lento: Optional[str] = None,
+              registrar_parametros: Optional[bool] = None) -> EstatisticasSql:
+    """Passa a registrar as estatísticas de todos os comandos executados por qualquer engine
+    :param limite_lento_ms: float: duração a partir da qual o comando entra no log de consultas lentas
+    :param arquivo_lento: str: arquivo JSONL onde as consultas lentas também são gravadas
+    :param registrar_parametros: bool: se True, grava os parâmetros das consultas lentas
+    :return: EstatisticasSql: o registro em uso
+    """
+    if limite_lento_ms is not None:
+        ESTATISTICAS.limite_lento_ms = limite_lento_ms
+    if arquivo_lento is not None:
+        ESTATISTICAS.arquivo_lento = arquivo_lento
+    if registrar_parametros is not None:
+        ESTATISTICAS.registrar_parametros = registrar_parametros
+    if not habilitado():
+        sa.event.listen(Engine, 'before_cursor_execute', _antes_execucao)
+        sa.event.listen(Engine, 'after_cursor_execute', _depois_execucao)
+        sa.event.listen(Engine, 'handle_error', _erro_execucao)
+    return ESTATISTICAS
+
+
+def desabilitar() -> None:
+    """Para de registrar as estatísticas, mantendo as já acumuladas"""
+    if habilitado():
+        sa.event.remove(Engine, 'before_cursor_execute', _antes_execucao)
+        sa.event.remove(Engine, 'after_cursor_execute', _depois_execucao)
+        sa.event.remove(Engine, 'handle_error', _erro_execucao)
+
+
+def habilitado() -> bool:
+    """:return: bool: se os eventos de estatísticas estão instalados"""
+    return sa.event.contains(Engine, 'before_cursor_execute', _antes_execucao)
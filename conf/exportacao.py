@@ -0,0 +1,128 @@
+# Este módulo exporta uma tabela, ou uma consulta filtrada, para CSV ou JSONL, opcionalmente compactado com gzip.
+# Ao contrário dos métodos selectAll* dos modelos, que montam objetos do ORM com os relacionamentos carregados em uma
+# lista, as linhas são lidas do cursor em lotes (fetchmany, com stream_results nos bancos que têm cursor no
+# servidor, como o postgres) e escritas direto no arquivo, então a memória usada não depende do tamanho da tabela.
+
+import csv
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional, Union
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from conf.db_session import createEngine
+from models.model_base import ModelBase
+
+FORMATOS = ('csv', 'jsonl')
+
+
+def _valor_texto(valor):
+    """Converte datas e decimais para texto, no mesmo formato no CSV e no JSONL"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def formatoDoArquivo(caminho: str) -> tuple[str, bool]:
+    """Formato e compactação deduzidos da extensão: .csv, .jsonl, .csv.gz ou .jsonl.gz
+    :param caminho: str: arquivo de saída
+    :return: tuple[str, bool]: formato e se o arquivo é compactado com gzip
+    :raises ValueError: Se a extensão não for de um formato suportado
+    """
+    sufixos = [sufixo.lower() for sufixo in Path(caminho).suffixes]
+    gzip_ = bool(sufixos) and sufixos[-1] == '.gz'
+    if gzip_:
+        sufixos = sufixos[:-1]
+    formato = sufixos[-1].lstrip('.') if sufixos else ''
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato de exportação não suportado: {caminho}, use .csv, .jsonl, .csv.gz ou .jsonl.gz')
+    return formato, gzip_
+
+
+def _consulta(origem: Union[str, type, sa.Table, Select]) -> Select:
+    """Consulta Core a exportar a partir do nome da tabela, do modelo, da Table ou da própria consulta"""
+    if isinstance(origem, Select):
+        return origem
+    if isinstance(origem, str):
+        import models.__all_models
+
+        if origem not in ModelBase.metadata.tables:
+            raise ValueError(f'Tabela {origem} não encontrada nos modelos!')
+        origem = ModelBase.metadata.tables[origem]
+    elif isinstance(origem, type) and issubclass(origem, ModelBase):
+        origem = origem.__table__
+    if not isinstance(origem, sa.Table):
+        raise TypeError('Exporte o nome de uma tabela, um modelo, uma Table ou uma consulta select!')
+    return sa.select(origem).order_by(*origem.primary_key.columns)
+
+
+def exportar(origem: Union[str, type, sa.Table, Select], caminho: str, formato: Optional[str] = None,
+             compactar: Optional[bool] = None, tamanho_lote: int = 10_000, engine: Optional[Engine] = None) -> dict:
+    """Exporta as linhas da origem para o arquivo, lendo e escrevendo um lote por vez. O arquivo é escrito com outro
+    nome e renomeado ao final, então um arquivo com o nome pedido está sempre completo.
+    :param origem: str | type | sa.Table | Select: nome da tabela, modelo, Table ou consulta (por exemplo
+    sa.select(NotaFiscal.__table__).where(...)). Tabelas são exportadas na ordem da chave primária
+    :param caminho: str: arquivo de saída
+    :param formato: str: csv ou jsonl, por padrão deduzido da extensão do arquivo
+    :param compactar: bool: se True, compacta com gzip, por padrão deduzido da extensão .gz
+    :param tamanho_lote: int: linhas lidas do cursor por vez
+    :param engine: Engine: engine do banco, padrão a da camada de acesso
+    :return: dict: caminho, linhas, bytes, segundos e linhas_seg
+    :raises ValueError: Se o formato não for suportado ou o tamanho_lote não for positivo
+    """
+    if formato is None or compactar is None:
+        formato_arquivo, compactar_arquivo = formatoDoArquivo(caminho)
+        formato = formato or formato_arquivo
+        compactar = compactar_arquivo if compactar is None else compactar
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato de exportação não suportado: {formato}, use csv ou jsonl')
+    if tamanho_lote <= 0:
+        raise ValueError('tamanho_lote deve ser maior que zero!')
+
+    consulta = _consulta(origem)
+    engine = engine or createEngine()
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    provisorio = caminho.with_name(caminho.name + '.tmp')
+    abrir = gzip.open if compactar else open
+
+    linhas = 0
+    inicio = time.perf_counter()
+    try:
+        with engine.connect() as conexao, abrir(provisorio, 'wt', encoding='utf-8', newline='') as arquivo:
+            resultado = conexao.execution_options(stream_results=True, max_row_buffer=tamanho_lote).execute(consulta)
+            colunas = list(resultado.keys())
+            escritor = None
+            if formato == 'csv':
+                escritor = csv.writer(arquivo)
+                escritor.writerow(colunas)
+            while True:
+                lote = resultado.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                if escritor is not None:
+                    escritor.writerows([_valor_texto(valor) for valor in linha] for linha in lote)
+                else:
+                    arquivo.writelines(json.dumps(dict(zip(colunas, linha)), default=_valor_texto,
+                                                  ensure_ascii=False) + '\n' for linha in lote)
+                linhas += len(lote)
+        os.replace(provisorio, caminho)
+    except Exception:
+        provisorio.unlink(missing_ok=True)
+        raise
+    segundos = time.perf_counter() - inicio
+
+    relatorio = {'caminho': str(caminho), 'linhas': linhas, 'bytes': caminho.stat().st_size, 'segundos': segundos,
+                 'linhas_seg': linhas / segundos if segundos > 0 else 0.0}
+    print(f'Exportação {caminho} concluída: {linhas} linhas em {segundos:.2f} s '
+          f'({relatorio["linhas_seg"]:.0f} linhas/s)')
+    return relatorio
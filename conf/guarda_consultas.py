@@ -0,0 +1,185 @@
+# Este módulo conta os comandos SQL executados em um bloco de código e detecta consultas N+1: o mesmo SELECT
+# (mesmo fingerprint, ver conf.estatisticas_sql) repetido várias vezes em uma unidade de trabalho, o padrão típico de
+# relacionamentos carregados um a um (lazy load) dentro de um laço.
+#
+# Nos testes:
+#     with contarConsultas(maximo=2) as contagem:
+#         Picole.insertPicole(...)
+#     # ConsultasExcedidasError se mais de 2 comandos forem executados no bloco
+#
+# Em desenvolvimento, com a variável de ambiente MODO_DEV=1 (ou habilitarModoDev()), cada sessão é tratada como uma
+# unidade de trabalho e os SELECTs repetidos dentro dela geram um PossivelNMais1Warning com a pilha de chamadas.
+
+import os
+import threading
+import traceback
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+from conf.estatisticas_sql import fingerprint, normalizar_sql
+
+_RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_ativas = threading.local()
+_modo_dev = {'ativo': False, 'limite_repeticoes': 3}
+_TIPOS_IGNORADOS = ('PRAGMA', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+
+class ConsultasExcedidasError(AssertionError):
+    """Lançada quando um bloco executa mais comandos SQL do que o máximo permitido, ou quando o bloco exige que não
+    haja N+1 e ele foi detectado"""
+
+
+class PossivelNMais1Warning(UserWarning):
+    """Aviso de SELECT repetido dentro de uma mesma unidade de trabalho"""
+
+
+def pilhaDoProjeto(limite: int = 8) -> str:
+    """Pilha de chamadas atual restrita aos arquivos do projeto, sem as camadas do SQLAlchemy e deste módulo
+    :param limite: int: quantidade máxima de frames, contados a partir do mais interno
+    :return: str: a pilha formatada
+    """
+    frames = [frame for frame in traceback.extract_stack()[:-1]
+              if frame.filename.startswith(_RAIZ_PROJETO) and frame.filename != __file__
+              and 'site-packages' not in frame.filename]
+    return ''.join(traceback.format_list(frames[-limite:]))
+
+
+class ContagemConsultas:
+    """Comandos executados em uma unidade de trabalho e os SELECTs repetidos nela"""
+
+    def __init__(self, maximo: Optional[int] = None, limite_repeticoes: int = 3,
+                 tipos_ignorados: tuple[str, ...] = _TIPOS_IGNORADOS, avisar_n_mais_1: bool = True):
+        """
+        :param maximo: int: quantidade máxima de comandos, None para não limitar
+        :param limite_repeticoes: int: quantidade de execuções do mesmo SELECT a partir da qual ele é tratado como N+1
+        :param tipos_ignorados: tuple[str, ...]: comandos que não entram na contagem, por padrão o PRAGMA que
+        createSession executa em cada sessão e o controle de SAVEPOINT da sessão ambiente dos testes
+        :param avisar_n_mais_1: bool: se True, emite PossivelNMais1Warning ao detectar um N+1
+        """
+        self.maximo = maximo
+        self.limite_repeticoes = limite_repeticoes
+        self.tipos_ignorados = tuple(tipo.upper() for tipo in tipos_ignorados)
+        self.avisar_n_mais_1 = avisar_n_mais_1
+        self.comandos: list[str] = []
+        self.repeticoes: Counter = Counter()
+        self.suspeitas: list[dict] = []
+        self._sql_por_fingerprint: dict[str, str] = {}
+
+    @property
+    def total(self) -> int:
+        return len(self.comandos)
+
+    def registrar(self, statement: str) -> None:
+        """Contabiliza um comando executado"""
+        tipo = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        if tipo in self.tipos_ignorados:
+            return
+        self.comandos.append(statement)
+        if tipo != 'SELECT':
+            return
+        normalizado = normalizar_sql(statement)
+        id_fingerprint = fingerprint(normalizado)
+        self._sql_por_fingerprint[id_fingerprint] = normalizado
+        self.repeticoes[id_fingerprint] += 1
+        if self.repeticoes[id_fingerprint] == self.limite_repeticoes:
+            suspeita = {'fingerprint': id_fingerprint, 'sql': normalizado, 'pilha': pilhaDoProjeto()}
+            self.suspeitas.append(suspeita)
+            if self.avisar_n_mais_1:
+                warnings.warn(PossivelNMais1Warning(self._descrever_suspeita(suspeita)), stacklevel=2)
+
+    def _descrever_suspeita(self, suspeita: dict) -> str:
+        return (f'Possível N+1: o mesmo SELECT foi executado {self.repeticoes[suspeita["fingerprint"]]} vezes na '
+                f'mesma unidade de trabalho.\nSQL: {suspeita["sql"]}\nPilha:\n{suspeita["pilha"]}')
+
+    def relatorio(self) -> str:
+        """:return: str: comandos executados e N+1 detectados, para mensagens de erro"""
+        linhas = [f'{self.total} comandos executados:']
+        linhas += [f'  {indice}. {comando.strip()}' for indice, comando in enumerate(self.comandos, start=1)]
+        for suspeita in self.suspeitas:
+            linhas.append(self._descrever_suspeita(suspeita))
+        return '\n'.join(linhas)
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    for contagem in getattr(_ativas, 'pilha', ()):
+        contagem.registrar(statement)
+    unidade = conn.info.get('guarda_consultas')
+    if unidade is not None:
+        unidade.registrar(statement)
+
+
+def _instalar() -> None:
+    if not sa.event.contains(Engine, 'after_cursor_execute', _depois_execucao):
+        sa.event.listen(Engine, 'after_cursor_execute', _depois_execucao)
+
+
+@contextmanager
+def contarConsultas(maximo: Optional[int] = None, limite_repeticoes: int = 3, falhar_em_n_mais_1: bool = False,
+                    tipos_ignorados: tuple[str, ...] = _TIPOS_IGNORADOS) -> Iterator[ContagemConsultas]:
+    """Conta os comandos SQL executados pela thread atual dentro do bloco
+    :param maximo: int: quantidade máxima de comandos permitida no bloco, None para apenas contar
+    :param limite_repeticoes: int: execuções do mesmo SELECT a partir das quais ele é tratado como N+1
+    :param falhar_em_n_mais_1: bool: se True, um N+1 detectado faz o bloco falhar; caso contrário, apenas gera aviso
+    :param tipos_ignorados: tuple[str, ...]: comandos que não entram na contagem
+    :return: Iterator[ContagemConsultas]: a contagem, que pode ser inspecionada dentro e depois do bloco
+    :raises ConsultasExcedidasError: Se o bloco exceder o máximo, ou tiver N+1 com falhar_em_n_mais_1
+    """
+    _instalar()
+    contagem = ContagemConsultas(maximo=maximo, limite_repeticoes=limite_repeticoes, tipos_ignorados=tipos_ignorados)
+    pilha = getattr(_ativas, 'pilha', None)
+    if pilha is None:
+        pilha = _ativas.pilha = []
+    pilha.append(contagem)
+    try:
+        yield contagem
+    finally:
+        pilha.remove(contagem)
+
+    # as verificações ficam fora do evento da engine porque os métodos dos modelos capturam as exceções lançadas
+    # durante a execução
+    if maximo is not None and contagem.total > maximo:
+        raise ConsultasExcedidasError(f'Esperados no máximo {maximo} comandos SQL. {contagem.relatorio()}')
+    if falhar_em_n_mais_1 and contagem.suspeitas:
+        raise ConsultasExcedidasError(f'N+1 detectado. {contagem.relatorio()}')
+
+
+def _inicio_transacao(session, transaction, connection):
+    unidade = session.info.get('guarda_consultas')
+    if unidade is None:
+        unidade = session.info['guarda_consultas'] = ContagemConsultas(
+            limite_repeticoes=_modo_dev['limite_repeticoes'])
+    connection.info['guarda_consultas'] = unidade
+
+
+def _devolucao_conexao(dbapi_connection, connection_record):
+    connection_record.info.pop('guarda_consultas', None)
+
+
+def habilitarModoDev(limite_repeticoes: int = 3) -> None:
+    """Passa a tratar cada sessão como uma unidade de trabalho e a avisar os SELECTs repetidos nela
+    :param limite_repeticoes: int: execuções do mesmo SELECT na sessão a partir das quais ele é tratado como N+1
+    """
+    _modo_dev.update(ativo=True, limite_repeticoes=limite_repeticoes)
+    _instalar()
+    if not sa.event.contains(Session, 'after_begin', _inicio_transacao):
+        sa.event.listen(Session, 'after_begin', _inicio_transacao)
+        sa.event.listen(Pool, 'checkin', _devolucao_conexao)
+
+
+def desabilitarModoDev() -> None:
+    """Desliga a detecção de N+1 por sessão"""
+    _modo_dev['ativo'] = False
+    if sa.event.contains(Session, 'after_begin', _inicio_transacao):
+        sa.event.remove(Session, 'after_begin', _inicio_transacao)
+        sa.event.remove(Pool, 'checkin', _devolucao_conexao)
+
+
+if os.environ.get('MODO_DEV', '').lower() in ('1', 'true', 'sim'):
+    habilitarModoDev(limite_repeticoes=int(os.environ.get('MODO_DEV_LIMITE_N_MAIS_1', '3')))
@@ -16,8 +16,8 @@ def gerar_string(frase: bool = False) -> str:
     return texto
 
 
-def gerar_int() -> int:
-    valor = random.randint(1, 100)
+def gerar_int(maximo: int = 100) -> int:
+    valor = random.randint(1, maximo)
 
     return valor
 
@@ -0,0 +1,279 @@
+# Este módulo importa arquivos CSV ou JSONL (opcionalmente compactados com gzip) enviados pelos parceiros para as
+# tabelas de cadastro, sem um insert* do modelo por linha. O arquivo é lido em lotes; cada registro é normalizado
+# como nos métodos insert* dos modelos (textos com strip().upper(), valores arredondados em 2 casas) e as FKs são
+# resolvidas pela chave natural da tabela referenciada (por exemplo o cnpj do revendedor da nota fiscal), com um
+# cache nome→id consultado apenas para os valores ainda não vistos. Cada lote é gravado com upsert pela chave
+# natural, em uma transação (ver conf.escrita_em_lote), de modo que importar o mesmo arquivo de novo atualiza as
+# linhas em vez de duplicá-las.
+#
+# Registros inválidos, com FK não encontrada ou que violam alguma restrição do banco não interrompem a importação:
+# vão para o arquivo de erros (JSONL, por padrão <arquivo>.erros.jsonl), com o número da linha no arquivo, o motivo
+# e o registro original.
+
+import csv
+import gzip
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+
+from conf.db_session import createEngine
+from conf.escrita_em_lote import controleDeLote, gravarLote
+from conf.exportacao import FORMATOS, formatoDoArquivo
+from models.model_base import ModelBase
+
+# regras de cada tabela importável:
+#   chave: colunas da chave natural, usadas no upsert
+#   textos: colunas de texto obrigatórias, normalizadas com strip().upper()
+#   decimais: colunas numéricas obrigatórias, arredondadas em 2 casas
+#   tamanhos: tamanho exato exigido de colunas de texto
+#   fks: campo do arquivo -> (tabela referenciada, coluna da chave natural dela, coluna da FK)
+IMPORTACOES = {
+    'sabor': {'chave': ('nome',), 'textos': ('nome',)},
+    'tipo_embalagem': {'chave': ('nome',), 'textos': ('nome',)},
+    'tipo_picole': {'chave': ('nome',), 'textos': ('nome',)},
+    'ingrediente': {'chave': ('nome',), 'textos': ('nome',)},
+    'conservante': {'chave': ('nome',), 'textos': ('nome', 'descricao')},
+    'aditivo_nutritivo': {'chave': ('nome',), 'textos': ('nome', 'formula_quimica')},
+    'revendedor': {'chave': ('cnpj',), 'textos': ('nome', 'cnpj', 'razao_social', 'contato'),
+                   'tamanhos': {'cnpj': 14}},
+    'nota_fiscal': {'chave': ('numero_serie',), 'textos': ('numero_serie', 'descricao'), 'decimais': ('valor',),
+                    'fks': {'revendedor_cnpj': ('revendedor', 'cnpj', 'revendedor_fk')}},
+    'picole': {'chave': ('sabor_tipoPicole_tipoEmbalagem',), 'decimais': ('preco',),
+               'fks': {'sabor_nome': ('sabor', 'nome', 'sabor_fk'),
+                       'tipo_embalagem_nome': ('tipo_embalagem', 'nome', 'tipo_embalagem_fk'),
+                       'tipo_picole_nome': ('tipo_picole', 'nome', 'tipo_picole_fk')}},
+}
+
+
+class MapaChaves:
+    """Cache chave natural -> id de uma tabela referenciada. Só os valores ainda não vistos são consultados, em
+    blocos, para não passar do limite de parâmetros por comando do banco"""
+
+    TAMANHO_BLOCO = 500
+
+    def __init__(self, tabela: sa.Table, coluna: str):
+        self.tabela = tabela
+        self.coluna = tabela.c[coluna]
+        self.ids: dict[str, int] = {}
+        self.consultas = 0
+
+    def resolver(self, conexao: Connection, valores: set[str]) -> dict[str, int]:
+        faltantes = sorted(valor for valor in valores if valor not in self.ids)
+        for inicio in range(0, len(faltantes), self.TAMANHO_BLOCO):
+            bloco = faltantes[inicio:inicio + self.TAMANHO_BLOCO]
+            self.consultas += 1
+            self.ids.update(conexao.execute(sa.select(self.coluna, self.tabela.c.id)
+                                            .where(self.coluna.in_(bloco))).all())
+        return self.ids
+
+
+def _texto(registro: dict, campo: str, tabela: str) -> str:
+    valor = registro.get(campo)
+    if valor is None:
+        raise ValueError(f'{campo} de {tabela} não informado!')
+    if not isinstance(valor, str):
+        raise ValueError(f'{campo} de {tabela} deve ser uma string!')
+    valor = valor.strip().upper()
+    if not valor:
+        raise ValueError(f'{campo} de {tabela} não informado!')
+    return valor
+
+
+def _decimal(registro: dict, campo: str, tabela: str) -> float:
+    valor = registro.get(campo)
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        raise ValueError(f'{campo} de {tabela} não informado!')
+    if isinstance(valor, bool):
+        raise ValueError(f'{campo} de {tabela} deve ser um número!')
+    try:
+        return round(float(valor), 2)
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} de {tabela} deve ser um número!') from None
+
+
+def normalizarRegistro(tabela: str, registro: dict) -> dict:
+    """Valida e normaliza um registro do arquivo como os métodos insert* dos modelos. As FKs continuam pela chave
+    natural, nos campos do arquivo, e são resolvidas depois, por lote
+    :param tabela: str: tabela importada, uma das de IMPORTACOES
+    :param registro: dict: registro lido do arquivo
+    :return: dict: colunas da tabela normalizadas e os valores das chaves naturais das FKs
+    :raises ValueError: Se o registro for inválido
+    """
+    regras = IMPORTACOES[tabela]
+    linha = {campo: _texto(registro, campo, tabela) for campo in regras.get('textos', ())}
+    linha.update({campo: _decimal(registro, campo, tabela) for campo in regras.get('decimais', ())})
+    for campo, tamanho in regras.get('tamanhos', {}).items():
+        if len(linha[campo]) != tamanho:
+            raise ValueError(f'{campo} de {tabela} deve ter {tamanho} caracteres!')
+    linha.update({campo: _texto(registro, campo, tabela) for campo in regras.get('fks', {})})
+    return linha
+
+
+def lerRegistros(caminho: Path, formato: str, compactado: bool) -> Iterator[tuple[int, dict, Optional[str]]]:
+    """Lê os registros do arquivo um a um, sem carregá-lo inteiro
+    :param caminho: Path: arquivo lido
+    :param formato: str: csv ou jsonl
+    :param compactado: bool: se o arquivo é compactado com gzip
+    :return: Iterator[tuple[int, dict, str]]: número da linha em que o registro começa, o registro e None ou, para
+    as linhas do JSONL que não são um objeto JSON, o texto da linha e o motivo
+    """
+    abrir = gzip.open if compactado else open
+    with abrir(caminho, 'rt', encoding='utf-8', newline='') as arquivo:
+        if formato == 'csv':
+            leitor = csv.DictReader(arquivo)
+            if leitor.fieldnames is None:
+                return
+            linha = leitor.line_num + 1
+            for registro in leitor:
+                yield linha, registro, None
+                linha = leitor.line_num + 1
+            return
+        for linha, texto in enumerate(arquivo, start=1):
+            if not texto.strip():
+                continue
+            try:
+                registro = json.loads(texto)
+            except json.JSONDecodeError as erro:
+                yield linha, texto.rstrip('\n'), f'JSON inválido: {erro.msg}'
+                continue
+            if not isinstance(registro, dict):
+                yield linha, texto.rstrip('\n'), 'o registro deve ser um objeto JSON'
+                continue
+            yield linha, registro, None
+
+
+def importar(tabela: str, caminho: str, formato: Optional[str] = None, compactado: Optional[bool] = None,
+             tamanho_lote: Optional[int] = None, arquivo_erros: Optional[str] = None,
+             engine: Optional[Engine] = None, alvo_ms: float = 250) -> dict:
+    """Importa os registros do arquivo para a tabela, um lote por transação. Os registros rejeitados vão para o
+    arquivo de erros, e os demais são gravados
+    :param tabela: str: tabela de destino, uma das de IMPORTACOES
+    :param caminho: str: arquivo importado, com uma coluna (CSV) ou chave (JSONL) para cada coluna da tabela e, no
+    lugar das FKs, a chave natural da tabela referenciada (ex.: revendedor_cnpj na nota_fiscal)
+    :param formato: str: csv ou jsonl, por padrão deduzido da extensão do arquivo
+    :param compactado: bool: se o arquivo é compactado com gzip, por padrão deduzido da extensão .gz
+    :param tamanho_lote: int: registros lidos e gravados por vez, None para ajustar o tamanho pela latência de
+    gravação de cada lote (ver conf.escrita_em_lote.LoteAdaptativo)
+    :param arquivo_erros: str: arquivo JSONL com os registros rejeitados, padrão <caminho>.erros.jsonl
+    :param engine: Engine: engine do banco, padrão a da camada de acesso
+    :param alvo_ms: float: latência máxima desejada na gravação de cada lote, em milissegundos, quando o tamanho é
+    ajustado
+    :return: dict: caminho, lidas, gravadas, rejeitadas, lotes, arquivo_erros (None se não houve rejeitados),
+    tamanho_lote (o último escolhido), curva (tamanho, linhas, ms e linhas_seg de cada lote), segundos e linhas_seg
+    :raises ValueError: Se a tabela não for importável, o formato não for suportado ou o tamanho_lote não for
+    positivo
+    :raises FileNotFoundError: Se o arquivo não existir
+    """
+    if tabela not in IMPORTACOES:
+        raise ValueError(f'Tabela {tabela} não importável, use uma de: {", ".join(IMPORTACOES)}')
+    if formato is None or compactado is None:
+        formato_arquivo, compactado_arquivo = formatoDoArquivo(caminho)
+        formato = formato or formato_arquivo
+        compactado = compactado_arquivo if compactado is None else compactado
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato de importação não suportado: {formato}, use csv ou jsonl')
+    if tamanho_lote is not None and tamanho_lote <= 0:
+        raise ValueError('tamanho_lote deve ser maior que zero!')
+    caminho = Path(caminho)
+    if not caminho.exists():
+        raise FileNotFoundError(f'Arquivo {caminho} não encontrado!')
+
+    import models.__all_models
+
+    regras = IMPORTACOES[tabela]
+    destino = ModelBase.metadata.tables[tabela]
+    chave = list(regras['chave'])
+    mapas = {campo: MapaChaves(ModelBase.metadata.tables[referenciada], coluna)
+             for campo, (referenciada, coluna, _) in regras.get('fks', {}).items()}
+    engine = engine or createEngine()
+    controle = controleDeLote(engine, destino, tamanho_lote, alvo_ms)
+    erros_path = Path(arquivo_erros) if arquivo_erros is not None else caminho.with_name(caminho.name + '.erros.jsonl')
+    erros_path.unlink(missing_ok=True)
+
+    lidas = gravadas = rejeitadas = lotes = 0
+    arquivo_rejeitados = None
+
+    def _rejeitar(numero_linha, motivo, registro):
+        nonlocal arquivo_rejeitados, rejeitadas
+        if arquivo_rejeitados is None:
+            erros_path.parent.mkdir(parents=True, exist_ok=True)
+            arquivo_rejeitados = open(erros_path, 'w', encoding='utf-8')
+        arquivo_rejeitados.write(json.dumps({'linha': numero_linha, 'motivo': motivo, 'registro': registro},
+                                            ensure_ascii=False, default=str) + '\n')
+        rejeitadas += 1
+
+    inicio = time.perf_counter()
+    registros = lerRegistros(caminho, formato, compactado)
+    try:
+        while True:
+            lote = list(islice(registros, controle.tamanho))
+            if not lote:
+                break
+            lidas += len(lote)
+            lotes += 1
+
+            validos = []
+            for numero_linha, registro, motivo in lote:
+                if motivo is not None:
+                    _rejeitar(numero_linha, motivo, registro)
+                    continue
+                try:
+                    validos.append((numero_linha, registro, normalizarRegistro(tabela, registro)))
+                except ValueError as erro:
+                    _rejeitar(numero_linha, str(erro), registro)
+
+            if mapas:
+                with engine.connect() as conexao:
+                    ids = {campo: mapa.resolver(conexao, {linha[campo] for _, _, linha in validos})
+                           for campo, mapa in mapas.items()}
+                resolvidos = []
+                for numero_linha, registro, linha in validos:
+                    faltante = next((campo for campo in mapas if linha[campo] not in ids[campo]), None)
+                    if faltante is not None:
+                        referenciada, coluna, _ = regras['fks'][faltante]
+                        _rejeitar(numero_linha, f'{referenciada} com {coluna} {linha[faltante]} não encontrado!',
+                                  registro)
+                        continue
+                    for campo, (_, _, coluna_fk) in regras['fks'].items():
+                        linha[coluna_fk] = ids[campo][linha.pop(campo)]
+                    resolvidos.append((numero_linha, registro, linha))
+                validos = resolvidos
+            if tabela == 'picole':
+                for _, _, linha in validos:
+                    linha['sabor_tipoPicole_tipoEmbalagem'] = \
+                        f'{linha["sabor_fk"]}_{linha["tipo_picole_fk"]}_{linha["tipo_embalagem_fk"]}'
+
+            # um mesmo comando não pode atualizar duas vezes a mesma linha, então, das linhas do lote com a mesma
+            # chave, só a última é gravada, como se as anteriores tivessem sido gravadas e sobrescritas
+            por_chave = {}
+            for item in validos:
+                por_chave[tuple(item[2][coluna] for coluna in chave)] = item
+            gravadas += len(validos) - len(por_chave)
+            validos = list(por_chave.values())
+            if not validos:
+                continue
+            inicio_lote = time.perf_counter()
+            resultado = gravarLote(engine, destino, [linha for _, _, linha in validos], chave)
+            controle.registrar(len(validos), time.perf_counter() - inicio_lote)
+            gravadas += resultado['gravadas']
+            for posicao, motivo in resultado['rejeitadas']:
+                _rejeitar(validos[posicao][0], motivo, validos[posicao][1])
+    finally:
+        if arquivo_rejeitados is not None:
+            arquivo_rejeitados.close()
+    segundos = time.perf_counter() - inicio
+
+    relatorio = {'caminho': str(caminho), 'lidas': lidas, 'gravadas': gravadas, 'rejeitadas': rejeitadas,
+                 'lotes': lotes, 'arquivo_erros': str(erros_path) if rejeitadas else None, 'segundos': segundos,
+                 'linhas_seg': lidas / segundos if segundos > 0 else 0.0, **controle.estatisticas()}
+    print(f'Importação {caminho} em {tabela} concluída: {gravadas} gravadas e {rejeitadas} rejeitadas de {lidas} '
+          f'lidas, em {lotes} lotes, {segundos:.2f} s ({relatorio["linhas_seg"]:.0f} linhas/s, lote ajustado para '
+          f'{controle.tamanho})')
+    if rejeitadas:
+        print(f'Registros rejeitados em {erros_path}')
+    return relatorio
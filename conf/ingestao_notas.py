@@ -0,0 +1,382 @@
+# Este módulo ingere os arquivos JSONL de notas fiscais recebidos à noite, em que cada linha tem o cnpj do revendedor,
+# o numero_serie, o valor e a lista de ids dos lotes da nota. A ingestão é um pipeline de estágios, cada um em sua
+# thread, ligados por filas limitadas, de modo que a leitura do arquivo e a gravação no banco acontecem ao mesmo
+# tempo e um estágio lento segura os anteriores em vez de acumular o arquivo inteiro em memória:
+#
+#     leitura -> normalização -> validação -> deduplicação -> gravação
+#
+#     leitura:       lê o arquivo em blocos de linhas e interpreta o JSON
+#     normalização:  normaliza os valores como NotaFiscal.insertNotaFiscal (ver conf.importacao.normalizarRegistro)
+#     validação:     confere, com caches consultados só para as chaves ainda não vistas, se o revendedor existe e se
+#                    os lotes existem e ainda não estão em outra nota fiscal
+#     deduplicação:  descarta os números de série já cadastrados ou já vistos no arquivo e os lotes já usados por
+#                    outra nota do arquivo
+#     gravação:      emite as notas em lotes com LoteNotaFiscal.emitirNotasFiscais, uma transação por lote
+#
+# Cada estágio conta os registros recebidos, repassados e rejeitados e o tempo ocupado; as filas registram o maior
+# acúmulo (backlog) observado. Os registros rejeitados vão para o arquivo de erros, como na importação.
+
+import json
+import queue
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+
+from conf.db_session import createSession
+from conf.exportacao import formatoDoArquivo
+from conf.importacao import MapaChaves, lerRegistros, normalizarRegistro
+from models.lote import Lote
+from models.lote_nota_fiscal import LoteNotaFiscal, NotaFiscalRejeitadaError
+from models.nota_fiscal import NotaFiscal
+from models.revendedor import Revendedor
+
+ESTAGIOS = ('leitura', 'normalizacao', 'validacao', 'deduplicacao', 'gravacao')
+
+_FIM = object()
+
+
+class _Estagio:
+    """Contadores de um estágio e da fila que o alimenta"""
+
+    def __init__(self, nome: str, fila: Optional[queue.Queue]):
+        self.nome = nome
+        self.fila = fila
+        self.entradas = 0
+        self.saidas = 0
+        self.rejeitadas = 0
+        self.ocupado = 0.0
+        self.fila_max = 0
+
+    def paraDict(self, segundos: float) -> dict:
+        return {'entradas': self.entradas, 'saidas': self.saidas, 'rejeitadas': self.rejeitadas,
+                'segundos_ocupado': self.ocupado,
+                'taxa': self.saidas / segundos if segundos > 0 else 0.0,
+                'capacidade': self.entradas / self.ocupado if self.ocupado > 0 else 0.0,
+                'fila': self.fila.qsize() if self.fila is not None else 0,
+                'fila_max': self.fila_max}
+
+
+class _Pipeline:
+
+    def __init__(self, caminho: Path, compactado: bool, tamanho_bloco: int, tamanho_lote: int, tamanho_fila: int,
+                 erros_path: Path, descricao_padrao: str):
+        self.caminho = caminho
+        self.compactado = compactado
+        self.tamanho_bloco = tamanho_bloco
+        self.tamanho_lote = tamanho_lote
+        self.erros_path = erros_path
+        self.descricao_padrao = descricao_padrao
+        self.estagios = {nome: _Estagio(nome, None if nome == 'leitura' else queue.Queue(maxsize=tamanho_fila))
+                         for nome in ESTAGIOS}
+        self.parar = threading.Event()
+        self.erro: Optional[BaseException] = None
+        self._trava_erros = threading.Lock()
+        self._arquivo_erros = None
+
+        self._revendedores = MapaChaves(Revendedor.__table__, 'cnpj')
+        # lote -> nota fiscal a que já está vinculado (None se livre), para os lotes já consultados
+        self._lotes: dict[int, Optional[int]] = {}
+        self._series: set[str] = set()
+        self._lotes_usados: set[int] = set()
+        self._pendentes: list[dict] = []
+
+    # --- registros rejeitados ---
+
+    def rejeitar(self, estagio: _Estagio, item: dict, motivo: str) -> None:
+        estagio.rejeitadas += 1
+        with self._trava_erros:
+            if self._arquivo_erros is None:
+                self.erros_path.parent.mkdir(parents=True, exist_ok=True)
+                self._arquivo_erros = open(self.erros_path, 'w', encoding='utf-8')
+            self._arquivo_erros.write(json.dumps({'linha': item['linha'], 'motivo': motivo,
+                                                  'registro': item['registro']},
+                                                 ensure_ascii=False, default=str) + '\n')
+
+    def fecharErros(self) -> None:
+        if self._arquivo_erros is not None:
+            self._arquivo_erros.close()
+
+    # --- filas ---
+
+    def colocar(self, estagio: _Estagio, bloco) -> bool:
+        """Coloca o bloco na fila do estágio, esperando enquanto ela estiver cheia, a menos que o pipeline pare"""
+        while not self.parar.is_set():
+            try:
+                estagio.fila.put(bloco, timeout=0.1)
+            except queue.Full:
+                continue
+            estagio.fila_max = max(estagio.fila_max, estagio.fila.qsize())
+            return True
+        return False
+
+    def _retirar(self, estagio: _Estagio):
+        while not self.parar.is_set():
+            try:
+                return estagio.fila.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _FIM
+
+    # --- estágios ---
+
+    def ler(self) -> None:
+        estagio = self.estagios['leitura']
+        registros = lerRegistros(self.caminho, 'jsonl', self.compactado)
+        while not self.parar.is_set():
+            inicio = time.perf_counter()
+            lidos = list(islice(registros, self.tamanho_bloco))
+            if not lidos:
+                break
+            bloco = []
+            for linha, registro, motivo in lidos:
+                item = {'linha': linha, 'registro': registro}
+                if motivo is not None:
+                    self.rejeitar(estagio, item, motivo)
+                else:
+                    bloco.append(item)
+            estagio.entradas += len(lidos)
+            estagio.saidas += len(bloco)
+            estagio.ocupado += time.perf_counter() - inicio
+            if bloco and not self.colocar(self.estagios['normalizacao'], bloco):
+                return
+        self.colocar(self.estagios['normalizacao'], _FIM)
+
+    def executar(self, nome: str, proximo: Optional[str], processar: Callable[[_Estagio, list], list],
+                 finalizar: Optional[Callable[[_Estagio], list]] = None) -> None:
+        """Laço de um estágio: retira um bloco da fila, processa e repassa o resultado ao próximo estágio. Ao fim da
+        entrada, finalizar processa o que o estágio ainda tiver acumulado"""
+        estagio = self.estagios[nome]
+        while True:
+            bloco = self._retirar(estagio)
+            if bloco is _FIM:
+                break
+            estagio.entradas += len(bloco)
+            inicio = time.perf_counter()
+            resultado = processar(estagio, bloco)
+            estagio.ocupado += time.perf_counter() - inicio
+            estagio.saidas += len(resultado)
+            if proximo is not None and resultado and not self.colocar(self.estagios[proximo], resultado):
+                return
+        if self.parar.is_set():
+            return
+        if finalizar is not None:
+            inicio = time.perf_counter()
+            estagio.saidas += len(finalizar(estagio))
+            estagio.ocupado += time.perf_counter() - inicio
+        if proximo is not None:
+            self.colocar(self.estagios[proximo], _FIM)
+
+    def normalizar(self, estagio: _Estagio, bloco: list) -> list:
+        normalizados = []
+        for item in bloco:
+            registro = item['registro']
+            try:
+                if not isinstance(registro, dict):
+                    raise ValueError('o registro deve ser um objeto JSON')
+                nota = normalizarRegistro('nota_fiscal', {
+                    **registro, 'revendedor_cnpj': registro.get('revendedor_cnpj', registro.get('cnpj')),
+                    'descricao': registro.get('descricao') or self.descricao_padrao})
+                if len(nota['revendedor_cnpj']) != 14:
+                    raise ValueError('cnpj do revendedor deve ter 14 caracteres!')
+                lotes = registro.get('lotes_fk', registro.get('lotes'))
+                if not isinstance(lotes, list) or not all(isinstance(lote, int) and not isinstance(lote, bool)
+                                                          for lote in lotes):
+                    raise ValueError('lotes da nota fiscal devem ser uma lista de ids inteiros!')
+                if not lotes:
+                    raise ValueError('lotes da nota fiscal não informados!')
+                if len(set(lotes)) != len(lotes):
+                    raise ValueError('lotes repetidos na nota fiscal!')
+                nota['lotes_fk'] = lotes
+            except ValueError as erro:
+                self.rejeitar(estagio, item, str(erro))
+                continue
+            item['nota'] = nota
+            normalizados.append(item)
+        return normalizados
+
+    def validar(self, estagio: _Estagio, bloco: list) -> list:
+        lotes = Lote.__table__
+        vinculos = LoteNotaFiscal.__table__
+        with createSession() as session:
+            conexao = session.connection()
+            revendedores = self._revendedores.resolver(conexao, {item['nota']['revendedor_cnpj'] for item in bloco})
+            faltantes = sorted({lote for item in bloco for lote in item['nota']['lotes_fk']} - set(self._lotes))
+            for inicio in range(0, len(faltantes), MapaChaves.TAMANHO_BLOCO):
+                consulta = (sa.select(lotes.c.id, vinculos.c.nota_fiscal_fk)
+                            .select_from(lotes.outerjoin(vinculos, vinculos.c.lote_fk == lotes.c.id))
+                            .where(lotes.c.id.in_(faltantes[inicio:inicio + MapaChaves.TAMANHO_BLOCO])))
+                self._lotes.update(session.execute(consulta).all())
+
+        validos = []
+        for item in bloco:
+            nota = item['nota']
+            if nota['revendedor_cnpj'] not in revendedores:
+                self.rejeitar(estagio, item, f'revendedor com cnpj {nota["revendedor_cnpj"]} não encontrado!')
+                continue
+            inexistentes = [lote for lote in nota['lotes_fk'] if lote not in self._lotes]
+            if inexistentes:
+                self.rejeitar(estagio, item, f'lotes não encontrados: {inexistentes}')
+                continue
+            vinculados = [lote for lote in nota['lotes_fk'] if self._lotes[lote] is not None]
+            if vinculados:
+                self.rejeitar(estagio, item, f'lotes já vinculados a outra nota fiscal: {vinculados}')
+                continue
+            nota['revendedor_fk'] = revendedores[nota.pop('revendedor_cnpj')]
+            validos.append(item)
+        return validos
+
+    def deduplicar(self, estagio: _Estagio, bloco: list) -> list:
+        notas_fiscais = NotaFiscal.__table__
+        novas = sorted({item['nota']['numero_serie'] for item in bloco} - self._series)
+        with createSession() as session:
+            existentes = set(session.execute(sa.select(notas_fiscais.c.numero_serie)
+                                             .where(notas_fiscais.c.numero_serie.in_(novas))).scalars())
+
+        unicos = []
+        for item in bloco:
+            nota = item['nota']
+            if nota['numero_serie'] in existentes:
+                self.rejeitar(estagio, item, f'número de série {nota["numero_serie"]} já cadastrado!')
+                continue
+            if nota['numero_serie'] in self._series:
+                self.rejeitar(estagio, item, f'número de série {nota["numero_serie"]} repetido no arquivo!')
+                continue
+            usados = [lote for lote in nota['lotes_fk'] if lote in self._lotes_usados]
+            if usados:
+                self.rejeitar(estagio, item, f'lotes já usados por outra nota do arquivo: {usados}')
+                continue
+            self._series.add(nota['numero_serie'])
+            self._lotes_usados.update(nota['lotes_fk'])
+            unicos.append(item)
+        return unicos
+
+    def gravar(self, estagio: _Estagio, bloco: list) -> list:
+        """Acumula as notas e emite um lote a cada tamanho_lote notas"""
+        self._pendentes.extend(bloco)
+        gravados = []
+        while len(self._pendentes) >= self.tamanho_lote:
+            lote, self._pendentes = self._pendentes[:self.tamanho_lote], self._pendentes[self.tamanho_lote:]
+            gravados += self._emitir(estagio, lote)
+        return gravados
+
+    def gravarPendentes(self, estagio: _Estagio) -> list:
+        lote, self._pendentes = self._pendentes, []
+        return self._emitir(estagio, lote) if lote else []
+
+    def _emitir(self, estagio: _Estagio, lote: list) -> list:
+        try:
+            LoteNotaFiscal.emitirNotasFiscais([item['nota'] for item in lote])
+            return lote
+        except NotaFiscalRejeitadaError:
+            # o banco mudou desde a validação (por exemplo, outro processo usou um dos lotes): emite uma a uma. As
+            # falhas do próprio banco (lock, disco cheio) não são rejeições e interrompem a ingestão
+            gravados = []
+            for item in lote:
+                try:
+                    LoteNotaFiscal.emitirNotaFiscal(**item['nota'])
+                    gravados.append(item)
+                except NotaFiscalRejeitadaError as erro:
+                    self.rejeitar(estagio, item, str(erro))
+            return gravados
+
+    # --- execução ---
+
+    def protegido(self, alvo: Callable, *args) -> Callable:
+        def _executar():
+            try:
+                alvo(*args)
+            except BaseException as erro:
+                if self.erro is None:
+                    self.erro = erro
+                self.parar.set()
+        return _executar
+
+    def relatorio(self, segundos: float) -> dict:
+        return {nome: estagio.paraDict(segundos) for nome, estagio in self.estagios.items()}
+
+
+def _resumo_estagios(estagios: dict) -> str:
+    return ' | '.join(f'{nome} {estagio["saidas"]} (fila {estagio["fila"]})' for nome, estagio in estagios.items())
+
+
+def ingerirNotasFiscais(caminho: str, tamanho_bloco: int = 500, tamanho_lote: int = 1_000, tamanho_fila: int = 8,
+                        arquivo_erros: Optional[str] = None, descricao_padrao: str = 'NOTA FISCAL IMPORTADA',
+                        intervalo_progresso: float = 5.0) -> dict:
+    """Ingere um arquivo JSONL de notas fiscais pelo pipeline de estágios. Cada linha tem cnpj (ou revendedor_cnpj),
+    numero_serie, valor, lotes (ou lotes_fk) e, opcionalmente, descricao. As notas são emitidas pelas threads do
+    pipeline, cada lote em sua própria transação, e não participam de uma unitOfWork aberta por quem chamou.
+    :param caminho: str: arquivo .jsonl ou .jsonl.gz
+    :param tamanho_bloco: int: registros passados de um estágio ao seguinte de cada vez
+    :param tamanho_lote: int: notas emitidas por transação
+    :param tamanho_fila: int: blocos que cabem na fila de entrada de cada estágio
+    :param arquivo_erros: str: arquivo JSONL com os registros rejeitados, padrão <caminho>.erros.jsonl
+    :param descricao_padrao: str: descrição das notas que não trazem uma
+    :param intervalo_progresso: float: intervalo, em segundos, entre as linhas de progresso impressas, 0 para não
+    imprimir
+    :return: dict: caminho, lidas, gravadas, rejeitadas, arquivo_erros (None se não houve rejeitados), segundos,
+    notas_seg e, em estagios, para cada estágio as entradas, saidas, rejeitadas, segundos_ocupado, taxa (saídas por
+    segundo da ingestão), capacidade (entradas por segundo ocupado), fila e fila_max (acúmulo na fila de entrada)
+    :raises ValueError: Se o arquivo não for JSONL ou os tamanhos não forem positivos
+    :raises FileNotFoundError: Se o arquivo não existir
+    :raises RuntimeError: Se algum estágio falhar por um erro inesperado; as notas já emitidas permanecem gravadas
+    """
+    formato, compactado = formatoDoArquivo(caminho)
+    if formato != 'jsonl':
+        raise ValueError(f'A ingestão de notas fiscais lê apenas JSONL: {caminho}')
+    if min(tamanho_bloco, tamanho_lote, tamanho_fila) <= 0:
+        raise ValueError('tamanho_bloco, tamanho_lote e tamanho_fila devem ser maiores que zero!')
+    caminho = Path(caminho)
+    if not caminho.exists():
+        raise FileNotFoundError(f'Arquivo {caminho} não encontrado!')
+    erros_path = Path(arquivo_erros) if arquivo_erros is not None else caminho.with_name(caminho.name + '.erros.jsonl')
+    erros_path.unlink(missing_ok=True)
+
+    pipeline = _Pipeline(caminho, compactado, tamanho_bloco, tamanho_lote, tamanho_fila, erros_path, descricao_padrao)
+    threads = [threading.Thread(target=pipeline.protegido(pipeline.ler), name='ingestao-leitura'),
+               threading.Thread(target=pipeline.protegido(pipeline.executar, 'normalizacao', 'validacao',
+                                                          pipeline.normalizar), name='ingestao-normalizacao'),
+               threading.Thread(target=pipeline.protegido(pipeline.executar, 'validacao', 'deduplicacao',
+                                                          pipeline.validar), name='ingestao-validacao'),
+               threading.Thread(target=pipeline.protegido(pipeline.executar, 'deduplicacao', 'gravacao',
+                                                          pipeline.deduplicar), name='ingestao-deduplicacao'),
+               threading.Thread(target=pipeline.protegido(pipeline.executar, 'gravacao', None, pipeline.gravar,
+                                                          pipeline.gravarPendentes), name='ingestao-gravacao')]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=intervalo_progresso or None)
+                if thread.is_alive() and intervalo_progresso:
+                    print(f'Ingestão {caminho.name}: '
+                          f'{_resumo_estagios(pipeline.relatorio(time.perf_counter() - inicio))}')
+    except BaseException:
+        pipeline.parar.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        pipeline.fecharErros()
+    segundos = time.perf_counter() - inicio
+    if pipeline.erro is not None:
+        raise RuntimeError(f'Ingestão de {caminho} interrompida: {pipeline.erro}') from pipeline.erro
+
+    estagios = pipeline.relatorio(segundos)
+    gravadas = estagios['gravacao']['saidas']
+    rejeitadas = sum(estagio['rejeitadas'] for estagio in estagios.values())
+    relatorio = {'caminho': str(caminho), 'lidas': estagios['leitura']['entradas'], 'gravadas': gravadas,
+                 'rejeitadas': rejeitadas, 'arquivo_erros': str(erros_path) if rejeitadas else None,
+                 'segundos': segundos, 'notas_seg': gravadas / segundos if segundos > 0 else 0.0,
+                 'estagios': estagios}
+    print(f'Ingestão {caminho} concluída: {gravadas} notas emitidas e {rejeitadas} registros rejeitados de '
+          f'{relatorio["lidas"]} lidos, {segundos:.2f} s ({relatorio["notas_seg"]:.0f} notas/s)')
+    for nome, estagio in estagios.items():
+        print(f'    {nome:<13} {estagio["entradas"]:>8} entradas {estagio["rejeitadas"]:>6} rejeitadas '
+              f'{estagio["segundos_ocupado"]:>7.2f} s ocupado {estagio["capacidade"]:>9.0f}/s capacidade '
+              f'fila máx {estagio["fila_max"]}')
+    return relatorio
@@ -0,0 +1,395 @@
+# Este módulo mantém métricas operacionais do acesso ao banco no formato texto do Prometheus, sem dependências além
+# da biblioteca padrão. As métricas são alimentadas pelos eventos do pool, da engine e da sessão e pelas medições dos
+# métodos de CRUD dos modelos (conf.perfil), e podem ser expostas por um pequeno servidor HTTP para coleta local.
+#
+# Uso:
+#     from conf import metricas
+#     metricas.habilitar()
+#     metricas.iniciarServidor(porta=9464)   # opcional, expõe http://127.0.0.1:9464/metrics
+#     print(metricas.renderizar())
+
+import re
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS, CACHING_DISABLED, NO_CACHE_KEY
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+from conf import perfil
+
+BUCKETS_SEGUNDOS: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                                       10)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica(ABC):
+    """Base das métricas: nome, texto de ajuda, rótulos e os valores por combinação de rótulos"""
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores: dict[tuple, object] = {}
+        self._trava = threading.Lock()
+
+    def _chave(self, rotulos: dict) -> tuple:
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f'A métrica {self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}!')
+        return tuple(str(rotulos[rotulo]) for rotulo in self.rotulos)
+
+    def _rotulos_texto(self, chave: tuple, extra: Optional[tuple[str, str]] = None) -> str:
+        pares = list(zip(self.rotulos, chave)) + ([extra] if extra else [])
+        if not pares:
+            return ''
+        return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+    @abstractmethod
+    def _linhas(self) -> list[str]:
+        """Linhas dos valores da métrica no formato texto, sem os comentários HELP e TYPE"""
+
+    def renderizar(self) -> str:
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+        with self._trava:
+            linhas += self._linhas()
+        return '\n'.join(linhas)
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._valores.clear()
+
+
+class Contador(_Metrica):
+    """Valor que só cresce, como quantidade de commits"""
+    tipo = 'counter'
+
+    def inc(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        return self._valores.get(self._chave(rotulos), 0)
+
+    def _linhas(self) -> list[str]:
+        return [f'{self.nome}{self._rotulos_texto(chave)} {_formatar(valor)}'
+                for chave, valor in sorted(self._valores.items())]
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo, que pode ser definido diretamente ou calculado por uma função no momento da coleta"""
+    tipo = 'gauge'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple[str, ...] = (),
+                 funcao: Optional[Callable[[], dict[tuple, float]]] = None):
+        """
+        :param funcao: Callable: opcional, chamada a cada coleta e que devolve {tupla de rótulos: valor}
+        """
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def set(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._valores[chave] = valor
+
+    def _linhas(self) -> list[str]:
+        valores = dict(self._valores)
+        if self.funcao is not None:
+            valores.update(self.funcao())
+        return [f'{self.nome}{self._rotulos_texto(chave)} {_formatar(valor)}'
+                for chave, valor in sorted(valores.items())]
+
+
+class Histograma(_Metrica):
+    """Distribuição de valores em faixas cumulativas, com soma e contagem"""
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._trava:
+            contagens = self._valores.get(chave)
+            if contagens is None:
+                # uma posição por faixa, mais a faixa +Inf, a soma e a contagem
+                contagens = self._valores[chave] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            contagens[bisect_left(self.buckets, valor)] += 1
+            contagens[-2] += valor
+            contagens[-1] += 1
+
+    def contagem(self, **rotulos) -> int:
+        contagens = self._valores.get(self._chave(rotulos))
+        return contagens[-1] if contagens else 0
+
+    def _linhas(self) -> list[str]:
+        linhas = []
+        for chave, contagens in sorted(self._valores.items()):
+            acumulado = 0
+            for limite, quantidade in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += quantidade
+                linhas.append(f'{self.nome}_bucket{self._rotulos_texto(chave, ("le", _formatar(limite)))} '
+                              f'{acumulado}')
+            linhas.append(f'{self.nome}_sum{self._rotulos_texto(chave)} {_formatar(contagens[-2])}')
+            linhas.append(f'{self.nome}_count{self._rotulos_texto(chave)} {contagens[-1]}')
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas renderizadas juntas"""
+
+    def __init__(self):
+        self._metricas: dict[str, _Metrica] = {}
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        """:raises ValueError: Se já existir uma métrica com o mesmo nome"""
+        if metrica.nome in self._metricas:
+            raise ValueError(f'Métrica {metrica.nome} já registrada!')
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def renderizar(self) -> str:
+        """:return: str: todas as métricas no formato texto do Prometheus (versão 0.0.4)"""
+        return '\n'.join(metrica.renderizar() for metrica in self._metricas.values()) + '\n'
+
+    def limpar(self) -> None:
+        for metrica in self._metricas.values():
+            metrica.limpar()
+
+
+REGISTRO = RegistroMetricas()
+
+POOL_CHECKOUTS = REGISTRO.registrar(Contador('picoles_pool_checkouts_total',
+                                             'Conexões retiradas do pool.'))
+POOL_ESPERA = REGISTRO.registrar(Histograma('picoles_pool_checkout_wait_seconds',
+                                            'Tempo para obter uma conexão do pool, incluindo espera por conexão '
+                                            'livre e abertura de conexões novas.'))
+POOL_CONEXOES_ABERTAS = REGISTRO.registrar(Contador('picoles_pool_connections_opened_total',
+                                                    'Conexões novas abertas com o banco.'))
+POOL_INVALIDACOES = REGISTRO.registrar(Contador('picoles_pool_invalidations_total',
+                                                'Conexões invalidadas pelo pool.'))
+POOL_EM_USO = REGISTRO.registrar(Medidor('picoles_pool_checked_out_connections',
+                                         'Conexões retiradas do pool e ainda não devolvidas.'))
+SQL_COMANDOS = REGISTRO.registrar(Contador('picoles_sql_statements_total',
+                                           'Comandos SQL executados, por tipo.', ('tipo',)))
+SQL_DURACAO = REGISTRO.registrar(Histograma('picoles_sql_statement_duration_seconds',
+                                            'Duração da execução dos comandos SQL, por tipo.', ('tipo',)))
+SQL_CACHE = REGISTRO.registrar(Contador('picoles_sql_compiled_cache_total',
+                                        'Consultas ao cache de compilação do SQLAlchemy, por resultado.',
+                                        ('resultado',)))
+SQL_CACHE_ACERTOS = REGISTRO.registrar(Medidor(
+    'picoles_sql_compiled_cache_hit_ratio', 'Fração das compilações atendidas pelo cache.',
+    funcao=lambda: _razao_acertos_cache()))
+SESSAO_COMMITS = REGISTRO.registrar(Contador('picoles_session_commits_total', 'Commits das sessões do ORM.'))
+SESSAO_ROLLBACKS = REGISTRO.registrar(Contador('picoles_session_rollbacks_total', 'Rollbacks das sessões do ORM.'))
+INTEGRIDADE_ERROS = REGISTRO.registrar(Contador('picoles_integrity_errors_total',
+                                                'Violações de integridade, por tipo e restrição.',
+                                                ('tipo', 'restricao')))
+CRUD_DURACAO = REGISTRO.registrar(Histograma('picoles_crud_duration_seconds',
+                                             'Duração dos métodos de CRUD dos modelos.',
+                                             ('modelo', 'metodo')))
+CRUD_ERROS = REGISTRO.registrar(Contador('picoles_crud_errors_total',
+                                         'Chamadas dos métodos de CRUD que lançaram exceção.', ('modelo', 'metodo')))
+
+_RESULTADOS_CACHE = {CACHE_HIT: 'hit', CACHE_MISS: 'miss', CACHING_DISABLED: 'disabled', NO_CACHE_KEY: 'no_key'}
+_RE_RESTRICAO_SQLITE = re.compile(r'(UNIQUE|NOT NULL|FOREIGN KEY|CHECK|PRIMARY KEY) constraint failed(?::\s*(.+))?')
+_pools_instrumentados: list[tuple[Pool, Callable]] = []
+
+
+def _razao_acertos_cache() -> dict[tuple, float]:
+    acertos = SQL_CACHE.valor(resultado='hit')
+    total = acertos + SQL_CACHE.valor(resultado='miss')
+    return {(): acertos / total if total else 0.0}
+
+
+def _pools_em_uso() -> dict[tuple, float]:
+    return {(): sum(pool.checkedout() for pool, _ in _pools_instrumentados if hasattr(pool, 'checkedout'))}
+
+
+def _tipo_comando(statement: str) -> str:
+    tipo = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return tipo if tipo in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'PRAGMA', 'SAVEPOINT', 'RELEASE', 'BEGIN',
+                            'COMMIT', 'ROLLBACK', 'CREATE', 'DROP', 'ALTER', 'WITH') else 'OTHER'
+
+
+def restricaoViolada(erro: Exception) -> tuple[str, str]:
+    """Identifica a restrição violada em um erro de integridade
+    :param erro: Exception: IntegrityError do SQLAlchemy ou do driver
+    :return: tuple[str, str]: tipo (unique, foreign_key, not_null, check, primary_key ou unknown) e nome da restrição
+    ou colunas envolvidas, quando o driver os informa
+    """
+    original = getattr(erro, 'orig', erro)
+    # psycopg2 informa o nome da restrição no diagnóstico do erro
+    diagnostico = getattr(original, 'diag', None)
+    if diagnostico is not None and getattr(diagnostico, 'constraint_name', None):
+        codigo = getattr(original, 'pgcode', '') or ''
+        tipos_pg = {'23505': 'unique', '23503': 'foreign_key', '23502': 'not_null', '23514': 'check'}
+        return tipos_pg.get(codigo, 'unknown'), diagnostico.constraint_name
+    encontrado = _RE_RESTRICAO_SQLITE.search(str(original))
+    if encontrado:
+        return encontrado.group(1).lower().replace(' ', '_'), (encontrado.group(2) or '').strip()
+    return 'unknown', ''
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+
+
+def _conexao_aberta(dbapi_connection, connection_record):
+    POOL_CONEXOES_ABERTAS.inc()
+
+
+def _invalidacao(dbapi_connection, connection_record, exception):
+    POOL_INVALIDACOES.inc()
+
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicio', []).append(perf_counter())
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    duracao = perf_counter() - conn.info['metricas_inicio'].pop()
+    tipo = _tipo_comando(statement)
+    SQL_COMANDOS.inc(tipo=tipo)
+    SQL_DURACAO.observar(duracao, tipo=tipo)
+    if context is not None and getattr(context, 'compiled', None) is not None:
+        SQL_CACHE.inc(resultado=_RESULTADOS_CACHE.get(context.cache_hit, 'other'))
+
+
+def _erro_execucao(exception_context):
+    inicios = exception_context.connection.info.get('metricas_inicio') \
+        if exception_context.connection is not None else None
+    if inicios:
+        inicios.pop()
+    if isinstance(exception_context.sqlalchemy_exception, sa.exc.IntegrityError) or \
+            type(exception_context.original_exception).__name__ == 'IntegrityError':
+        tipo, restricao = restricaoViolada(exception_context.original_exception)
+        INTEGRIDADE_ERROS.inc(tipo=tipo, restricao=restricao)
+
+
+def _commit(session):
+    SESSAO_COMMITS.inc()
+
+
+def _rollback(session):
+    SESSAO_ROLLBACKS.inc()
+
+
+def _observar_crud(metodo: str, medicao: dict) -> None:
+    modelo, _, nome = metodo.partition('.')
+    CRUD_DURACAO.observar(medicao['tempo_ms'] / 1000, modelo=modelo, metodo=nome)
+    if medicao['erro']:
+        CRUD_ERROS.inc(modelo=modelo, metodo=nome)
+
+
+_EVENTOS: list[tuple[type, str, Callable]] = [
+    (Pool, 'checkout', _checkout),
+    (Pool, 'connect', _conexao_aberta),
+    (Pool, 'invalidate', _invalidacao),
+    (Engine, 'before_cursor_execute', _antes_execucao),
+    (Engine, 'after_cursor_execute', _depois_execucao),
+    (Engine, 'handle_error', _erro_execucao),
+    (Session, 'after_commit', _commit),
+    (Session, 'after_rollback', _rollback),
+]
+
+
+def instrumentarPool(engine: Engine) -> None:
+    """Mede o tempo de obtenção de conexões do pool da engine. Não há evento do pool anterior ao checkout, então o
+    método connect do pool é envolvido na instância; ao descartar a engine (dispose), o pool é recriado e precisa ser
+    instrumentado de novo.
+    :param engine: Engine: engine cujo pool será medido
+    """
+    pool = engine.pool
+    if any(instrumentado is pool for instrumentado, _ in _pools_instrumentados):
+        return
+    original = pool.connect
+
+    def connect():
+        inicio = perf_counter()
+        try:
+            return original()
+        finally:
+            POOL_ESPERA.observar(perf_counter() - inicio)
+
+    pool.connect = connect
+    _pools_instrumentados.append((pool, original))
+
+
+def habilitar(engine: Optional[Engine] = None) -> None:
+    """Passa a alimentar as métricas
+    :param engine: Engine: engine cujo pool terá o tempo de checkout medido, padrão a de conf.db_session
+    """
+    for alvo, evento, funcao in _EVENTOS:
+        if not sa.event.contains(alvo, evento, funcao):
+            sa.event.listen(alvo, evento, funcao)
+    perfil.adicionarObservador(_observar_crud)
+    if engine is None:
+        from conf.db_session import createEngine
+        engine = createEngine()
+    instrumentarPool(engine)
+    if POOL_EM_USO.funcao is None:
+        POOL_EM_USO.funcao = _pools_em_uso
+
+
+def desabilitar() -> None:
+    """Para de alimentar as métricas, mantendo os valores acumulados"""
+    for alvo, evento, funcao in _EVENTOS:
+        if sa.event.contains(alvo, evento, funcao):
+            sa.event.remove(alvo, evento, funcao)
+    perfil.removerObservador(_observar_crud)
+    for pool, original in _pools_instrumentados:
+        pool.connect = original
+    _pools_instrumentados.clear()
+
+
+def renderizar() -> str:
+    """:return: str: as métricas no formato texto do Prometheus"""
+    return REGISTRO.renderizar()
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        corpo = renderizar().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        # cada coleta geraria uma linha no stderr
+        pass
+
+
+def iniciarServidor(porta: int = 9464, endereco: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Expõe as métricas em http://endereco:porta/metrics, em uma thread daemon
+    :param porta: int: porta do servidor, 0 para escolher uma livre
+    :param endereco: str: endereço de escuta, por padrão apenas local
+    :return: ThreadingHTTPServer: o servidor, que pode ser encerrado com shutdown()
+    """
+    servidor = ThreadingHTTPServer((endereco, porta), _Tratador)
+    threading.Thread(target=servidor.serve_forever, name='MetricasHTTP', daemon=True).start()
+    return servidor
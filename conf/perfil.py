@@ -0,0 +1,335 @@
+# Este módulo instrumenta os métodos de CRUD dos modelos (insert*, select*, update*, delete* e emitir*). O decorador de
+# classe instrumentarCrud envolve esses métodos e, quando o perfil está ativo, cada chamada registra tempo total (wall),
+# tempo gasto no banco, quantidade de comandos SQL e bytes alocados. Uma fração das chamadas pode ser perfilada com
+# cProfile, gerando um .prof (pstats) e um arquivo de pilhas colapsadas, que pode ser convertido em flame graph com
+# flamegraph.pl ou speedscope.
+#
+# Variáveis de ambiente, lidas na importação:
+#     PERFIL_CRUD=1                   ativa o perfil
+#     PERFIL_CRUD_TRACEMALLOC=1       mede os bytes alocados por chamada (tracemalloc deixa tudo mais lento)
+#     PERFIL_CRUD_AMOSTRAGEM=0.01     fração das chamadas perfiladas com cProfile, padrão 0 (nenhuma)
+#     PERFIL_CRUD_DIRETORIO=db/perfil diretório dos arquivos .prof e .folded
+#     PERFIL_CRUD_ARQUIVO=perfil.json grava o resumo em JSON ao final do processo
+
+import atexit
+import cProfile
+import functools
+import json
+import math
+import os
+import random
+import threading
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+
+PREFIXOS_CRUD: tuple[str, ...] = ('insert', 'select', 'update', 'delete', 'emitir')
+
+_estado = threading.local()
+_trava = threading.Lock()
+_config = {'ativo': False, 'tracemalloc': False, 'amostragem': 0.0, 'diretorio': None}
+_observadores: list[Callable[[str, dict], None]] = []
+
+
+class EstatisticaMetodo:
+    """Medições acumuladas de um método"""
+
+    __slots__ = ('metodo', 'chamadas', 'erros', 'tempo_total_ms', 'tempo_banco_ms', 'comandos_sql',
+                 'bytes_alocados', 'pico_bytes', 'latencias_ns')
+
+    def __init__(self, metodo: str):
+        self.metodo = metodo
+        self.chamadas = 0
+        self.erros = 0
+        self.tempo_total_ms = 0.0
+        self.tempo_banco_ms = 0.0
+        self.comandos_sql = 0
+        self.bytes_alocados = 0
+        self.pico_bytes = 0
+        # últimas latências, para os percentis
+        self.latencias_ns: deque = deque(maxlen=10_000)
+
+    def paraDict(self) -> dict:
+        latencias = sorted(self.latencias_ns)
+        p95_ns = latencias[max(math.ceil(0.95 * len(latencias)) - 1, 0)] if latencias else 0
+        return {
+            'metodo': self.metodo,
+            'chamadas': self.chamadas,
+            'erros': self.erros,
+            'tempo_total_ms': round(self.tempo_total_ms, 3),
+            'tempo_medio_ms': round(self.tempo_total_ms / self.chamadas, 3) if self.chamadas else 0.0,
+            'p95_ms': round(p95_ns / 1e6, 3),
+            'tempo_banco_ms': round(self.tempo_banco_ms, 3),
+            'fracao_banco': round(self.tempo_banco_ms / self.tempo_total_ms, 3) if self.tempo_total_ms else 0.0,
+            'comandos_sql': self.comandos_sql,
+            'comandos_por_chamada': round(self.comandos_sql / self.chamadas, 2) if self.chamadas else 0.0,
+            'bytes_alocados': self.bytes_alocados,
+            'pico_bytes': self.pico_bytes,
+        }
+
+
+_estatisticas: dict[str, EstatisticaMetodo] = {}
+
+
+def _contadores():
+    """Contadores acumulados de SQL da thread atual: [tempo no banco em segundos, quantidade de comandos]"""
+    contadores = getattr(_estado, 'sql', None)
+    if contadores is None:
+        contadores = _estado.sql = [0.0, 0]
+    return contadores
+
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('perfil_crud_inicio', []).append(perf_counter())
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    contadores = _contadores()
+    contadores[0] += perf_counter() - conn.info['perfil_crud_inicio'].pop()
+    contadores[1] += 1
+
+
+def _erro_execucao(exception_context):
+    inicios = exception_context.connection.info.get('perfil_crud_inicio') \
+        if exception_context.connection is not None else None
+    if inicios:
+        contadores = _contadores()
+        contadores[0] += perf_counter() - inicios.pop()
+        contadores[1] += 1
+
+
+def habilitar(usar_tracemalloc: bool = False, amostragem: float = 0.0, diretorio: Optional[str] = None) -> None:
+    """Ativa o perfil dos métodos instrumentados
+    :param usar_tracemalloc: bool: se True, mede os bytes alocados por chamada
+    :param amostragem: float: fração das chamadas perfiladas com cProfile, entre 0 e 1
+    :param diretorio: str: diretório dos arquivos gerados pelas chamadas perfiladas, padrão db/perfil
+    :raises ValueError: Se a amostragem estiver fora do intervalo [0, 1]
+    """
+    if not 0 <= amostragem <= 1:
+        raise ValueError('amostragem deve estar entre 0 e 1!')
+    _config.update(ativo=True, tracemalloc=usar_tracemalloc, amostragem=amostragem,
+                   diretorio=diretorio or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                       'db', 'perfil'))
+    if usar_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if not sa.event.contains(Engine, 'before_cursor_execute', _antes_execucao):
+        sa.event.listen(Engine, 'before_cursor_execute', _antes_execucao)
+        sa.event.listen(Engine, 'after_cursor_execute', _depois_execucao)
+        sa.event.listen(Engine, 'handle_error', _erro_execucao)
+
+
+def desabilitar() -> None:
+    """Desativa o perfil, mantendo as medições acumuladas"""
+    _config['ativo'] = False
+    if sa.event.contains(Engine, 'before_cursor_execute', _antes_execucao):
+        sa.event.remove(Engine, 'before_cursor_execute', _antes_execucao)
+        sa.event.remove(Engine, 'after_cursor_execute', _depois_execucao)
+        sa.event.remove(Engine, 'handle_error', _erro_execucao)
+    if _config['tracemalloc'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def ativo() -> bool:
+    """:return: bool: se o perfil está ativo"""
+    return _config['ativo']
+
+
+def adicionarObservador(observador: Callable[[str, dict], None]) -> None:
+    """Registra uma função chamada ao fim de cada chamada medida, com o nome do método e a medição, por exemplo para
+    exportar métricas
+    :param observador: Callable[[str, dict], None]: recebe o método ('Sabor.insertSabor') e a medição, com as chaves
+    tempo_ms, tempo_banco_ms, comandos_sql, bytes_alocados e erro
+    """
+    if observador not in _observadores:
+        _observadores.append(observador)
+
+
+def removerObservador(observador: Callable[[str, dict], None]) -> None:
+    if observador in _observadores:
+        _observadores.remove(observador)
+
+
+def _nome_funcao(funcao: tuple) -> str:
+    arquivo, linha, nome = funcao
+    if arquivo == '~':
+        return nome.replace(';', ':').replace(' ', '_')
+    return f'{Path(arquivo).stem}:{linha}:{nome}'.replace(';', ':').replace(' ', '_')
+
+
+def pilhasColapsadas(perfil: cProfile.Profile) -> dict[str, int]:
+    """Converte o perfil do cProfile em pilhas colapsadas (formato do flamegraph.pl), em microssegundos. O cProfile
+    guarda apenas as arestas chamador -> chamado, então o tempo de cada função é distribuído entre os caminhos pela
+    proporção do tempo de cada aresta, a mesma aproximação usada por ferramentas como o flameprof.
+    :param perfil: cProfile.Profile: perfil já desativado
+    :return: dict[str, int]: pilha ('raiz;filho;neto') -> tempo próprio, em microssegundos
+    """
+    perfil.create_stats()
+    stats = perfil.stats
+    filhos: dict[tuple, list[tuple[tuple, float]]] = defaultdict(list)
+    for funcao, (_, _, _, _, chamadores) in stats.items():
+        for chamador, (_, _, _, tempo_aresta) in chamadores.items():
+            filhos[chamador].append((funcao, tempo_aresta))
+
+    pilhas: dict[str, int] = defaultdict(int)
+
+    def visitar(funcao: tuple, caminho: list[str], visitadas: set, tempo: float) -> None:
+        _, _, proprio, acumulado, _ = stats[funcao]
+        caminho = caminho + [_nome_funcao(funcao)]
+        fracao = tempo / acumulado if acumulado else 0.0
+        if proprio * fracao > 0:
+            pilhas[';'.join(caminho)] += int(proprio * fracao * 1e6)
+        for filho, tempo_aresta in filhos.get(funcao, []):
+            if filho not in visitadas and tempo_aresta * fracao > 1e-7:
+                visitar(filho, caminho, visitadas | {filho}, tempo_aresta * fracao)
+
+    for raiz, (_, _, _, acumulado, chamadores) in stats.items():
+        if not chamadores:
+            visitar(raiz, [], {raiz}, acumulado)
+    return {pilha: tempo for pilha, tempo in pilhas.items() if tempo > 0}
+
+
+def _gravar_perfil(metodo: str, perfil: cProfile.Profile) -> None:
+    diretorio = Path(_config['diretorio'])
+    diretorio.mkdir(parents=True, exist_ok=True)
+    base = diretorio / f'{metodo}_{datetime.now():%Y%m%d_%H%M%S_%f}'
+    perfil.dump_stats(f'{base}.prof')
+    with open(f'{base}.folded', 'w', encoding='utf-8') as arquivo:
+        for pilha, tempo in sorted(pilhasColapsadas(perfil).items()):
+            arquivo.write(f'{pilha} {tempo}\n')
+
+
+def _medir(metodo: str, funcao: Callable, args: tuple, kwargs: dict):
+    """Executa a chamada medindo-a; as medições de chamadas aninhadas incluem as das chamadas internas"""
+    profundidade = getattr(_estado, 'profundidade', 0)
+    externa = profundidade == 0
+    contadores = _contadores()
+    banco_inicial, comandos_iniciais = contadores
+    usar_tracemalloc = _config['tracemalloc'] and tracemalloc.is_tracing()
+    if usar_tracemalloc:
+        if externa:
+            tracemalloc.reset_peak()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+    perfil = cProfile.Profile() if externa and _config['amostragem'] and \
+        random.random() < _config['amostragem'] else None
+
+    erro = False
+    _estado.profundidade = profundidade + 1
+    inicio = perf_counter()
+    try:
+        if perfil is not None:
+            perfil.enable()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                perfil.disable()
+        return funcao(*args, **kwargs)
+    except BaseException:
+        erro = True
+        raise
+    finally:
+        duracao = perf_counter() - inicio
+        _estado.profundidade = profundidade
+        medicao = {'tempo_ms': duracao * 1000, 'tempo_banco_ms': (contadores[0] - banco_inicial) * 1000,
+                   'comandos_sql': contadores[1] - comandos_iniciais, 'bytes_alocados': 0, 'pico_bytes': 0,
+                   'erro': erro}
+        if usar_tracemalloc:
+            atual, pico = tracemalloc.get_traced_memory()
+            medicao['bytes_alocados'] = atual - memoria_inicial
+            medicao['pico_bytes'] = pico - memoria_inicial if externa else 0
+        _acumular(metodo, duracao, medicao)
+        if perfil is not None:
+            _gravar_perfil(metodo, perfil)
+        for observador in _observadores:
+            observador(metodo, medicao)
+
+
+def _acumular(metodo: str, duracao: float, medicao: dict) -> None:
+    with _trava:
+        estatistica = _estatisticas.get(metodo)
+        if estatistica is None:
+            estatistica = _estatisticas[metodo] = EstatisticaMetodo(metodo)
+        estatistica.chamadas += 1
+        estatistica.erros += int(medicao['erro'])
+        estatistica.tempo_total_ms += medicao['tempo_ms']
+        estatistica.tempo_banco_ms += medicao['tempo_banco_ms']
+        estatistica.comandos_sql += medicao['comandos_sql']
+        estatistica.bytes_alocados += medicao['bytes_alocados']
+        estatistica.pico_bytes = max(estatistica.pico_bytes, medicao['pico_bytes'])
+        estatistica.latencias_ns.append(int(duracao * 1e9))
+
+
+def instrumentar(metodo: str, funcao: Callable) -> Callable:
+    """Envolve uma função para que suas chamadas sejam medidas enquanto o perfil estiver ativo
+    :param metodo: str: nome usado nos relatórios, como 'Sabor.insertSabor'
+    :param funcao: Callable: função a envolver
+    :return: Callable: função envolvida, que apenas repassa a chamada quando o perfil está inativo
+    """
+
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        if not _config['ativo'] and not _observadores:
+            return funcao(*args, **kwargs)
+        return _medir(metodo, funcao, args, kwargs)
+
+    return envolvida
+
+
+def instrumentarCrud(cls: type) -> type:
+    """Decorador de classe que instrumenta os métodos estáticos de CRUD do modelo (insert*, select*, update*,
+    delete* e emitir*)
+    :param cls: type: classe do modelo
+    :return: type: a própria classe, com os métodos envolvidos
+    """
+    for nome, atributo in list(vars(cls).items()):
+        if isinstance(atributo, staticmethod) and nome.startswith(PREFIXOS_CRUD):
+            setattr(cls, nome, staticmethod(instrumentar(f'{cls.__name__}.{nome}', atributo.__func__)))
+    return cls
+
+
+def estatisticas(ordem: str = 'tempo_total_ms') -> list[dict]:
+    """Medições acumuladas por método
+    :param ordem: str: chave usada na ordenação decrescente, como tempo_total_ms, chamadas ou comandos_sql
+    :return: list[dict]: uma entrada por método medido
+    """
+    with _trava:
+        resumos = [estatistica.paraDict() for estatistica in _estatisticas.values()]
+    return sorted(resumos, key=lambda resumo: resumo[ordem], reverse=True)
+
+
+def tabela(n: int = 30, ordem: str = 'tempo_total_ms') -> str:
+    """Formata as medições dos métodos mais custosos em uma tabela de texto"""
+    linhas = [f'{"metodo":<52} {"chamadas":>8} {"médio ms":>9} {"p95 ms":>8} {"% banco":>8} {"sql/cham":>8} '
+              f'{"pico bytes":>11}']
+    for r in estatisticas(ordem)[:n]:
+        linhas.append(f'{r["metodo"]:<52} {r["chamadas"]:>8} {r["tempo_medio_ms"]:>9.3f} {r["p95_ms"]:>8.3f} '
+                      f'{r["fracao_banco"]:>8.1%} {r["comandos_por_chamada"]:>8.2f} {r["pico_bytes"]:>11}')
+    return '\n'.join(linhas)
+
+
+def paraJson(caminho: Optional[str] = None) -> str:
+    """Exporta as medições em JSON, gravando-as em caminho quando informado"""
+    documento = json.dumps({'data': datetime.now().isoformat(), 'metodos': estatisticas()}, indent=2)
+    if caminho:
+        Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        Path(caminho).write_text(documento, encoding='utf-8')
+    return documento
+
+
+def limpar() -> None:
+    """Descarta as medições acumuladas"""
+    with _trava:
+        _estatisticas.clear()
+
+
+if os.environ.get('PERFIL_CRUD', '').lower() in ('1', 'true', 'sim'):
+    habilitar(usar_tracemalloc=os.environ.get('PERFIL_CRUD_TRACEMALLOC', '').lower() in ('1', 'true', 'sim'),
+              amostragem=float(os.environ.get('PERFIL_CRUD_AMOSTRAGEM', '0')),
+              diretorio=os.environ.get('PERFIL_CRUD_DIRETORIO'))
+    if os.environ.get('PERFIL_CRUD_ARQUIVO'):
+        atexit.register(paraJson, os.environ['PERFIL_CRUD_ARQUIVO'])
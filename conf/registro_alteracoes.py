@@ -0,0 +1,142 @@
+# Este módulo mantém o log de alterações (models.registro_alteracao). Um evento after_flush da Session registra,
+# na mesma transação da alteração, uma entrada para cada linha apagada pelos métodos delete*ById dos modelos (ou
+# qualquer session.delete). Opcionalmente, as inserções e atualizações também são registradas.
+#
+# Quem replica ou mantém cache dos dados guarda o seq da última entrada lida e, a cada rodada, lê apenas as
+# entradas seguintes:
+#     entradas = lerDesde(offset)
+#     offset = entradas[-1].seq if entradas else offset
+#
+# compactar() remove as entradas substituídas por outra mais nova da mesma linha e, opcionalmente, as mais antigas
+# que a retenção. Exclusões em massa (query.delete()) não passam pelo flush e não são registradas.
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session, aliased
+
+from conf.db_session import createSession
+from models.registro_alteracao import RegistroAlteracao
+
+OPERACOES = ('insert', 'update', 'delete')
+# tabelas de controle do próprio banco, cujas alterações não são registradas
+TABELAS_IGNORADAS = ('registro_alteracao', 'controle_carga', 'controle_sincronizacao')
+
+_config = {'operacoes': ('delete',)}
+
+
+def _garantir_tabela(conexao: sa.engine.Connection) -> None:
+    """Cria a tabela do log na primeira alteração registrada em cada conexão, para bancos criados antes dela. A
+    verificação fica no info da conexão do driver, e não em um cache por URL, porque o arquivo do banco pode ser
+    substituído (restaurarBackup, cópia do simulador) e as conexões abertas depois disso são novas
+    """
+    if not conexao.info.get('registro_alteracao_verificado'):
+        RegistroAlteracao.__table__.create(conexao, checkfirst=True)
+        conexao.info['registro_alteracao_verificado'] = True
+
+
+def _depois_flush(session: Session, flush_context) -> None:
+    agora = datetime.now()
+    entradas = []
+    for operacao, objetos in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        if operacao not in _config['operacoes']:
+            continue
+        for objeto in objetos:
+            mapper = sa.inspect(objeto).mapper
+            tabela = mapper.local_table.name
+            if tabela in TABELAS_IGNORADAS:
+                continue
+            if operacao == 'update' and not session.is_modified(objeto, include_collections=False):
+                continue
+            chave = mapper.primary_key_from_instance(objeto)
+            if len(chave) != 1:
+                continue
+            entradas.append({'tabela': tabela, 'id_registro': chave[0], 'operacao': operacao,
+                             'data_alteracao': agora})
+    if entradas:
+        conexao = session.connection()
+        _garantir_tabela(conexao)
+        conexao.execute(RegistroAlteracao.__table__.insert(), entradas)
+
+
+def habilitar(operacoes: tuple[str, ...] = ('delete',)) -> None:
+    """Passa a registrar no log as alterações das operações informadas
+    :param operacoes: tuple[str, ...]: operações registradas, entre insert, update e delete
+    :raises ValueError: Se alguma operação não for insert, update ou delete
+    """
+    invalidas = set(operacoes) - set(OPERACOES)
+    if invalidas:
+        raise ValueError(f'Operações inválidas para o registro de alterações: {sorted(invalidas)}')
+    _config['operacoes'] = tuple(operacoes)
+    if not sa.event.contains(Session, 'after_flush', _depois_flush):
+        sa.event.listen(Session, 'after_flush', _depois_flush)
+
+
+def desabilitar() -> None:
+    """Para de registrar alterações no log"""
+    if sa.event.contains(Session, 'after_flush', _depois_flush):
+        sa.event.remove(Session, 'after_flush', _depois_flush)
+
+
+def habilitado() -> bool:
+    return sa.event.contains(Session, 'after_flush', _depois_flush)
+
+
+def lerDesde(offset: int = 0, limite: int = 1000, tabelas: Optional[list[str]] = None) -> list[RegistroAlteracao]:
+    """Entradas do log posteriores a offset, na ordem em que foram registradas
+    :param offset: int: seq da última entrada já lida, 0 para ler desde o início
+    :param limite: int: quantidade máxima de entradas devolvidas
+    :param tabelas: list[str]: tabelas de interesse, por padrão todas
+    :return: list[RegistroAlteracao]: entradas com seq maior que offset
+    :raises TypeError: Se o offset ou o limite não forem inteiros
+    """
+    if not isinstance(offset, int) or not isinstance(limite, int):
+        raise TypeError('offset e limite devem ser inteiros!')
+
+    with createSession() as session:
+        consulta = session.query(RegistroAlteracao).filter(RegistroAlteracao.seq > offset)
+        if tabelas is not None:
+            consulta = consulta.filter(RegistroAlteracao.tabela.in_(tabelas))
+        return consulta.order_by(RegistroAlteracao.seq).limit(limite).all()
+
+
+def ultimoSeq() -> int:
+    """:return: int: seq da entrada mais recente do log, 0 se ele estiver vazio"""
+    with createSession() as session:
+        return session.query(sa.func.max(RegistroAlteracao.seq)).scalar() or 0
+
+
+def compactar(retencao_dias: Optional[float] = None) -> dict:
+    """Compacta o log: de cada linha, mantém apenas a entrada mais recente, que já descreve o estado final dela, e
+    apaga as entradas mais antigas que a retenção. Quem tiver parado de ler antes de seq_expirado_ate perdeu
+    entradas e deve recomeçar com uma cópia completa.
+    :param retencao_dias: float: idade máxima das entradas, em dias, None para não expirar entradas
+    :return: dict: substituidas e expiradas (quantidade de entradas apagadas) e seq_expirado_ate
+    """
+    tabela = RegistroAlteracao.__table__
+    mais_nova = aliased(RegistroAlteracao)
+    with createSession() as session:
+        substituida = (sa.select(mais_nova.seq)
+                       .where(mais_nova.tabela == tabela.c.tabela, mais_nova.id_registro == tabela.c.id_registro,
+                              mais_nova.seq > tabela.c.seq)
+                       .exists())
+        substituidas = session.execute(tabela.delete().where(substituida)).rowcount
+
+        expiradas = 0
+        seq_expirado_ate = 0
+        if retencao_dias is not None:
+            limite = datetime.now() - timedelta(days=retencao_dias)
+            seq_expirado_ate = session.execute(sa.select(sa.func.max(tabela.c.seq))
+                                               .where(tabela.c.data_alteracao < limite)).scalar() or 0
+            expiradas = session.execute(tabela.delete().where(tabela.c.seq <= seq_expirado_ate)).rowcount
+        session.commit()
+
+    print(f'Registro de alterações compactado: {substituidas} entradas substituídas e {expiradas} expiradas apagadas')
+    return {'substituidas': substituidas, 'expiradas': expiradas, 'seq_expirado_ate': seq_expirado_ate}
+
+
+_operacoes_ambiente = os.environ.get('REGISTRO_ALTERACOES', 'delete').strip().lower()
+if _operacoes_ambiente not in ('', '0', 'nao', 'não'):
+    habilitar(tuple(operacao.strip() for operacao in _operacoes_ambiente.split(',') if operacao.strip()))
@@ -0,0 +1,258 @@
+# Este módulo sincroniza incrementalmente um banco de origem (normalmente o sqlite) com um banco de destino
+# (normalmente o postgres). Em vez de recarregar tudo, cada tabela guarda no destino uma marca d'água (ver
+# models.controle_sincronizacao): a chave (data_atualizacao, id) da última linha copiada. Cada execução lê apenas as
+# linhas alteradas depois da marca, em lotes ordenados por essa chave (paginação por keyset, sem OFFSET), e as aplica
+# no destino com upsert, na ordem das FKs. O lote e a nova marca são confirmados na mesma transação.
+#
+# A data_atualizacao é preenchida pelo python no flush, antes de a transação obter o lock do banco e ser confirmada
+# (a espera pelo lock vai até o timeout de 30 s, e um unitOfWork ou um grupo do EscritorUnico confirma ainda depois),
+# então uma linha pode ficar visível depois de outra mais nova já ter levado a marca além dela. Por isso a leitura
+# recomeça janela_seguranca segundos antes da marca: as linhas dessa janela são relidas e regravadas (o upsert é
+# idempotente) e as que tinham ficado para trás são copiadas.
+#
+# Uma linha apagada na origem não tem mais data_atualizacao para ser lida, então as exclusões vêm do log de
+# alterações da origem (ver conf.registro_alteracoes), lido a partir do último seq aplicado, que fica guardado como a
+# marca da tabela registro_alteracao. Elas são aplicadas antes das cópias, das tabelas que referenciam para as
+# referenciadas, e uma linha apagada e inserida de novo com o mesmo id volta pela cópia seguinte.
+
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+
+from conf.escrita_em_lote import upsert
+from models.model_base import ModelBase
+from models.controle_sincronizacao import ControleSincronizacao
+from models.registro_alteracao import RegistroAlteracao
+from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
+
+# tabelas de controle do próprio banco, que não são copiadas
+TABELAS_CONTROLE = ('controle_carga', 'controle_sincronizacao', 'registro_alteracao')
+# segundos relidos antes da marca d'água a cada sincronização, mais que a espera pelo lock somada à transação mais longa
+JANELA_SEGURANCA = 120
+
+
+def tabelasSincronizaveis(tabelas: Optional[list[str]] = None) -> list[list[str]]:
+    """Tabelas a sincronizar agrupadas em estágios pela ordem das FKs
+    :param tabelas: list[str]: tabelas a considerar, por padrão todas as dos modelos exceto as de controle
+    :return: list[list[str]]: estágios, cada um com os nomes das suas tabelas
+    """
+    import models.__all_models
+
+    if tabelas is None:
+        tabelas = [tabela for tabela in ModelBase.metadata.tables if tabela not in TABELAS_CONTROLE]
+    for tabela in tabelas:
+        colunas = ModelBase.metadata.tables[tabela].c
+        if 'id' not in colunas or 'data_atualizacao' not in colunas:
+            raise ValueError(f'A tabela {tabela} não tem as colunas id e data_atualizacao usadas na sincronização!')
+    return DataBaseFeatures.getEstagiosFk(tabelas)
+
+
+def criarIndicesSincronizacao(engine: Engine, tabelas: Optional[list[str]] = None) -> list[str]:
+    """Cria na origem, se ainda não existirem, os índices (data_atualizacao, id) usados na leitura por keyset, que
+    evitam a varredura da tabela inteira a cada lote
+    :param engine: Engine: engine do banco de origem
+    :param tabelas: list[str]: tabelas a indexar, por padrão todas as sincronizáveis
+    :return: list[str]: nomes dos índices
+    """
+    nomes = []
+    with engine.begin() as conexao:
+        for estagio in tabelasSincronizaveis(tabelas):
+            for nome_tabela in estagio:
+                nome_indice = f'ix_{nome_tabela}_data_atualizacao_id'
+                conexao.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {nome_indice} '
+                                        f'ON {nome_tabela} (data_atualizacao, id)')
+                nomes.append(nome_indice)
+    return nomes
+
+
+def lerMarca(conexao: Connection, tabela: str) -> tuple[Optional[datetime], int, int]:
+    """Marca d'água da tabela gravada no destino
+    :param conexao: Connection: conexão com o banco de destino
+    :param tabela: str: nome da tabela
+    :return: tuple[datetime, int, int]: data_atualizacao e id da última linha copiada e total de linhas já copiadas,
+    (None, 0, 0) se a tabela nunca foi sincronizada
+    """
+    controle = ControleSincronizacao.__table__
+    linha = conexao.execute(sa.select(controle.c.marca_data_atualizacao, controle.c.marca_id,
+                                      controle.c.linhas_sincronizadas)
+                            .where(controle.c.tabela == tabela)).first()
+    return tuple(linha) if linha is not None else (None, 0, 0)
+
+
+def sincronizarTabela(origem: Engine, destino: Engine, nome_tabela: str, tamanho_lote: int = 10_000,
+                      janela_seguranca: float = JANELA_SEGURANCA) -> dict:
+    """Copia para o destino as linhas da tabela alteradas desde a última sincronização
+    :param origem: Engine: engine do banco de origem
+    :param destino: Engine: engine do banco de destino
+    :param nome_tabela: str: nome da tabela
+    :param tamanho_lote: int: linhas lidas e confirmadas por vez
+    :param janela_seguranca: float: segundos antes da marca d'água relidos, para copiar as linhas confirmadas depois
+    de outras mais novas
+    :return: dict: linhas (copiadas depois da marca), relidas (da janela de segurança), lotes, segundos, linhas_seg e
+    a marca final da tabela
+    """
+    tabela = ModelBase.metadata.tables[nome_tabela]
+    controle = ControleSincronizacao.__table__
+    with destino.connect() as conexao_destino:
+        marca_data, marca_id, total = lerMarca(conexao_destino, nome_tabela)
+
+    # a primeira página começa na janela de segurança; as seguintes continuam da última linha lida (keyset)
+    leitura = None
+    if marca_data is not None:
+        leitura = tabela.c.data_atualizacao >= marca_data - timedelta(seconds=janela_seguranca)
+    linhas_copiadas = 0
+    linhas_relidas = 0
+    lotes = 0
+    inicio = time.perf_counter()
+    with origem.connect() as conexao_origem:
+        while True:
+            consulta = sa.select(tabela).order_by(tabela.c.data_atualizacao, tabela.c.id).limit(tamanho_lote)
+            if leitura is not None:
+                consulta = consulta.where(leitura)
+            linhas = [dict(linha) for linha in conexao_origem.execute(consulta).mappings()]
+            if not linhas:
+                break
+
+            ultima = (linhas[-1]['data_atualizacao'], linhas[-1]['id'])
+            leitura = sa.or_(tabela.c.data_atualizacao > ultima[0],
+                             sa.and_(tabela.c.data_atualizacao == ultima[0], tabela.c.id > ultima[1]))
+            novas = len(linhas)
+            if marca_data is not None:
+                novas = sum((linha['data_atualizacao'], linha['id']) > (marca_data, marca_id) for linha in linhas)
+            if marca_data is None or ultima > (marca_data, marca_id):
+                marca_data, marca_id = ultima
+            total += novas
+            with destino.begin() as conexao_destino:
+                upsert(conexao_destino, tabela, linhas)
+                upsert(conexao_destino, controle, [{'tabela': nome_tabela, 'marca_data_atualizacao': marca_data,
+                                                    'marca_id': marca_id, 'linhas_sincronizadas': total,
+                                                    'data_criacao': datetime.now(),
+                                                    'data_atualizacao': datetime.now()}])
+            linhas_copiadas += novas
+            linhas_relidas += len(linhas) - novas
+            lotes += 1
+            if len(linhas) < tamanho_lote:
+                break
+
+    if linhas_copiadas and destino.dialect.name == 'postgresql':
+        # os ids vieram da origem, então a sequência do destino precisa ser avançada para os próximos inserts
+        with destino.begin() as conexao_destino:
+            conexao_destino.execute(sa.text(f"SELECT setval(pg_get_serial_sequence('{nome_tabela}', 'id'), "
+                                            f"(SELECT MAX(id) FROM {nome_tabela}))"))
+
+    segundos = time.perf_counter() - inicio
+    return {'linhas': linhas_copiadas, 'relidas': linhas_relidas, 'lotes': lotes, 'segundos': segundos,
+            'linhas_seg': linhas_copiadas / segundos if segundos > 0 else 0.0,
+            'marca_data_atualizacao': marca_data.isoformat() if marca_data is not None else None,
+            'marca_id': marca_id}
+
+
+def sincronizarExclusoes(origem: Engine, destino: Engine, tabelas: list[str], tamanho_lote: int = 10_000) -> dict:
+    """Apaga no destino as linhas cujas exclusões foram registradas no log de alterações da origem desde a última
+    sincronização
+    :param origem: Engine: engine do banco de origem
+    :param destino: Engine: engine do banco de destino
+    :param tabelas: list[str]: tabelas sincronizadas, na ordem das FKs
+    :param tamanho_lote: int: entradas do log lidas e aplicadas por vez
+    :return: dict: linhas apagadas, lotes, segundos, linhas_seg e o seq da última entrada aplicada
+    """
+    log = RegistroAlteracao.__table__
+    controle = ControleSincronizacao.__table__
+    with destino.connect() as conexao_destino:
+        _, marca_seq, total = lerMarca(conexao_destino, log.name)
+
+    apagadas = 0
+    lotes = 0
+    inicio = time.perf_counter()
+    if sa.inspect(origem).has_table(log.name):
+        with origem.connect() as conexao_origem:
+            while True:
+                entradas = conexao_origem.execute(
+                    sa.select(log.c.seq, log.c.tabela, log.c.id_registro)
+                    .where(log.c.seq > marca_seq, log.c.operacao == 'delete')
+                    .order_by(log.c.seq).limit(tamanho_lote)).all()
+                if not entradas:
+                    break
+
+                marca_seq = entradas[-1].seq
+                ids_por_tabela = defaultdict(list)
+                for entrada in entradas:
+                    if entrada.tabela in tabelas:
+                        ids_por_tabela[entrada.tabela].append(entrada.id_registro)
+                with destino.begin() as conexao_destino:
+                    for nome_tabela in reversed(tabelas):
+                        if nome_tabela in ids_por_tabela:
+                            tabela = ModelBase.metadata.tables[nome_tabela]
+                            apagadas += conexao_destino.execute(
+                                tabela.delete().where(tabela.c.id.in_(ids_por_tabela[nome_tabela]))).rowcount
+                    total += len(entradas)
+                    upsert(conexao_destino, controle, [{'tabela': log.name, 'marca_data_atualizacao': None,
+                                                        'marca_id': marca_seq, 'linhas_sincronizadas': total,
+                                                        'data_criacao': datetime.now(),
+                                                        'data_atualizacao': datetime.now()}])
+                lotes += 1
+                if len(entradas) < tamanho_lote:
+                    break
+
+    segundos = time.perf_counter() - inicio
+    return {'linhas': apagadas, 'lotes': lotes, 'segundos': segundos,
+            'linhas_seg': apagadas / segundos if segundos > 0 else 0.0, 'marca_seq': marca_seq}
+
+
+def sincronizar(origem: Engine, destino: Engine, tabelas: Optional[list[str]] = None,
+                tamanho_lote: int = 10_000, criar_indices: bool = True,
+                janela_seguranca: float = JANELA_SEGURANCA) -> dict[str, dict]:
+    """Sincroniza as tabelas da origem com o destino, das tabelas referenciadas para as que as referenciam, de modo
+    que as FKs de cada lote já existam no destino
+    :param origem: Engine: engine do banco de origem
+    :param destino: Engine: engine do banco de destino, onde o esquema e as marcas d'água são criados se preciso
+    :param tabelas: list[str]: tabelas a sincronizar, por padrão todas as dos modelos exceto as de controle
+    :param tamanho_lote: int: linhas lidas e confirmadas por vez
+    :param criar_indices: bool: se True, cria na origem os índices usados na leitura por keyset
+    :param janela_seguranca: float: segundos antes da marca d'água de cada tabela relidos a cada execução
+    :return: dict[str, dict]: vazão de cada tabela (ver sincronizarTabela) e, em registro_alteracao, a das exclusões
+    (ver sincronizarExclusoes)
+    :raises ValueError: Se o tamanho_lote não for positivo ou a janela_seguranca for negativa
+    """
+    if tamanho_lote <= 0:
+        raise ValueError('tamanho_lote deve ser maior que zero!')
+    if janela_seguranca < 0:
+        raise ValueError('janela_seguranca não pode ser negativa!')
+
+    estagios = tabelasSincronizaveis(tabelas)
+    nomes = [tabela for estagio in estagios for tabela in estagio]
+    ModelBase.metadata.create_all(destino, tables=[ModelBase.metadata.tables[nome] for nome in nomes] +
+                                  [ControleSincronizacao.__table__])
+    if criar_indices:
+        criarIndicesSincronizacao(origem, nomes)
+
+    resultados = {}
+    exclusoes = sincronizarExclusoes(origem, destino, nomes, tamanho_lote=tamanho_lote)
+    print(f'Exclusões sincronizadas: {exclusoes["linhas"]} linhas apagadas em {exclusoes["segundos"]:.2f} s')
+    resultados[RegistroAlteracao.__tablename__] = exclusoes
+    for nome_tabela in nomes:
+        resultado = sincronizarTabela(origem, destino, nome_tabela, tamanho_lote=tamanho_lote,
+                                      janela_seguranca=janela_seguranca)
+        print(f'Tabela {nome_tabela} sincronizada: {resultado["linhas"]} linhas ({resultado["relidas"]} relidas) em '
+              f'{resultado["lotes"]} lotes, {resultado["segundos"]:.2f} s ({resultado["linhas_seg"]:.0f} linhas/s)')
+        resultados[nome_tabela] = resultado
+    return resultados
+
+
+def reiniciarMarcas(destino: Engine, tabelas: Optional[list[str]] = None) -> int:
+    """Apaga as marcas d'água do destino, para que a próxima sincronização copie as tabelas inteiras
+    :param destino: Engine: engine do banco de destino
+    :param tabelas: list[str]: tabelas cujas marcas serão apagadas, por padrão todas
+    :return: int: quantidade de marcas apagadas
+    """
+    controle = ControleSincronizacao.__table__
+    controle.create(destino, checkfirst=True)
+    comando = controle.delete()
+    if tabelas is not None:
+        comando = comando.where(controle.c.tabela.in_(tabelas))
+    with destino.begin() as conexao:
+        return conexao.execute(comando).rowcount
@@ -0,0 +1,33 @@
+import argparse
+import sys
+
+import sqlalchemy as sa
+
+from conf.exportacao import exportar
+from models.model_base import ModelBase
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Exporta uma tabela para CSV ou JSONL (.gz para compactar), lendo e '
+                                                 'escrevendo em lotes, com memória constante.')
+    parser.add_argument('tabela', help='nome da tabela, ex.: nota_fiscal')
+    parser.add_argument('saida', help='arquivo de saída: .csv, .jsonl, .csv.gz ou .jsonl.gz')
+    parser.add_argument('--onde', default=None, help="filtro SQL aplicado à tabela, ex.: \"valor > 100\"")
+    parser.add_argument('--tamanho-lote', type=int, default=10_000, help='linhas lidas do cursor por vez')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+    origem = args.tabela
+    if args.onde:
+        import models.__all_models
+
+        tabela = ModelBase.metadata.tables[args.tabela]
+        origem = sa.select(tabela).where(sa.text(args.onde)).order_by(*tabela.primary_key.columns)
+    exportar(origem, args.saida, tamanho_lote=args.tamanho_lote)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import argparse
+import sys
+
+from conf.importacao import IMPORTACOES, importar
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Importa um arquivo CSV ou JSONL (.gz se compactado) para uma tabela '
+                                                 'de cadastro, em lotes, resolvendo as FKs pela chave natural. Os '
+                                                 'registros rejeitados vão para um arquivo de erros.')
+    parser.add_argument('tabela', choices=sorted(IMPORTACOES), help='tabela de destino, ex.: nota_fiscal')
+    parser.add_argument('arquivo', help='arquivo importado: .csv, .jsonl, .csv.gz ou .jsonl.gz')
+    parser.add_argument('--tamanho-lote', type=int, default=None,
+                        help='registros gravados por transação, por padrão ajustado pela latência de cada lote')
+    parser.add_argument('--alvo-ms', type=float, default=250,
+                        help='latência máxima desejada por lote, em milissegundos, quando o tamanho é ajustado')
+    parser.add_argument('--erros', default=None,
+                        help='arquivo JSONL com os registros rejeitados, por padrão <arquivo>.erros.jsonl')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+    relatorio = importar(args.tabela, args.arquivo, tamanho_lote=args.tamanho_lote, arquivo_erros=args.erros,
+                         alvo_ms=args.alvo_ms)
+    return 1 if relatorio['rejeitadas'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import argparse
+import sys
+
+from conf.ingestao_notas import ingerirNotasFiscais
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Ingere um arquivo JSONL de notas fiscais (cnpj, numero_serie, valor '
+                                                 'e lotes por linha) por um pipeline de estágios com filas limitadas, '
+                                                 'emitindo as notas em lotes.')
+    parser.add_argument('arquivo', help='arquivo .jsonl ou .jsonl.gz')
+    parser.add_argument('--tamanho-bloco', type=int, default=500, help='registros passados entre estágios por vez')
+    parser.add_argument('--tamanho-lote', type=int, default=1_000, help='notas emitidas por transação')
+    parser.add_argument('--tamanho-fila', type=int, default=8, help='blocos na fila de entrada de cada estágio')
+    parser.add_argument('--erros', default=None,
+                        help='arquivo JSONL com os registros rejeitados, por padrão <arquivo>.erros.jsonl')
+    parser.add_argument('--intervalo-progresso', type=float, default=5.0,
+                        help='segundos entre as linhas de progresso, 0 para não imprimir')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+    relatorio = ingerirNotasFiscais(args.arquivo, tamanho_bloco=args.tamanho_bloco, tamanho_lote=args.tamanho_lote,
+                                    tamanho_fila=args.tamanho_fila, arquivo_erros=args.erros,
+                                    intervalo_progresso=args.intervalo_progresso)
+    return 1 if relatorio['rejeitadas'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
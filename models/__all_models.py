@@ -18,4 +18,6 @@ from models.aditivo_nutritivo_picole import AditivoNutritivoPicole
 from models.conservante_picole import ConservantePicole
 from models.ingrediente_picole import IngredientePicole
 from models.lote_nota_fiscal import LoteNotaFiscal
-
+from models.controle_carga import ControleCarga
+from models.controle_sincronizacao import ControleSincronizacao
+from models.registro_alteracao import RegistroAlteracao
@@ -2,11 +2,13 @@ import sqlalchemy as sa
 from datetime import datetime
 from models.model_base import ModelBase
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 from sqlalchemy.orm import Mapped
 
 
+@instrumentarCrud
 class AditivoNutritivo(ModelBase):
     """Classe que representa a tabela 'aditivo_nutritivo' no banco de dados.
     Atributos:
@@ -10,9 +10,11 @@ from models.model_base import ModelBase
 from models.picole import Picole
 from models.aditivo_nutritivo import AditivoNutritivo
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 
 
+@instrumentarCrud
 class AditivoNutritivoPicole(ModelBase):
     __tablename__ = 'aditivo_nutritivo_picole'
 
@@ -25,7 +27,10 @@ class AditivoNutritivoPicole(ModelBase):
                                        sa.ForeignKey('picole.id'),
                                        nullable=False
                                        )
-    picole: Mapped[Picole] = orm.relationship('Picole', lazy='joined')
+    # o backref cria em Picole a coleção aditivos_nutritivos_picole; com passive_deletes='all' o delete do picolé
+    # não anula o picole_fk das associações, que continuam impedindo o delete pela FK
+    picole: Mapped[Picole] = orm.relationship('Picole', lazy='joined',
+                                              backref=orm.backref('aditivos_nutritivos_picole', passive_deletes='all'))
 
     aditivo_nutritivo_fk: Mapped[int] = sa.Column(sa.BigInteger().with_variant(sa.Integer, "sqlite"),
                                                   sa.ForeignKey('aditivo_nutritivo.id'),
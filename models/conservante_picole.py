@@ -10,9 +10,11 @@ from models.model_base import ModelBase
 from models.picole import Picole
 from models.conservante import Conservante
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 
 
+@instrumentarCrud
 class ConservantePicole(ModelBase):
     __tablename__ = 'conservante_picole'
 
@@ -24,7 +26,10 @@ class ConservantePicole(ModelBase):
                                sa.ForeignKey('picole.id'),
                                nullable=False
                                )
-    picole: Mapped[Picole] = orm.relationship('Picole', lazy='joined')
+    # o backref cria em Picole a coleção conservantes_picole; com passive_deletes='all' o delete do picolé não anula
+    # o picole_fk das associações, que continuam impedindo o delete pela FK
+    picole: Mapped[Picole] = orm.relationship('Picole', lazy='joined',
+                                              backref=orm.backref('conservantes_picole', passive_deletes='all'))
 
     conservante_fk: Mapped[int] = sa.Column(sa.BigInteger().with_variant(sa.Integer, "sqlite"),
                                     sa.ForeignKey('conservante.id'),
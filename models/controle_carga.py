@@ -0,0 +1,72 @@
+import sqlalchemy as sa
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped
+
+from models.model_base import ModelBase
+from conf.db_session import createSession
+
+
+class ControleCarga(ModelBase):
+    """Checkpoint das cargas em lote: guarda quantas linhas de cada carga já foram confirmadas no banco, para que
+    uma nova execução continue a partir do último lote confirmado em vez de recomeçar do zero."""
+    __tablename__ = 'controle_carga'
+
+    nome_carga: Mapped[str] = sa.Column(sa.String(100), primary_key=True)
+    linhas_confirmadas: Mapped[int] = sa.Column(sa.BigInteger, nullable=False, default=0)
+    total_linhas: Mapped[int] = sa.Column(sa.BigInteger, nullable=False)
+    concluida: Mapped[bool] = sa.Column(sa.Boolean, nullable=False, default=False)
+    data_criacao: Mapped[datetime] = sa.Column(sa.DateTime, nullable=False, default=datetime.now)
+    data_atualizacao: Mapped[datetime] = sa.Column(sa.DateTime, default=datetime.now,
+                                                   nullable=False, onupdate=datetime.now)
+
+    def __repr__(self):
+        """Retorna uma representação do objeto em forma de 'string'."""
+        return (f'<ControleCarga(nome_carga={self.nome_carga}, linhas_confirmadas={self.linhas_confirmadas}, '
+                f'total_linhas={self.total_linhas}, concluida={self.concluida})>')
+
+    @staticmethod
+    def selectLinhasConfirmadas(nome_carga: str) -> int:
+        """Retorna quantas linhas da carga já foram confirmadas no banco
+        :param nome_carga: str: nome da carga
+        :return: int: quantidade de linhas confirmadas, 0 caso a carga nunca tenha sido executada
+        :raises TypeError: Se o nome_carga não for string
+        :raises ValueError: Se o nome_carga não for informado
+        """
+        try:
+            if not isinstance(nome_carga, str):
+                raise TypeError('nome_carga do ControleCarga deve ser uma string!')
+
+            if not nome_carga.strip():
+                raise ValueError('nome_carga do ControleCarga não informado!')
+
+            with createSession() as session:
+                controle = session.query(ControleCarga).filter_by(nome_carga=nome_carga).first()
+                return controle.linhas_confirmadas if controle else 0
+
+        except TypeError as te:
+            raise TypeError(te)
+
+        except ValueError as ve:
+            raise ValueError(ve)
+
+        except Exception as exc:
+            raise Exception(f'Erro inesperado ao selecionar ControleCarga: {exc}')
+
+    @staticmethod
+    def deleteControleCarga(nome_carga: str = None) -> int:
+        """Apaga o checkpoint de uma carga, ou de todas, para que a próxima execução recomece do zero
+        :param nome_carga: str: nome da carga, se não informado apaga os checkpoints de todas as cargas
+        :return: int: quantidade de checkpoints apagados
+        """
+        try:
+            with createSession() as session:
+                consulta = session.query(ControleCarga)
+                if nome_carga is not None:
+                    consulta = consulta.filter_by(nome_carga=nome_carga)
+                apagados = consulta.delete(synchronize_session=False)
+                session.commit()
+                return apagados
+
+        except Exception as exc:
+            raise Exception(f'Erro inesperado ao apagar ControleCarga: {exc}')
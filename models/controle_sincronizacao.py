@@ -0,0 +1,26 @@
+import sqlalchemy as sa
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped
+
+from models.model_base import ModelBase
+
+
+class ControleSincronizacao(ModelBase):
+    """Marca d'água da sincronização incremental (ver conf.sincronizacao): para cada tabela, a chave
+    (data_atualizacao, id) da última linha copiada para o banco de destino. Fica no próprio destino e é gravada na
+    mesma transação de cada lote, para que uma sincronização interrompida continue do último lote confirmado."""
+    __tablename__ = 'controle_sincronizacao'
+
+    tabela: Mapped[str] = sa.Column(sa.String(100), primary_key=True)
+    marca_data_atualizacao: Mapped[datetime] = sa.Column(sa.DateTime, nullable=True)
+    marca_id: Mapped[int] = sa.Column(sa.BigInteger, nullable=False, default=0)
+    linhas_sincronizadas: Mapped[int] = sa.Column(sa.BigInteger, nullable=False, default=0)
+    data_criacao: Mapped[datetime] = sa.Column(sa.DateTime, nullable=False, default=datetime.now)
+    data_atualizacao: Mapped[datetime] = sa.Column(sa.DateTime, default=datetime.now,
+                                                   nullable=False, onupdate=datetime.now)
+
+    def __repr__(self):
+        """Retorna uma representação do objeto em forma de 'string'."""
+        return (f'<ControleSincronizacao(tabela={self.tabela}, marca_data_atualizacao={self.marca_data_atualizacao}, '
+                f'marca_id={self.marca_id}, linhas_sincronizadas={self.linhas_sincronizadas})>')
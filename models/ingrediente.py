@@ -6,9 +6,11 @@ from sqlalchemy.orm import Mapped
 from models.model_base import ModelBase
 from sqlalchemy.exc import IntegrityError
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 
 
+@instrumentarCrud
 class Ingrediente(ModelBase):
     __tablename__ = 'ingrediente'
 
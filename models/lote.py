@@ -9,9 +9,11 @@ from models.model_base import ModelBase
 from models.picole import Picole
 from sqlalchemy.exc import NoForeignKeysError, IntegrityError
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 
 
+@instrumentarCrud
 class Lote(ModelBase):
     __tablename__ = 'lote'
 
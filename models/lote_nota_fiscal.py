@@ -1,3 +1,4 @@
+from collections import Counter
 from typing import Union
 
 import sqlalchemy as sa
@@ -9,10 +10,18 @@ from sqlalchemy.orm import Mapped
 from models.model_base import ModelBase
 from models.lote import Lote
 from models.nota_fiscal import NotaFiscal
+from models.revendedor import Revendedor
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 
 
+class NotaFiscalRejeitadaError(RuntimeError):
+    """Notas fiscais recusadas pela validação ou por uma restrição do banco, ao contrário das falhas do banco (lock,
+    disco cheio...), que são lançadas como RuntimeError"""
+
+
+@instrumentarCrud
 class LoteNotaFiscal(ModelBase):
     __tablename__ = 'lote_nota_fiscal'
 
@@ -302,6 +311,167 @@ class LoteNotaFiscal(ModelBase):
         except Exception as exc:
             raise RuntimeError(f'Erro inesperado ao deletar LoteNotaFiscal: {exc}')
 
+    @staticmethod
+    def emitirNotaFiscal(valor: float, numero_serie: str, descricao: str, revendedor_fk: int,
+                         lotes_fk: list[int]) -> int:
+        """Emite uma nota fiscal com os seus lotes em uma única transação, em vez de insertNotaFiscal seguido de um
+        insertLoteNotaFiscal por lote (ver emitirNotasFiscais)
+        :param valor: float: valor da nota fiscal, duas casas decimais
+        :param numero_serie: str: número de série da nota fiscal
+        :param descricao: str: descrição da nota fiscal
+        :param revendedor_fk: int: id do revendedor
+        :param lotes_fk: list[int]: ids dos lotes da nota, que ainda não podem estar em outra nota fiscal
+        :return: int: id da nota fiscal emitida
+        :raises TypeError: Se os valores não forem dos tipos esperados
+        :raises ValueError: Se o número de série, a descrição ou os lotes não forem informados
+        :raises NotaFiscalRejeitadaError: Se o revendedor ou algum lote não existir, se algum lote já estiver em
+        outra nota fiscal ou se o número de série já existir
+        :raises RuntimeError: Se o banco falhar ao emitir a nota
+        """
+        return LoteNotaFiscal.emitirNotasFiscais([{'valor': valor, 'numero_serie': numero_serie,
+                                                   'descricao': descricao, 'revendedor_fk': revendedor_fk,
+                                                   'lotes_fk': lotes_fk}])[0]
+
+    @staticmethod
+    def emitirNotasFiscais(notas: list[dict]) -> list[int]:
+        """Emite várias notas fiscais com os seus lotes em uma única transação. Os revendedores, os lotes e os números
+        de série são conferidos em uma única consulta, e a regra de um lote por nota fiscal é verificada antes de
+        gravar; as notas e todos os vínculos lote_nota_fiscal são inseridos em um comando para cada tabela. Se alguma
+        nota for inválida, nenhuma é emitida.
+        :param notas: list[dict]: notas com valor, numero_serie, descricao, revendedor_fk e lotes_fk, como nos
+        parâmetros de emitirNotaFiscal. Os ids de todas as notas somados devem caber no limite de parâmetros por
+        comando do banco (ver conf.escrita_em_lote.maximoLinhasPorComando)
+        :return: list[int]: ids das notas fiscais emitidas, na ordem de notas
+        :raises TypeError: Se notas não for uma lista ou se os valores não forem dos tipos esperados
+        :raises ValueError: Se notas estiver vazia ou se o número de série, a descrição ou os lotes de alguma nota
+        não forem informados
+        :raises NotaFiscalRejeitadaError: Se algum revendedor ou lote não existir, se algum lote já estiver em outra
+        nota fiscal ou aparecer em mais de uma nota, ou se algum número de série já existir ou se repetir
+        :raises RuntimeError: Se o banco falhar ao emitir as notas
+        """
+        try:
+            if not isinstance(notas, list):
+                raise TypeError('notas deve ser uma lista!')
+            if not notas:
+                raise ValueError('Nenhuma nota fiscal informada!')
+            notas = [_normalizar_emissao(nota) for nota in notas]
+
+            problemas = []
+            series_repetidas = sorted(serie for serie, vezes in
+                                      Counter(nota['numero_serie'] for nota in notas).items() if vezes > 1)
+            if series_repetidas:
+                problemas.append(f'números de série repetidos nas notas: {series_repetidas}')
+            lotes_repetidos = sorted(lote for lote, vezes in
+                                     Counter(lote for nota in notas for lote in nota['lotes_fk']).items() if vezes > 1)
+            if lotes_repetidos:
+                problemas.append(f'lotes em mais de uma nota: {lotes_repetidos}')
+
+            revendedores = Revendedor.__table__
+            lotes = Lote.__table__
+            notas_fiscais = NotaFiscal.__table__
+            vinculos = LoteNotaFiscal.__table__
+            ids_revendedores = sorted({nota['revendedor_fk'] for nota in notas})
+            ids_lotes = sorted({lote for nota in notas for lote in nota['lotes_fk']})
+            series = sorted({nota['numero_serie'] for nota in notas})
+            # revendedores e lotes existentes, vínculos dos lotes e números de série já usados, em uma consulta
+            consulta = sa.union_all(
+                sa.select(sa.literal('revendedor').label('tipo'), revendedores.c.id.label('id'),
+                          sa.literal(None, sa.Integer).label('nota_fiscal_fk'),
+                          sa.literal(None, sa.String).label('numero_serie'))
+                .where(revendedores.c.id.in_(ids_revendedores)),
+                sa.select(sa.literal('lote'), lotes.c.id, vinculos.c.nota_fiscal_fk, sa.literal(None, sa.String))
+                .select_from(lotes.outerjoin(vinculos, vinculos.c.lote_fk == lotes.c.id))
+                .where(lotes.c.id.in_(ids_lotes)),
+                sa.select(sa.literal('nota_fiscal'), notas_fiscais.c.id, sa.literal(None, sa.Integer),
+                          notas_fiscais.c.numero_serie)
+                .where(notas_fiscais.c.numero_serie.in_(series)))
+
+            with createSession() as session:
+                encontrados = session.execute(consulta).all()
+                revendedores_existentes = {linha.id for linha in encontrados if linha.tipo == 'revendedor'}
+                lotes_existentes = {linha.id: linha.nota_fiscal_fk for linha in encontrados if linha.tipo == 'lote'}
+                series_existentes = sorted(linha.numero_serie for linha in encontrados
+                                           if linha.tipo == 'nota_fiscal')
+
+                faltantes = [id_revendedor for id_revendedor in ids_revendedores
+                             if id_revendedor not in revendedores_existentes]
+                if faltantes:
+                    problemas.append(f'revendedores não encontrados: {faltantes}')
+                faltantes = [lote for lote in ids_lotes if lote not in lotes_existentes]
+                if faltantes:
+                    problemas.append(f'lotes não encontrados: {faltantes}')
+                vinculados = sorted(lote for lote, nota_fk in lotes_existentes.items() if nota_fk is not None)
+                if vinculados:
+                    problemas.append(f'lotes já vinculados a outra nota fiscal: {vinculados}')
+                if series_existentes:
+                    problemas.append(f'números de série já cadastrados: {series_existentes}')
+                if problemas:
+                    raise NotaFiscalRejeitadaError(f'Notas fiscais não emitidas: {"; ".join(problemas)}')
+
+                linhas = [{coluna: nota[coluna] for coluna in ('valor', 'numero_serie', 'descricao', 'revendedor_fk')}
+                          for nota in notas]
+                if len(linhas) == 1:
+                    ids = list(session.execute(notas_fiscais.insert(), linhas[0]).inserted_primary_key)
+                else:
+                    session.execute(notas_fiscais.insert(), linhas)
+                    ids_por_serie = dict(session.execute(sa.select(notas_fiscais.c.numero_serie, notas_fiscais.c.id)
+                                                         .where(notas_fiscais.c.numero_serie.in_(series))).all())
+                    ids = [ids_por_serie[nota['numero_serie']] for nota in notas]
+                session.execute(vinculos.insert(), [
+                    {'nota_fiscal_fk': id_nota, 'lote_fk': lote, 'lote_nota_fiscal': f'{lote}-{id_nota}'}
+                    for id_nota, nota in zip(ids, notas) for lote in nota['lotes_fk']])
+                session.commit()
+
+            print(f'{len(ids)} notas fiscais emitidas com {len(ids_lotes)} lotes')
+            return ids
+
+        except IntegrityError as intg_error:
+            raise NotaFiscalRejeitadaError(f'Erro de integridade ao emitir notas fiscais: {intg_error.orig}')
+
+        except TypeError as te:
+            raise TypeError(te)
+
+        except ValueError as ve:
+            raise ValueError(ve)
+
+        except NotaFiscalRejeitadaError:
+            raise
+
+        except RuntimeError as re:
+            raise RuntimeError(re)
+
+        except Exception as exc:
+            raise RuntimeError(f'Erro inesperado ao emitir notas fiscais: {exc}') from exc
+
+
+def _normalizar_emissao(nota: dict) -> dict:
+    """Valida e normaliza uma nota a emitir como em NotaFiscal.insertNotaFiscal"""
+    if not isinstance(nota, dict):
+        raise TypeError('Cada nota fiscal deve ser um dict!')
+    valor, numero_serie, descricao = nota.get('valor'), nota.get('numero_serie'), nota.get('descricao')
+    revendedor_fk, lotes_fk = nota.get('revendedor_fk'), nota.get('lotes_fk')
+    if not isinstance(valor, (float, int)) or isinstance(valor, bool):
+        raise TypeError('valor da NotaFiscal deve ser um número!')
+    if not isinstance(numero_serie, str):
+        raise TypeError('numero_serie da NotaFiscal deve ser uma string!')
+    if not isinstance(descricao, str):
+        raise TypeError('descricao da NotaFiscal deve ser uma string!')
+    if not isinstance(revendedor_fk, int):
+        raise TypeError('revendedor_fk da NotaFiscal deve ser um inteiro!')
+    if not isinstance(lotes_fk, (list, tuple)) or not all(isinstance(lote, int) for lote in lotes_fk):
+        raise TypeError('lotes_fk da NotaFiscal deve ser uma lista de inteiros!')
+
+    numero_serie = numero_serie.strip().upper()
+    descricao = descricao.strip().upper()
+    if not numero_serie:
+        raise ValueError('numero_serie da NotaFiscal não informado!')
+    if not descricao:
+        raise ValueError('descricao da NotaFiscal não informada!')
+    if not lotes_fk:
+        raise ValueError('lotes_fk da NotaFiscal não informados!')
+    return {'valor': round(float(valor), 2), 'numero_serie': numero_serie, 'descricao': descricao,
+            'revendedor_fk': revendedor_fk, 'lotes_fk': list(dict.fromkeys(lotes_fk))}
+
 
 if __name__ == '__main__':
     # try:
@@ -1,8 +1,84 @@
 # Este módulo é responsável por criar a classe ModelBase, que é uma classe base para todos os modelos que serão criados
 # para representar as tabelas do banco de dados.
+#
+# Todos os modelos herdam também as contagens de ConsultasAgregadas (count, exists e countBy), feitas com
+# SELECT count(*) e EXISTS direto na tabela: nenhum objeto é montado e os relacionamentos lazy='joined' não são
+# juntados, e com filtro em colunas indexadas o banco conta pelo índice, sem ler a tabela.
 
+from typing import Union
+
+import sqlalchemy as sa
 import sqlalchemy.ext.declarative
 
 
+class ConsultasAgregadas:
+    """Contagens por filtros de igualdade nas colunas do modelo, por exemplo Picole.count(tipo_picole_fk=1). Um
+    filtro com lista, tupla ou conjunto vira IN e um filtro None vira IS NULL"""
+
+    @classmethod
+    def _coluna(cls, nome: Union[str, sa.Column]) -> sa.Column:
+        """Coluna da tabela do modelo pelo nome ou pelo atributo do modelo"""
+        nome = getattr(nome, 'key', nome)
+        if not isinstance(nome, str):
+            raise TypeError(f'Coluna de {cls.__name__} deve ser informada pelo nome!')
+        if nome not in cls.__table__.columns:
+            raise ValueError(f'Coluna {nome} não encontrada em {cls.__name__}!')
+        return cls.__table__.columns[nome]
+
+    @classmethod
+    def _filtros(cls, filtros: dict) -> list:
+        condicoes = []
+        for nome, valor in filtros.items():
+            coluna = cls._coluna(nome)
+            if valor is None:
+                condicoes.append(coluna.is_(None))
+            elif isinstance(valor, (list, tuple, set, frozenset)):
+                condicoes.append(coluna.in_(list(valor)))
+            else:
+                condicoes.append(coluna == valor)
+        return condicoes
+
+    @classmethod
+    def count(cls, **filtros) -> int:
+        """Conta as linhas da tabela do modelo que atendem aos filtros, com SELECT count(*)
+        :param filtros: valores das colunas, por exemplo sabor_fk=1 ou id=[1, 2, 3]
+        :return: int: quantidade de linhas
+        :raises ValueError: Se algum filtro não for uma coluna do modelo
+        """
+        from conf.db_session import createSession
+
+        consulta = sa.select(sa.func.count()).select_from(cls.__table__).where(*cls._filtros(filtros))
+        with createSession() as session:
+            return session.execute(consulta).scalar_one()
+
+    @classmethod
+    def exists(cls, **filtros) -> bool:
+        """Verifica se alguma linha da tabela do modelo atende aos filtros, com EXISTS, que para na primeira encontrada
+        :param filtros: valores das colunas, por exemplo nome='Morango'
+        :return: bool
+        :raises ValueError: Se algum filtro não for uma coluna do modelo
+        """
+        from conf.db_session import createSession
+
+        consulta = sa.select(sa.exists().where(*cls._filtros(filtros)).select_from(cls.__table__))
+        with createSession() as session:
+            return bool(session.execute(consulta).scalar_one())
+
+    @classmethod
+    def countBy(cls, coluna: Union[str, sa.Column], **filtros) -> dict:
+        """Conta as linhas da tabela do modelo por valor da coluna, com SELECT coluna, count(*) ... GROUP BY coluna
+        :param coluna: str: nome (ou atributo do modelo) da coluna agrupada, por exemplo 'tipo_picole_fk'
+        :param filtros: valores das colunas, como em count
+        :return: dict: quantidade de linhas por valor da coluna, apenas dos valores que aparecem na tabela
+        :raises ValueError: Se a coluna ou algum filtro não for uma coluna do modelo
+        """
+        from conf.db_session import createSession
+
+        agrupada = cls._coluna(coluna)
+        consulta = sa.select(agrupada, sa.func.count()).where(*cls._filtros(filtros)).group_by(agrupada)
+        with createSession() as session:
+            return {valor: quantidade for valor, quantidade in session.execute(consulta)}
+
+
 # ModelBase is a class that will be inherited by all the models we create
-ModelBase = sqlalchemy.ext.declarative.declarative_base()
+ModelBase = sqlalchemy.ext.declarative.declarative_base(cls=ConsultasAgregadas, name='ModelBase')
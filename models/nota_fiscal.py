@@ -8,10 +8,12 @@ from models.model_base import ModelBase
 from models.revendedor import Revendedor
 from typing import List, Union
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 
 
+@instrumentarCrud
 class NotaFiscal(ModelBase):
     __tablename__ = 'nota_fiscal'
 
@@ -10,13 +10,21 @@ from models.model_base import ModelBase
 from models.sabor import Sabor
 from models.tipo_picole import TipoPicole
 from models.tipo_embalagem import TipoEmbalagem
-from conf.db_session import createSession
+from conf.db_session import createEngine, createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 
 
+@instrumentarCrud
 class Picole(ModelBase):
     __tablename__ = 'picole'
+    # a busca por tipo, sabor ou embalagem (selectPicoles) ordenada ou filtrada por preço lê o índice na ordem do preço
+    # e para no limite, sem ler a tabela inteira nem ordenar em memória. Em bancos já existentes, crie-os com
+    # Picole.criarIndicesPicole()
+    __table_args__ = (sa.Index('ix_picole_tipo_picole_preco', 'tipo_picole_fk', 'preco'),
+                      sa.Index('ix_picole_sabor_preco', 'sabor_fk', 'preco'),
+                      sa.Index('ix_picole_tipo_embalagem_preco', 'tipo_embalagem_fk', 'preco'))
 
     id: Mapped[int] = sa.Column(sa.BigInteger().with_variant(sa.Integer, "sqlite"),
                                 # para funcionar o autoincrement no sqlite
@@ -40,6 +48,9 @@ class Picole(ModelBase):
                                             nullable=False)
     tipo_picole: Mapped[TipoPicole] = orm.relationship('TipoPicole', lazy='joined')
 
+    # composição do picolé: as coleções ingredientes_picole, conservantes_picole e aditivos_nutritivos_picole são
+    # criadas pelos backrefs das tabelas de associação (ver selectComposicao)
+
     # chave forte para evitar duplicidades
     # chave forte para imedir se ser inserido o mesmo par de lote e nota fiscal
     sabor_tipoPicole_tipoEmbalagem: Mapped[str] = sa.Column(sa.String(200),
@@ -172,6 +183,117 @@ class Picole(ModelBase):
         except Exception as exc:
             print(f'Erro inesperado: {exc}')
 
+    @staticmethod
+    def criarIndicesPicole(engine: Union[sa.engine.Engine, None] = None) -> list[str]:
+        """Cria, se ainda não existirem, os índices (FK, preço) usados por selectPicoles. createTables os cria com a
+        tabela, mas bancos criados antes deles só os recebem por aqui
+        :param engine: Engine: engine do banco, padrão a da camada de acesso
+        :return: list[str]: nomes dos índices
+        """
+        engine = engine or createEngine()
+        indices = sorted(Picole.__table__.indexes, key=lambda indice: indice.name)
+        for indice in indices:
+            indice.create(engine, checkfirst=True)
+        return [indice.name for indice in indices]
+
+    @staticmethod
+    def selectComposicao(ids: list[int]) -> list['Picole'] or []:
+        """Seleciona Picoles na tabela picole por id com a composição carregada: ingredientes_picole,
+        conservantes_picole e aditivos_nutritivos_picole, cada um com o seu ingrediente, conservante ou aditivo.
+        São 1 + 3·⌈n/500⌉ consultas para n picolés encontrados: uma para os picolés e, para cada coleção, uma a cada
+        bloco de 500 picolés (selectin); até 500 picolés, 4 consultas
+        :param ids: list[int]: ids dos picolés
+        :return: list[Picole] or []: Retorna os Picoles encontrados, na ordem dos ids
+        :raises TypeError: Se algum id não for um inteiro
+        """
+        try:
+            if not isinstance(ids, (list, tuple, set)) or not all(isinstance(id, int) for id in ids):
+                raise TypeError('ids dos Picoles devem ser uma lista de inteiros!')
+            if not ids:
+                return []
+
+            from models.aditivo_nutritivo_picole import AditivoNutritivoPicole
+            from models.conservante_picole import ConservantePicole
+            from models.ingrediente_picole import IngredientePicole
+
+            # o picole das associações é o dono da coleção, já carregado, então não é juntado de novo na consulta
+            with createSession() as session:
+                picoles = session.query(Picole).filter(Picole.id.in_(set(ids))).options(
+                    orm.selectinload(Picole.ingredientes_picole).lazyload(IngredientePicole.picole),
+                    orm.selectinload(Picole.conservantes_picole).lazyload(ConservantePicole.picole),
+                    orm.selectinload(Picole.aditivos_nutritivos_picole).lazyload(AditivoNutritivoPicole.picole),
+                ).all()
+                por_id = {picole.id: picole for picole in picoles}
+                return [por_id[id] for id in dict.fromkeys(ids) if id in por_id]
+
+        except TypeError as te:
+            raise TypeError(te)
+
+        except Exception as exc:
+            raise Exception(f'Erro inesperado ao selecionar a composição dos Picoles: {exc}')
+
+    @staticmethod
+    def selectPicoles(sabor_fk: Union[int, None] = None, tipo_picole_fk: Union[int, None] = None,
+                      tipo_embalagem_fk: Union[int, None] = None, preco_min: Union[float, None] = None,
+                      preco_max: Union[float, None] = None, ordem: str = 'preco',
+                      limite: Union[int, None] = None) -> list['Picole'] or []:
+        """Seleciona Picoles na tabela picole combinando os filtros informados em uma única consulta. Com um dos FKs
+        informado, a consulta usa o índice (FK, preço), então os N mais baratos de um tipo são lidos do índice
+        :param sabor_fk: int: id do sabor
+        :param tipo_picole_fk: int: id do tipo de picolé
+        :param tipo_embalagem_fk: int: id do tipo de embalagem
+        :param preco_min: float: menor preço, inclusive
+        :param preco_max: float: maior preço, inclusive
+        :param ordem: str: 'preco' (mais barato primeiro) ou '-preco' (mais caro primeiro); empates pelo id, no mesmo sentido
+        :param limite: int: quantidade máxima de Picoles, None para todos
+        :return: list[Picole] or []: Retorna uma lista de objetos Picole se encontrado, [] caso contrário
+        :raises TypeError: Se os FKs ou o limite não forem inteiros ou os preços não forem numéricos
+        :raises ValueError: Se a ordem não for suportada, o limite não for positivo ou preco_min for maior que
+        preco_max
+        """
+        try:
+            for nome, valor in (('sabor_fk', sabor_fk), ('tipo_picole_fk', tipo_picole_fk),
+                                ('tipo_embalagem_fk', tipo_embalagem_fk), ('limite', limite)):
+                if valor is not None and (not isinstance(valor, int) or isinstance(valor, bool)):
+                    raise TypeError(f'{nome} do Picole deve ser um inteiro!')
+            for nome, valor in (('preco_min', preco_min), ('preco_max', preco_max)):
+                if valor is not None and (not isinstance(valor, (int, float)) or isinstance(valor, bool)):
+                    raise TypeError(f'{nome} do Picole deve ser numérico!')
+
+            # validar se os parâmetros informados são válidos
+            if ordem not in ('preco', '-preco'):
+                raise ValueError(f'ordem {ordem} não suportada, use preco ou -preco!')
+            if limite is not None and limite <= 0:
+                raise ValueError('limite deve ser maior que zero!')
+            if preco_min is not None and preco_max is not None and preco_min > preco_max:
+                raise ValueError('preco_min não pode ser maior que preco_max!')
+
+            filtros = []
+            if sabor_fk is not None:
+                filtros.append(Picole.sabor_fk == sabor_fk)
+            if tipo_picole_fk is not None:
+                filtros.append(Picole.tipo_picole_fk == tipo_picole_fk)
+            if tipo_embalagem_fk is not None:
+                filtros.append(Picole.tipo_embalagem_fk == tipo_embalagem_fk)
+            if preco_min is not None:
+                filtros.append(Picole.preco >= preco_min)
+            if preco_max is not None:
+                filtros.append(Picole.preco <= preco_max)
+            ordenacao = (Picole.preco, Picole.id) if ordem == 'preco' else (Picole.preco.desc(), Picole.id.desc())
+
+            with createSession() as session:
+                picoles = session.query(Picole).filter(*filtros).order_by(*ordenacao).limit(limite).all()
+                return picoles
+
+        except TypeError as te:
+            raise TypeError(te)
+
+        except ValueError as ve:
+            raise ValueError(ve)
+
+        except Exception as exc:
+            raise Exception(f'Erro inesperado ao selecionar Picoles: {exc}')
+
     @staticmethod
     def selectPicolePorSabor(sabor_fk: int) -> list['Picole'] or []:
         """Seleciona Picoles na tabela picole por sabor
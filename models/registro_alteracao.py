@@ -0,0 +1,28 @@
+import sqlalchemy as sa
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped
+
+from models.model_base import ModelBase
+
+
+class RegistroAlteracao(ModelBase):
+    """Log de alterações, apenas com inserções de linhas (ver conf.registro_alteracoes): uma entrada por linha
+    apagada, e opcionalmente inserida ou atualizada, nas tabelas dos modelos. O seq cresce a cada entrada e serve de
+    posição de leitura para quem replica ou mantém cache dos dados e precisa saber o que mudou desde a última leitura,
+    inclusive as exclusões, sem comparar as tabelas inteiras."""
+    __tablename__ = 'registro_alteracao'
+    __table_args__ = (sa.Index('ix_registro_alteracao_tabela_id_registro', 'tabela', 'id_registro'),)
+
+    seq: Mapped[int] = sa.Column(sa.BigInteger().with_variant(sa.Integer, "sqlite"),
+                                 # para funcionar o autoincrement no sqlite
+                                 primary_key=True, autoincrement=True)
+    tabela: Mapped[str] = sa.Column(sa.String(100), nullable=False)
+    id_registro: Mapped[int] = sa.Column(sa.BigInteger, nullable=False)
+    operacao: Mapped[str] = sa.Column(sa.String(10), nullable=False)
+    data_alteracao: Mapped[datetime] = sa.Column(sa.DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        """Retorna uma representação do objeto em forma de 'string'."""
+        return (f'<RegistroAlteracao(seq={self.seq}, tabela={self.tabela}, id_registro={self.id_registro}, '
+                f'operacao={self.operacao}, data_alteracao={self.data_alteracao})>')
@@ -5,10 +5,12 @@ from sqlalchemy.orm import Mapped
 
 from models.model_base import ModelBase
 from conf.db_session import createSession
+from conf.perfil import instrumentarCrud
 from sqlalchemy.exc import IntegrityError
 from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 
 
+@instrumentarCrud
 class TipoEmbalagem(ModelBase):
     __tablename__ = 'tipo_embalagem'
 
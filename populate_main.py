@@ -1,10 +1,14 @@
-from time import sleep
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import sleep, perf_counter
+from typing import Callable, Optional
 
 from tqdm import tqdm  # pip install tqdm
 from sqlalchemy.orm import Session
 
 from conf.helpers import gerar_string, gerar_int, gerar_float, gerar_cor
-from conf.db_session import createSession
+from conf.db_session import createEngine, createSession
+from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
 from models.aditivo_nutritivo import AditivoNutritivo
 from models.aditivo_nutritivo_picole import AditivoNutritivoPicole
 from models.conservante_picole import ConservantePicole
@@ -19,203 +23,384 @@ from models.lote import Lote
 from models.nota_fiscal import NotaFiscal
 from models.picole import Picole
 from models.lote_nota_fiscal import LoteNotaFiscal
+from models.controle_carga import ControleCarga
+
+
+# Quantidade de linhas confirmadas por transação nas cargas. Limita a memória usada pela sessão e a quantidade de
+# trabalho perdido caso a carga seja interrompida.
+TAMANHO_LOTE_PADRAO: int = 1000
+
+
+class EscritorPopulacao:
+    """Centraliza a gravação dos objetos gerados pelas funções populate_*.
+    O SQLite só admite um escritor por vez, então quando a população roda em paralelo todas as gravações passam
+    por uma única conexão, protegida por um lock. Nos demais bancos cada gravação usa a sua própria sessão.
+    """
+
+    def __init__(self, sqlite: bool = True):
+        """
+        :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
+        """
+        self.sqlite = sqlite
+        self._lock = threading.Lock()
+        self._conexao = None
+        if sqlite:
+            self._conexao = createEngine(sqlite=True).connect()
+            # a conexão é dedicada ao escritor, então as FKs são ativadas uma única vez aqui
+            self._conexao.exec_driver_sql('PRAGMA foreign_keys=ON;')
+
+    def gravar(self, objetos: list, checkpoint: Optional[ControleCarga] = None) -> None:
+        """Grava os objetos em uma única transação
+        :param objetos: list: objetos dos modelos a serem inseridos
+        :param checkpoint: ControleCarga: checkpoint da carga, confirmado na mesma transação dos objetos
+        """
+        if self._conexao is None:
+            with createSession(sqlite=self.sqlite) as session:
+                _confirmar(session, objetos, checkpoint)
+            return
+
+        with self._lock:
+            with Session(bind=self._conexao, expire_on_commit=False) as session:
+                _confirmar(session, objetos, checkpoint)
+
+    def fechar(self) -> None:
+        """Libera a conexão de escrita"""
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+
+def _confirmar(session: Session, objetos: list, checkpoint: Optional[ControleCarga]) -> None:
+    """Insere os objetos e o checkpoint na sessão, confirma a transação e esvazia o identity map da sessão,
+    para que os objetos já gravados não continuem ocupando memória.
+    """
+    session.add_all(objetos)
+    if checkpoint is not None:
+        session.merge(checkpoint)
+    session.commit()
+    session.expunge_all()
+
+
+def _gravar(objetos: list, escritor: Optional[EscritorPopulacao] = None,
+            checkpoint: Optional[ControleCarga] = None) -> None:
+    """Grava os objetos gerados por uma função populate_* pelo escritor informado ou, se não houver, por uma
+    sessão própria, como nas execuções isoladas das funções.
+    :param objetos: list: objetos dos modelos a serem inseridos
+    :param escritor: EscritorPopulacao: escritor compartilhado entre as etapas da população
+    :param checkpoint: ControleCarga: checkpoint da carga, confirmado na mesma transação dos objetos
+    """
+    if escritor is not None:
+        escritor.gravar(objetos, checkpoint)
+        return
+
+    with createSession() as session:
+        _confirmar(session, objetos, checkpoint)
+
+
+class CargaEmLotes:
+    """Grava as linhas geradas por uma função populate_* em lotes de tamanho fixo. Cada lote é confirmado junto
+    com o seu checkpoint na tabela controle_carga e descartado da memória em seguida, assim o consumo de memória não
+    cresce com a quantidade de linhas e uma nova execução continua a partir do último lote confirmado.
+    """
+
+    def __init__(self, tabela: str, quantidade: int, escritor: Optional[EscritorPopulacao] = None,
+                 tamanho_lote: int = TAMANHO_LOTE_PADRAO):
+        """
+        :param tabela: str: nome da tabela populada, usado como nome da carga no checkpoint
+        :param quantidade: int: quantidade total de linhas da carga
+        :param escritor: EscritorPopulacao: escritor compartilhado entre as etapas da população
+        :param tamanho_lote: int: quantidade de objetos confirmados por transação
+        :raises ValueError: Se o tamanho_lote não for positivo
+        """
+        if tamanho_lote <= 0:
+            raise ValueError('tamanho_lote da carga deve ser maior que zero!')
+
+        self.tabela = tabela
+        self.quantidade = quantidade
+        self.escritor = escritor
+        self.tamanho_lote = tamanho_lote
+
+        # a tabela de controle pode não existir em bancos criados antes dela
+        ControleCarga.__table__.create(createEngine(), checkfirst=True)
+        self.confirmadas: int = ControleCarga.selectLinhasConfirmadas(tabela)
+        if self.confirmadas >= quantidade:
+            print(f'Carga de {tabela} já concluída: {self.confirmadas} linhas confirmadas')
+        elif self.confirmadas:
+            print(f'Retomando a carga de {tabela} a partir da linha {self.confirmadas + 1}')
+
+        self._objetos: list = []
+        self._ultima_linha: int = self.confirmadas
+
+    def pendentes(self) -> range:
+        """:return: range: números das linhas que ainda não foram confirmadas"""
+        return range(self.confirmadas + 1, self.quantidade + 1)
+
+    def valoresGravados(self, coluna) -> set:
+        """Valores já gravados de uma coluna, usados pelas cargas que evitam gerar chaves repetidas. Só consulta o
+        banco quando a carga está sendo retomada e ainda há linhas pendentes.
+        :param coluna: coluna do modelo
+        :return: set: valores distintos da coluna já gravados pela carga
+        """
+        if not self.confirmadas or self.confirmadas >= self.quantidade:
+            return set()
+        with createSession() as session:
+            return {valor for (valor,) in session.query(coluna).distinct()}
+
+    def adicionar(self, linha: int, objeto) -> None:
+        """Adiciona um objeto ao lote atual, confirmando o lote quando ele atinge o tamanho_lote
+        :param linha: int: número da linha que gerou o objeto
+        :param objeto: objeto do modelo a ser inserido
+        """
+        self._objetos.append(objeto)
+        self._ultima_linha = linha
+        if len(self._objetos) >= self.tamanho_lote:
+            self._confirmar_lote()
+
+    def finalizar(self) -> None:
+        """Confirma os objetos restantes e marca a carga como concluída"""
+        self._ultima_linha = self.quantidade
+        self._confirmar_lote()
+
+    def _confirmar_lote(self) -> None:
+        checkpoint = ControleCarga(nome_carga=self.tabela,
+                                   linhas_confirmadas=self._ultima_linha,
+                                   total_linhas=self.quantidade,
+                                   concluida=self._ultima_linha >= self.quantidade)
+        _gravar(self._objetos, self.escritor, checkpoint)
+        self.confirmadas = self._ultima_linha
+        self._objetos = []
 
 
 # 1) Aditivos Nutritivos
-def populate_aditivo_nutritivo():
+def populate_aditivo_nutritivo(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                               tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Aditivo Nutritivo: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=AditivoNutritivo.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
         formula_quimica: str = gerar_string(frase=True)
 
         aditivo_nutritivo: AditivoNutritivo = AditivoNutritivo(nome=nome, formula_quimica=formula_quimica)
-        session.add(aditivo_nutritivo)
+        carga.adicionar(linha=n, objeto=aditivo_nutritivo)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Aditivos Nutritivos cadastrados com sucesso')
 
 
 # 2) Sabores
-def populate_sabor():
+def populate_sabor(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                   tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Sabores: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Sabor.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
 
         sabor: Sabor = Sabor(nome=nome)
-        session.add(sabor)
+        carga.adicionar(linha=n, objeto=sabor)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Sabores cadastrados com sucesso')
 
 
 # 3) Tipos Embalagem
-def populate_tipo_embalagem():
+def populate_tipo_embalagem(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                            tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Tipos Embalagem: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=TipoEmbalagem.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
 
         tipo_embalagem: TipoEmbalagem = TipoEmbalagem(nome=nome)
-        session.add(tipo_embalagem)
+        carga.adicionar(linha=n, objeto=tipo_embalagem)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Tipos Embalagem cadastrados com sucesso')
 
 
 # 4) Tipos Picole
-def populate_tipo_picole():
+def populate_tipo_picole(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                         tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Tipos Picolé: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=TipoPicole.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
 
         tipo_picole: TipoPicole = TipoPicole(nome=nome)
-        session.add(tipo_picole)
+        carga.adicionar(linha=n, objeto=tipo_picole)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Tipos Picolé cadastrados com sucesso')
 
 
 # 5) Ingredientes
-def populate_ingrediente():
+def populate_ingrediente(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                         tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Ingredientes: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Ingrediente.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
 
         ingrediente: Ingrediente = Ingrediente(nome=nome)
-        session.add(ingrediente)
+        carga.adicionar(linha=n, objeto=ingrediente)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Ingredientes cadastrados com sucesso')
 
 
 # 6) Conservantes
-def populate_conservante():
+def populate_conservante(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                         tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Conservantes: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Conservante.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
         descricao: str = gerar_string(frase=True)
 
         conservante: Conservante = Conservante(nome=nome, descricao=descricao)
-        session.add(conservante)
+        carga.adicionar(linha=n, objeto=conservante)
         sleep(0.05)
 
-        # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-        session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Conservantes cadastrados com sucesso')
 
 
 # 7) Revendedor
-def populate_revendedor():
+def populate_revendedor(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                        tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Revendedores: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Revendedor.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         nome: str = gerar_string()
         cnpj: str = gerar_string()
         razao_social: str = gerar_string()
         contato: str = gerar_string()
 
         revendedor: Revendedor = Revendedor(nome=nome, cnpj=cnpj, razao_social=razao_social, contato=contato)
-        session.add(revendedor)
+        carga.adicionar(linha=n, objeto=revendedor)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Revendedores cadastrados com sucesso')
 
 
 # 8) Lote
-def populate_lote():
+def populate_lote(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                  tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Lotes: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Lote.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
-        picole_fk: int = gerar_int()
-        quantidade: int = gerar_int()
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
+        picole_fk: int = gerar_int(maximo=quantidade)
+        quantidade_picoles: int = gerar_int()
 
-        lote: Lote = Lote(picole_fk=picole_fk, quantidade=quantidade)
-        session.add(lote)
+        lote: Lote = Lote(picole_fk=picole_fk, quantidade=quantidade_picoles)
+        carga.adicionar(linha=n, objeto=lote)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Lotes cadastrados com sucesso')
 
 
 # 9) Nota Fiscal
-def populate_nota_fiscal():
+def populate_nota_fiscal(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                         tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Notas Fiscais: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=NotaFiscal.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         valor: float = gerar_float(digitos=3)
         numero_serie: str = gerar_string()
         descricao: str = gerar_string(frase=True)
-        revendedor_fk: int = gerar_int()
+        revendedor_fk: int = gerar_int(maximo=quantidade)
 
         nota_fiscal: NotaFiscal = NotaFiscal(valor=valor, numero_serie=numero_serie, descricao=descricao,
                                              revendedor_fk=revendedor_fk)
-        session.add(nota_fiscal)
+        carga.adicionar(linha=n, objeto=nota_fiscal)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Notas Fiscais cadastradas com sucesso')
 
 
 # 10) Piole
-def populate_picole():
+def populate_picole(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                    tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Picolés: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=Picole.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
+    chaves = carga.valoresGravados(Picole.sabor_tipoPicole_tipoEmbalagem)
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
         preco: float = gerar_float()
-        sabor_fk: int = gerar_int()
-        tipo_embalagem_fk: int = gerar_int()
-        tipo_picole_fk: int = gerar_int()
-
-        sabor_tipoPicole_tipoEmbalagem = f'{sabor_fk}_{tipo_picole_fk}_{tipo_embalagem_fk}'
+        # a combinação é única, e uma combinação repetida é sorteada de novo em vez de pulada, para que existam
+        # quantidade picolés e as FKs sorteadas pelas cargas seguintes sempre apontem para um picolé gravado
+        sabor_tipoPicole_tipoEmbalagem = None
+        while sabor_tipoPicole_tipoEmbalagem is None or sabor_tipoPicole_tipoEmbalagem in chaves:
+            sabor_fk: int = gerar_int(maximo=quantidade)
+            tipo_embalagem_fk: int = gerar_int(maximo=quantidade)
+            tipo_picole_fk: int = gerar_int(maximo=quantidade)
+            sabor_tipoPicole_tipoEmbalagem = f'{sabor_fk}_{tipo_picole_fk}_{tipo_embalagem_fk}'
+        chaves.add(sabor_tipoPicole_tipoEmbalagem)
         picole: Picole = Picole(preco=preco,
                                 sabor_fk=sabor_fk,
                                 tipo_embalagem_fk=tipo_embalagem_fk,
@@ -244,164 +429,257 @@ def populate_picole():
         #         conservante: Conservante = Conservante(nome=nome, descricao=descricao)
         #         picole.conservantes.append(conservante)
 
-        session.add(picole)
+        carga.adicionar(linha=n, objeto=picole)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Picolés cadastrados com sucesso')
 
 
-def populate_ingrediente_picole():
+def populate_ingrediente_picole(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                                tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Ingredientes Picolé: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=IngredientePicole.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    chave = []
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
-        picole_fk: int = gerar_int()
-        ingrediente_fk: int = gerar_int()
+    chave = carga.valoresGravados(IngredientePicole.ingrediente_picole)
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
+        picole_fk: int = gerar_int(maximo=quantidade)
+        ingrediente_fk: int = gerar_int(maximo=quantidade)
         ingrediente_picole2 = f'{ingrediente_fk}-{picole_fk}'
         if ingrediente_picole2 in chave:
             continue
-        chave.append(ingrediente_picole2)
+        chave.add(ingrediente_picole2)
         ingrediente_picole: IngredientePicole = IngredientePicole(picole_fk=picole_fk,
                                                                   ingrediente_fk=ingrediente_fk,
                                                                   ingrediente_picole=ingrediente_picole2)
-        session.add(ingrediente_picole)
+        carga.adicionar(linha=n, objeto=ingrediente_picole)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Ingredientes Picolé cadastrados com sucesso')
 
 
-def populate_conservante_picole():
+def populate_conservante_picole(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                                tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Conservantes Picolé: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=ConservantePicole.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    chaves = []
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
-        picole_fk: int = gerar_int()
-        conservante_fk: int = gerar_int()
+    chaves = carga.valoresGravados(ConservantePicole.conservante_picole)
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
+        picole_fk: int = gerar_int(maximo=quantidade)
+        conservante_fk: int = gerar_int(maximo=quantidade)
         conservante_picole1 = f'{conservante_fk}-{picole_fk}'
         if conservante_picole1 in chaves:
             continue
-        chaves.append(conservante_picole1)
+        chaves.add(conservante_picole1)
         conservante_picole: ConservantePicole = ConservantePicole(picole_fk=picole_fk,
                                                                   conservante_fk=conservante_fk,
                                                                   conservante_picole=conservante_picole1)
-        session.add(conservante_picole)
+        carga.adicionar(linha=n, objeto=conservante_picole)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Conservantes Picolé cadastrados com sucesso')
 
 
-def populate_aditivo_nutritivo_picole():
+def populate_aditivo_nutritivo_picole(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                                      tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Aditivos Nutritivos Picolé: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=AditivoNutritivoPicole.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    chave = []
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
-        picole_fk: int = gerar_int()
-        aditivo_nutritivo_fk: int = gerar_int()
+    chave = carga.valoresGravados(AditivoNutritivoPicole.picole_aditivo_nutritivo)
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
+        picole_fk: int = gerar_int(maximo=quantidade)
+        aditivo_nutritivo_fk: int = gerar_int(maximo=quantidade)
         picole_aditivo_nutritivo = f'{picole_fk}-{aditivo_nutritivo_fk}'
         if picole_aditivo_nutritivo in chave:
             continue
-        chave.append(picole_aditivo_nutritivo)
+        chave.add(picole_aditivo_nutritivo)
         aditivo_nutritivo_picole: AditivoNutritivoPicole = AditivoNutritivoPicole(picole_fk=picole_fk,
                                                                                   aditivo_nutritivo_fk=aditivo_nutritivo_fk,
                                                                                   picole_aditivo_nutritivo=picole_aditivo_nutritivo)
-        session.add(aditivo_nutritivo_picole)
+        carga.adicionar(linha=n, objeto=aditivo_nutritivo_picole)
         sleep(0.05)
 
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Aditivos Nutritivos Picolé cadastrados com sucesso')
 
 
-def lote_notas_fiscal():
+def lote_notas_fiscal(escritor: Optional['EscritorPopulacao'] = None, quantidade: int = 100,
+                      tamanho_lote: int = TAMANHO_LOTE_PADRAO):
     print(f'Cadastrando Lote Nota Fiscal: ')
 
-    # Estamos criando a sessão antes pois vamos inserir vários objetos
-    session: Session = createSession()
+    # Os objetos são gravados em lotes de tamanho_lote, cada lote confirmado junto com o seu checkpoint
+    carga = CargaEmLotes(tabela=LoteNotaFiscal.__tablename__, quantidade=quantidade, escritor=escritor,
+                         tamanho_lote=tamanho_lote)
     cor = gerar_cor()
-    chave = []
-    chave_lote = []
-    for n in tqdm(range(1, 101), desc='Cadastrando...', colour=cor):
-        lote_fk: int = gerar_int()
-        nota_fiscal_fk: int = gerar_int()
+    chave = carga.valoresGravados(LoteNotaFiscal.lote_nota_fiscal)
+    chave_lote = carga.valoresGravados(LoteNotaFiscal.lote_fk)
+    for n in tqdm(carga.pendentes(), desc='Cadastrando...', colour=cor,
+                  initial=carga.confirmadas, total=quantidade):
+        lote_fk: int = gerar_int(maximo=quantidade)
+        nota_fiscal_fk: int = gerar_int(maximo=quantidade)
         lote_nota_fiscal1 = f'{lote_fk}-{nota_fiscal_fk}'
         if lote_fk in chave_lote:
             continue
-        chave_lote.append(lote_fk)
+        chave_lote.add(lote_fk)
         if lote_nota_fiscal1 in chave:
             continue
-        chave.append(lote_nota_fiscal1)
+        chave.add(lote_nota_fiscal1)
         lote_nota_fiscal: LoteNotaFiscal = LoteNotaFiscal(nota_fiscal_fk=nota_fiscal_fk,
                                                           lote_fk=lote_fk,
                                                           lote_nota_fiscal=lote_nota_fiscal1
                                                           )
-        session.add(lote_nota_fiscal)
+        carga.adicionar(linha=n, objeto=lote_nota_fiscal)
         sleep(0.05)
 
-
-    # Perceba que estamos executando o commit somente no final. Desta forma os 100 dados serão enviados em um único batch para o banco
-    session.commit()
-
-
+    # Confirma o último lote, mesmo que incompleto, e marca a carga como concluída
+    carga.finalizar()
     print('Lote Nota Fiscal cadastrados com sucesso')
 
 
-def popular():
-    # 1) Aditivos Nutritivos
-    populate_aditivo_nutritivo()
-
-    # 2) Sabores
-    populate_sabor()
-
-    # 3) Tipos Embalagem
-    populate_tipo_embalagem()
-
-    # 4) Tipos Picole
-    populate_tipo_picole()
-
-    # 5) Ingredientes
-    populate_ingrediente()
-
-    # 6) Conservantes (Deixando vazio para poder verificar resultados em tabelas vazias)
-    populate_conservante()
-
-    # 7) Revendedores
-    populate_revendedor()
-
-    # 8) Notas Fiscais
-    populate_nota_fiscal()
-
-    # 9) Picole
-    populate_picole()
-
-    # 10) Lotes
-    populate_lote()
-
-    # 11) Ingredientes Picolé
-    populate_ingrediente_picole()
-
-    # 12) Conservantes Picolé
-    populate_conservante_picole()
-
-    # 13) Aditivos Nutritivos Picolé
-    populate_aditivo_nutritivo_picole()
-
-    # 14) Lote Nota Fiscal
-    lote_notas_fiscal()
+# Função responsável por popular cada tabela. A ordem de execução não é definida aqui, e sim derivada das FKs dos
+# modelos: uma tabela só é populada depois que todas as tabelas que ela referencia já estiverem populadas.
+POPULADORES: dict[str, Callable] = {
+    AditivoNutritivo.__tablename__: populate_aditivo_nutritivo,
+    Sabor.__tablename__: populate_sabor,
+    TipoEmbalagem.__tablename__: populate_tipo_embalagem,
+    TipoPicole.__tablename__: populate_tipo_picole,
+    Ingrediente.__tablename__: populate_ingrediente,
+    Conservante.__tablename__: populate_conservante,
+    Revendedor.__tablename__: populate_revendedor,
+    NotaFiscal.__tablename__: populate_nota_fiscal,
+    Picole.__tablename__: populate_picole,
+    Lote.__tablename__: populate_lote,
+    IngredientePicole.__tablename__: populate_ingrediente_picole,
+    ConservantePicole.__tablename__: populate_conservante_picole,
+    AditivoNutritivoPicole.__tablename__: populate_aditivo_nutritivo_picole,
+    LoteNotaFiscal.__tablename__: lote_notas_fiscal,
+}
+
+
+def _executar_etapa(tabela: str, escritor: EscritorPopulacao, inicio_geral: float, quantidade: int,
+                    tamanho_lote: int) -> dict[str, float]:
+    """Executa a função de população de uma tabela e mede o seu tempo de parede
+    :param tabela: str: nome da tabela
+    :param escritor: EscritorPopulacao: escritor compartilhado entre as etapas
+    :param inicio_geral: float: instante (perf_counter) do início da população
+    :param quantidade: int: quantidade de linhas da tabela
+    :param tamanho_lote: int: quantidade de linhas confirmadas por transação
+    :return: dict[str, float]: início, fim e duração da etapa, em segundos desde o início da população
+    """
+    inicio = perf_counter()
+    POPULADORES[tabela](escritor=escritor, quantidade=quantidade, tamanho_lote=tamanho_lote)
+    fim = perf_counter()
+    return {'inicio': inicio - inicio_geral, 'fim': fim - inicio_geral, 'duracao': fim - inicio}
+
+
+def _caminho_critico(dependencias: dict[str, set[str]], tempos: dict[str, dict[str, float]]) -> tuple[list[str], float]:
+    """Calcula o caminho crítico do grafo de dependências, isto é, a cadeia de etapas dependentes com a maior soma
+    de durações, que limita o tempo total da população por mais workers que existam.
+    :param dependencias: dict[str, set[str]]: tabelas das quais cada tabela depende
+    :param tempos: dict[str, dict[str, float]]: tempos medidos de cada etapa
+    :return: tuple[list[str], float]: tabelas do caminho crítico, em ordem de execução, e a soma das durações
+    """
+    custo: dict[str, float] = {}
+    anterior: dict[str, Optional[str]] = {}
+    for estagio in DataBaseFeatures.getEstagiosFk(dependencias=dependencias):
+        for tabela in estagio:
+            predecessor = max(dependencias[tabela], key=lambda dep: custo[dep], default=None)
+            custo[tabela] = tempos[tabela]['duracao'] + (custo[predecessor] if predecessor else 0.0)
+            anterior[tabela] = predecessor
+
+    tabela = max(custo, key=custo.get)
+    total = custo[tabela]
+    caminho = []
+    while tabela is not None:
+        caminho.append(tabela)
+        tabela = anterior[tabela]
+    return list(reversed(caminho)), total
+
+
+def _relatorio(dependencias: dict[str, set[str]], tempos: dict[str, dict[str, float]], total: float) -> None:
+    """Imprime o tempo de cada etapa e o caminho crítico da população"""
+    print('\nTempos por etapa (segundos desde o início):')
+    print(f'{"tabela":<28}{"início":>10}{"fim":>10}{"duração":>10}')
+    for tabela, tempo in sorted(tempos.items(), key=lambda item: item[1]['inicio']):
+        print(f'{tabela:<28}{tempo["inicio"]:>10.2f}{tempo["fim"]:>10.2f}{tempo["duracao"]:>10.2f}')
+
+    caminho, custo = _caminho_critico(dependencias, tempos)
+    print(f'Caminho crítico: {" -> ".join(caminho)} ({custo:.2f}s)')
+    print(f'Tempo total da população: {total:.2f}s')
+
+
+def popular(paralelo: bool = True, max_workers: int = 7, sqlite: bool = True, quantidade: int = 100,
+            tamanho_lote: int = TAMANHO_LOTE_PADRAO, reiniciar: bool = False) -> dict[str, dict[str, float]]:
+    """Popula todas as tabelas seguindo o grafo de FKs dos modelos. Cada tabela é disparada assim que todas as
+    tabelas das quais ela depende terminam, de forma que tabelas independentes entre si (como as sete tabelas
+    raiz) são populadas ao mesmo tempo. Cargas interrompidas são retomadas a partir do último lote confirmado.
+    :param paralelo: bool: se False, as tabelas são populadas uma de cada vez, na mesma ordem de dependência
+    :param max_workers: int: quantidade máxima de tabelas populadas ao mesmo tempo
+    :param sqlite: bool: se True, usa o sqlite, se False, usa o postgres
+    :param quantidade: int: quantidade de linhas de cada tabela
+    :param tamanho_lote: int: quantidade de linhas confirmadas por transação
+    :param reiniciar: bool: se True, descarta os checkpoints e recomeça todas as cargas do zero
+    :return: dict[str, dict[str, float]]: início, fim e duração de cada etapa, em segundos
+    :raises RuntimeError: Se existir dependência circular entre as tabelas
+    """
+    todas_dependencias = DataBaseFeatures.getDependenciasFk()
+    dependencias = {tabela: todas_dependencias[tabela] & POPULADORES.keys() for tabela in POPULADORES}
+    pendentes = dict(dependencias)
+    concluidas: set[str] = set()
+    tempos: dict[str, dict[str, float]] = {}
+
+    ControleCarga.__table__.create(createEngine(sqlite=sqlite), checkfirst=True)
+    if reiniciar:
+        ControleCarga.deleteControleCarga()
+
+    escritor = EscritorPopulacao(sqlite=sqlite)
+    inicio_geral = perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers if paralelo else 1) as executor:
+            em_execucao = {}
+
+            def disparar_prontas():
+                for tabela in sorted(pendentes):
+                    if pendentes[tabela] <= concluidas:
+                        del pendentes[tabela]
+                        futuro = executor.submit(_executar_etapa, tabela, escritor, inicio_geral,
+                                                 quantidade, tamanho_lote)
+                        em_execucao[futuro] = tabela
+
+            disparar_prontas()
+            while em_execucao:
+                prontos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    tabela = em_execucao.pop(futuro)
+                    tempos[tabela] = futuro.result()
+                    concluidas.add(tabela)
+                disparar_prontas()
+
+            if pendentes:
+                raise RuntimeError(f'Dependência circular entre as tabelas: {sorted(pendentes)}')
+    finally:
+        escritor.fechar()
+
+    _relatorio(dependencias, tempos, perf_counter() - inicio_geral)
+    return tempos
 
 
 if __name__ == '__main__':
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.crud import CENARIOS
+from benchmarks.gerador_base import gerar_base
+from benchmarks.simulador_concorrencia import MISTURA_PADRAO, POOLS, simular
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'benchmark')
+
+
+def _mistura(texto: str) -> dict[str, int]:
+    """Converte 'select_id=50,insert=10' no dicionário de pesos da mistura"""
+    try:
+        mistura = {operacao.strip(): int(peso) for operacao, peso in
+                   (item.split('=') for item in texto.split(',') if item.strip())}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Mistura inválida: {texto}, use operacao=peso separados por vírgula')
+    return mistura
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Simula carga concorrente sobre os métodos de CRUD dos modelos e '
+                                                 'reporta vazão, latência, espera e erros de lock por operação, '
+                                                 'para cada combinação de journal_mode e pool informada.')
+    parser.add_argument('--linhas', type=int, default=100_000, help='quantidade de linhas por tabela do banco')
+    parser.add_argument('--trabalhadores', type=int, default=8, help='threads ou processos simultâneos')
+    parser.add_argument('--modo', choices=['threads', 'processos'], default='threads')
+    parser.add_argument('--duracao', type=float, default=30, help='duração de cada simulação, em segundos')
+    parser.add_argument('--mistura', type=_mistura,
+                        default=MISTURA_PADRAO, help='pesos das operações, ex.: select_id=50,insert=15,update=10')
+    parser.add_argument('--modelos', nargs='+', choices=sorted(CENARIOS), default=None,
+                        help='modelos exercitados, por padrão todos')
+    parser.add_argument('--journal-mode', nargs='+', default=['DELETE', 'WAL'],
+                        help='journal_modes comparados, um por simulação')
+    parser.add_argument('--pool', nargs='+', choices=sorted(POOLS), default=['null'],
+                        help='pools de conexão comparados, um por simulação')
+    parser.add_argument('--timeout', type=float, default=30, help='espera máxima por lock, em segundos')
+    parser.add_argument('--diretorio', default=DIRETORIO_PADRAO, help='diretório dos bancos gerados')
+    parser.add_argument('--saida', default=None, help='arquivo JSON onde os resultados serão gravados')
+    return parser.parse_args(argv)
+
+
+def _imprimir(rotulo: str, resultado: dict) -> None:
+    print(f'\n{rotulo} ({resultado["duracao_real_seg"]:.1f}s)')
+    print(f'{"operacao":<10} {"ops":>8} {"ops/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9} '
+          f'{"espera ms":>10} {"erros":>6} {"lock":>6}')
+    linhas = list(resultado['operacoes'].items()) + [('total', resultado['total'])]
+    for operacao, r in linhas:
+        print(f'{operacao:<10} {r["chamadas"]:>8} {r["ops_seg"]:>9.1f} {r["p50_ms"]:>9.2f} {r["p95_ms"]:>9.2f} '
+              f'{r["p99_ms"]:>9.2f} {r["max_ms"]:>9.2f} {r["espera_lock_ms_total"]:>10.1f} {r["erros"]:>6} '
+              f'{r["erros_lock"]:>6}')
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+
+    base = os.path.join(args.diretorio, f'base_{args.linhas}.sqlite')
+    if not Path(base).exists():
+        gerar_base(base, args.linhas)
+
+    resultados = []
+    for journal_mode in args.journal_mode:
+        for pool in args.pool:
+            # cada simulação parte de uma cópia limpa da base, já que as escritas a alteram
+            db_path = os.path.join(args.diretorio, 'simulacao.sqlite')
+            for sufixo in ('', '-wal', '-shm', '-journal'):
+                Path(db_path + sufixo).unlink(missing_ok=True)
+            shutil.copyfile(base, db_path)
+
+            rotulo = f'journal_mode={journal_mode} pool={pool} {args.modo}={args.trabalhadores}'
+            print(f'Simulando {rotulo} por {args.duracao:.0f}s...')
+            resultado = simular(db_path, args.linhas, trabalhadores=args.trabalhadores, duracao=args.duracao,
+                                modo=args.modo, mistura=args.mistura, modelos=args.modelos,
+                                journal_mode=journal_mode, pool=pool, timeout=args.timeout)
+            _imprimir(rotulo, resultado)
+            resultados.append(resultado)
+
+    saida = args.saida or os.path.join(args.diretorio, f'simulacao_{datetime.now():%Y%m%d_%H%M%S}.json')
+    Path(saida).parent.mkdir(parents=True, exist_ok=True)
+    Path(saida).write_text(json.dumps({'data': datetime.now().isoformat(timespec='seconds'),
+                                       'simulacoes': resultados}, indent=2), encoding='utf-8')
+    print(f'\nResultados gravados em {saida}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
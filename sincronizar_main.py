@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from conf.db_session import postgresUrl
+from conf.sincronizacao import JANELA_SEGURANCA, reiniciarMarcas, sincronizar
+from ScriptsAuxiliares.Auxiliar import Auxiliar
+
+
+def _argumentos(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Sincroniza incrementalmente o banco sqlite com o postgres: copia '
+                                                 'apenas as linhas alteradas desde a última execução, em lotes, e '
+                                                 'reporta a vazão de cada tabela.')
+    parser.add_argument('--origem', default=f'{Auxiliar.getProjectRootDir()}//db/picoles.sqlite',
+                        help='arquivo do banco sqlite de origem')
+    parser.add_argument('--destino', default=None, help='URL do banco de destino, por padrão o postgres do projeto')
+    parser.add_argument('--tabelas', nargs='+', default=None, help='tabelas sincronizadas, por padrão todas')
+    parser.add_argument('--tamanho-lote', type=int, default=10_000, help='linhas lidas e confirmadas por vez')
+    parser.add_argument('--janela-seguranca', type=float, default=JANELA_SEGURANCA,
+                        help="segundos antes da marca d'água relidos a cada execução, para copiar as linhas "
+                             'confirmadas depois de outras mais novas')
+    parser.add_argument('--reiniciar', action='store_true',
+                        help="apaga as marcas d'água antes, copiando as tabelas inteiras")
+    parser.add_argument('--saida', default=None, help='arquivo JSON onde a vazão de cada tabela será gravada')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _argumentos(argv)
+
+    origem = sa.create_engine(f'sqlite:///{args.origem}')
+    destino = sa.create_engine(args.destino or postgresUrl())
+    try:
+        if args.reiniciar:
+            reiniciarMarcas(destino, args.tabelas)
+        resultados = sincronizar(origem, destino, tabelas=args.tabelas, tamanho_lote=args.tamanho_lote,
+                                 janela_seguranca=args.janela_seguranca)
+    finally:
+        origem.dispose()
+        destino.dispose()
+
+    linhas = sum(r['linhas'] for r in resultados.values())
+    segundos = sum(r['segundos'] for r in resultados.values())
+    print(f'\nTotal: {linhas} linhas em {segundos:.2f} s')
+
+    if args.saida:
+        Path(args.saida).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.saida).write_text(json.dumps({'data': datetime.now().isoformat(timespec='seconds'),
+                                                'tabelas': resultados}, indent=2), encoding='utf-8')
+        print(f'Resultados gravados em {args.saida}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import pytest
+from benchmarks.crud import comparar, percentil, resumir
+
+
+def _resultados(p50_ms: float, chamadas: int = 10) -> dict:
+    return {'1000': {'sabor': {'select_id': {'p50_ms': p50_ms, 'chamadas': chamadas}}}}
+
+
+# Teste do percentil pelo método nearest-rank
+@pytest.mark.parametrize('p, esperado', [(0, 1), (10, 1), (11, 2), (50, 5), (95, 10), (99, 10), (100, 10)])
+def test_percentil(p, esperado):
+    assert percentil(list(range(1, 11)), p) == esperado
+
+
+def test_percentil_sem_amostras():
+    assert percentil([], 50) == 0.0
+    assert percentil([7], 99) == 7
+
+
+# Teste do resumo das latências, medidas em nanossegundos e resumidas em milissegundos
+def test_resumir():
+    resumo = resumir([4_000_000, 1_000_000, 3_000_000, 2_000_000], erros=1)
+    assert resumo == {'chamadas': 4, 'erros': 1, 'p50_ms': 2.0, 'p95_ms': 4.0, 'p99_ms': 4.0, 'media_ms': 2.5,
+                      'max_ms': 4.0, 'ops_seg': 400.0}
+
+
+def test_resumir_sem_chamadas():
+    resumo = resumir([], erros=3)
+    assert resumo['chamadas'] == 0 and resumo['erros'] == 3
+    assert resumo['p50_ms'] == resumo['media_ms'] == resumo['max_ms'] == resumo['ops_seg'] == 0.0
+
+
+# Teste da classificação pelo p50: só é regressão (ou melhoria) a variação que passa da tolerância, uma variação
+# exatamente igual à tolerância ainda é estável
+@pytest.mark.parametrize('p50_ms, situacao', [(5.01, 'regressao'), (5.0, 'estavel'), (4.0, 'estavel'),
+                                              (3.0, 'estavel'), (2.99, 'melhoria')])
+def test_comparar_tolerancia(p50_ms, situacao):
+    comparacao = comparar(_resultados(p50_ms), _resultados(4.0), tolerancia=0.25)
+    assert len(comparacao) == 1
+    assert comparacao[0]['situacao'] == situacao
+    assert comparacao[0]['variacao'] == pytest.approx((p50_ms - 4.0) / 4.0)
+    assert comparacao[0]['p50_ms_baseline'] == 4.0 and comparacao[0]['p50_ms'] == p50_ms
+
+
+def test_comparar_tolerancia_informada():
+    assert comparar(_resultados(1.3), _resultados(1.0), tolerancia=0.5)[0]['situacao'] == 'estavel'
+    assert comparar(_resultados(1.3), _resultados(1.0), tolerancia=0.2)[0]['situacao'] == 'regressao'
+
+
+# Teste das operações que não entram na comparação: ausentes do baseline, baseline sem p50 ou sem chamadas medidas
+def test_comparar_ignora_sem_referencia():
+    assert comparar(_resultados(2.0), {}) == []
+    assert comparar({'100000': _resultados(2.0)['1000']}, _resultados(1.0)) == []
+    assert comparar(_resultados(2.0), _resultados(0.0)) == []
+    assert comparar(_resultados(2.0, chamadas=0), _resultados(1.0)) == []
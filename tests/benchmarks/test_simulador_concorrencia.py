@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+
+import pytest
+from benchmarks import simulador_concorrencia
+from benchmarks.simulador_concorrencia import ConexaoInstrumentada, _zerar_estado
+
+
+@pytest.fixture
+def banco_bloqueado(tmp_path):
+    """Banco com uma conexão comum segurando o lock de escrita (BEGIN IMMEDIATE), liberado ao chamar a função
+    devolvida"""
+    db_path = str(tmp_path / 'concorrencia.sqlite')
+    with sqlite3.connect(db_path) as conexao:
+        conexao.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, nome TEXT)')
+    bloqueadora = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    bloqueadora.execute('BEGIN IMMEDIATE')
+    bloqueadora.execute("INSERT INTO item (nome) VALUES ('bloqueadora')")
+    yield db_path, bloqueadora.commit
+    bloqueadora.close()
+
+
+def _estado() -> tuple[int, int]:
+    return simulador_concorrencia._estado.espera_ns, simulador_concorrencia._estado.erros_lock
+
+
+def _conectar(db_path: str, timeout: float) -> sqlite3.Connection:
+    return sqlite3.connect(db_path, factory=ConexaoInstrumentada, timeout=timeout, isolation_level=None)
+
+
+# Teste com timeout=0: a escrita bloqueada falha de imediato e o erro é atribuído a ela, não à leitura anterior
+def test_erro_de_lock_sem_espera(banco_bloqueado):
+    db_path, _ = banco_bloqueado
+    conexao = _conectar(db_path, timeout=0)
+    try:
+        _zerar_estado()
+        assert conexao.cursor().execute('SELECT count(*) FROM item').fetchone() == (0,)
+        assert _estado() == (0, 0)
+
+        _zerar_estado()
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            conexao.cursor().execute("INSERT INTO item (nome) VALUES ('instrumentada')")
+        espera_ns, erros_lock = _estado()
+        assert erros_lock == 1
+        assert espera_ns < 0.05e9
+    finally:
+        conexao.close()
+
+
+# Teste das esperas: a escrita aguarda pelos intervalos do busy handler até o lock ser liberado, e a espera é
+# atribuída a ela sem erro de lock
+def test_espera_ate_liberar_o_lock(banco_bloqueado):
+    db_path, liberar = banco_bloqueado
+    conexao = _conectar(db_path, timeout=5)
+    liberacao = threading.Timer(0.2, liberar)
+    try:
+        _zerar_estado()
+        liberacao.start()
+        conexao.cursor().execute("INSERT INTO item (nome) VALUES ('instrumentada')")
+        espera_ns, erros_lock = _estado()
+        assert erros_lock == 0
+        assert 0.15e9 <= espera_ns < 2e9
+        assert conexao.cursor().execute('SELECT count(*) FROM item').fetchone() == (2,)
+    finally:
+        liberacao.join()
+        conexao.close()
+
+
+# Teste do estouro do timeout depois das esperas: a espera acumulada e o erro de lock ficam com a operação
+def test_erro_de_lock_apos_esperas(banco_bloqueado):
+    db_path, _ = banco_bloqueado
+    conexao = _conectar(db_path, timeout=0.2)
+    try:
+        _zerar_estado()
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            conexao.cursor().execute("INSERT INTO item (nome) VALUES ('instrumentada')")
+        espera_ns, erros_lock = _estado()
+        assert erros_lock == 1
+        assert 0.1e9 <= espera_ns < 2e9
+    finally:
+        conexao.close()
+
+
+# Teste da atribuição por thread: a espera de uma operação em outra thread não aparece na operação desta thread
+def test_espera_atribuida_a_thread_da_operacao(banco_bloqueado):
+    db_path, _ = banco_bloqueado
+    medidas = {}
+
+    def escrever():
+        conexao = _conectar(db_path, timeout=0.1)
+        _zerar_estado()
+        try:
+            conexao.cursor().execute("INSERT INTO item (nome) VALUES ('outra thread')")
+        except sqlite3.OperationalError:
+            pass
+        medidas['outra'] = _estado()
+        conexao.close()
+
+    _zerar_estado()
+    escritora = threading.Thread(target=escrever)
+    escritora.start()
+    escritora.join()
+    assert medidas['outra'][1] == 1 and medidas['outra'][0] > 0
+    assert _estado() == (0, 0)
@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from conf.backup import criarBackup, listarBackups, restaurarBackup
+
+
+def _contar(db_path):
+    conexao = sqlite3.connect(db_path)
+    try:
+        return conexao.execute('SELECT count(*) FROM sabor').fetchone()[0]
+    finally:
+        conexao.close()
+
+
+@pytest.fixture
+def banco(tmp_path):
+    db_path = tmp_path / 'picoles.sqlite'
+    conexao = sqlite3.connect(db_path)
+    conexao.execute('CREATE TABLE sabor (id INTEGER PRIMARY KEY, nome VARCHAR(45))')
+    conexao.executemany('INSERT INTO sabor (nome) VALUES (?)', [(f'SABOR {i}' * 10,) for i in range(5_000)])
+    conexao.commit()
+    conexao.close()
+    return db_path
+
+
+# Teste de backup em passos com escritas simultâneas: o arquivo gerado é consistente
+def test_backup_com_escritas(banco, tmp_path):
+    parar = threading.Event()
+
+    def escrever():
+        conexao = sqlite3.connect(banco, timeout=30)
+        while not parar.is_set():
+            conexao.execute("INSERT INTO sabor (nome) VALUES ('ESCRITA')")
+            conexao.commit()
+            time.sleep(0.001)
+        conexao.close()
+
+    escritor = threading.Thread(target=escrever)
+    escritor.start()
+    try:
+        resultado = criarBackup(str(banco), diretorio=str(tmp_path / 'bk'), paginas_por_passo=8, pausa_ms=1,
+                                max_reinicios=2)
+    finally:
+        parar.set()
+        escritor.join()
+
+    assert resultado['passos'] > 1 and resultado['paginas'] > 0 and resultado['paginas_seg'] > 0
+    assert _contar(resultado['caminho']) >= 5_000
+
+
+# Teste de rodízio: apenas os backups mais recentes são mantidos, e outros arquivos do diretório não são tocados
+def test_rodizio(banco, tmp_path):
+    diretorio = tmp_path / 'bk'
+    diretorio.mkdir()
+    (diretorio / 'picoles_BK.sqlite').write_bytes(b'')
+    caminhos = [criarBackup(str(banco), diretorio=str(diretorio), manter=2)['caminho'] for _ in range(3)]
+
+    assert [str(backup) for backup in listarBackups(str(diretorio))] == caminhos[1:]
+    assert (diretorio / 'picoles_BK.sqlite').exists()
+
+
+# Teste de restauração: o banco volta ao conteúdo do backup
+def test_restaurar(banco, tmp_path):
+    backup = criarBackup(str(banco), diretorio=str(tmp_path / 'bk'))['caminho']
+    conexao = sqlite3.connect(banco)
+    conexao.execute('DELETE FROM sabor')
+    conexao.commit()
+    conexao.close()
+
+    restaurarBackup(backup, db_path=str(banco))
+    assert _contar(banco) == 5_000
+    assert not banco.with_name(banco.name + '.restaurando').exists()
+
+
+# Teste de parâmetros inválidos
+def test_parametros_invalidos(banco):
+    with pytest.raises(ValueError):
+        criarBackup(str(banco), paginas_por_passo=0)
+    with pytest.raises(FileNotFoundError):
+        restaurarBackup('nao_existe.sqlite', db_path=str(banco))
@@ -0,0 +1,56 @@
+import shutil
+import sqlite3
+
+import pytest
+from conf.comparacao_bancos import compararBancos, possuiDiferencas
+
+
+@pytest.fixture
+def bancos(tmp_path):
+    base = tmp_path / 'base.sqlite'
+    conexao = sqlite3.connect(base)
+    conexao.execute('CREATE TABLE sabor (id INTEGER PRIMARY KEY, nome VARCHAR(45), preco FLOAT)')
+    conexao.execute('CREATE TABLE sem_id (nome VARCHAR(45))')
+    conexao.executemany('INSERT INTO sabor VALUES (?, ?, ?)', [(i, f'SABOR {i}', i / 10) for i in range(1, 20_001)])
+    conexao.commit()
+    conexao.close()
+    alvo = tmp_path / 'alvo.sqlite'
+    shutil.copyfile(base, alvo)
+    return base, alvo
+
+
+# Teste de bancos iguais: uma consulta de hash por banco, nenhuma linha lida
+def test_bancos_iguais(bancos):
+    base, alvo = bancos
+    resultado = compararBancos(str(base), str(alvo))
+    sabor = resultado['tabelas']['sabor']
+    assert not possuiDiferencas(resultado)
+    assert sabor['linhas_lidas'] == 0 and sabor['consultas'] == 4
+    assert resultado['sem_id_inteiro'] == ['sem_id']
+
+
+# Teste de diferenças: aponta exatamente os ids e lê só as linhas dos blocos alterados
+def test_diferencas_exatas(bancos):
+    base, alvo = bancos
+    conexao = sqlite3.connect(alvo)
+    conexao.execute("UPDATE sabor SET nome = 'ALTERADO' WHERE id IN (17, 9000)")
+    conexao.execute('UPDATE sabor SET preco = NULL WHERE id = 15000')
+    conexao.execute('DELETE FROM sabor WHERE id IN (2, 12345)')
+    conexao.execute("INSERT INTO sabor VALUES (20050, 'NOVO', 1.0)")
+    conexao.commit()
+    conexao.close()
+
+    resultado = compararBancos(str(base), str(alvo), tabelas=['sabor'], ramificacao=8, tamanho_folha=64)
+    sabor = resultado['tabelas']['sabor']
+    assert possuiDiferencas(resultado)
+    assert sabor['inseridos'] == [20_050]
+    assert sabor['apagados'] == [2, 12_345]
+    assert sabor['alterados'] == [17, 9_000, 15_000]
+    assert sabor['linhas_lidas'] < 2 * 6 * 64
+
+
+# Teste de parâmetros inválidos
+def test_parametros_invalidos(bancos):
+    base, alvo = bancos
+    with pytest.raises(ValueError):
+        compararBancos(str(base), str(alvo), ramificacao=1)
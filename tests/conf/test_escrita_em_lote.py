@@ -0,0 +1,105 @@
+import math
+
+import pytest
+import sqlalchemy as sa
+from conf.escrita_em_lote import LoteAdaptativo, erroDeLinha, gravarEmLotes, gravarLote, maximoLinhasPorComando
+from models.model_base import ModelBase
+
+TABELAS = ['sabor', 'tipo_embalagem', 'tipo_picole', 'picole']
+
+
+@pytest.fixture
+def engine(tmp_path):
+    import models.__all_models
+
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "escrita.sqlite"}')
+    tabelas = ModelBase.metadata.tables
+    ModelBase.metadata.create_all(engine, tables=[tabelas[tabela] for tabela in TABELAS])
+    with engine.begin() as conexao:
+        conexao.execute(tabelas['sabor'].insert(), {'id': 1, 'nome': 'SABOR 1'})
+        conexao.execute(tabelas['tipo_embalagem'].insert(), {'id': 1, 'nome': 'EMBALAGEM'})
+        conexao.execute(tabelas['tipo_picole'].insert(), {'id': 1, 'nome': 'TIPO'})
+    yield engine
+    engine.dispose()
+
+
+def _contar(engine, tabela):
+    with engine.connect() as conexao:
+        return conexao.execute(sa.select(sa.func.count()).select_from(ModelBase.metadata.tables[tabela])).scalar()
+
+
+# Teste de lote sem erros: um único comando
+def test_lote_sem_erros(engine):
+    linhas = [{'nome': f'SABOR {i}'} for i in range(2, 1_002)]
+    resultado = gravarLote(engine, ModelBase.metadata.tables['sabor'], linhas, chave=['nome'])
+    assert resultado == {'gravadas': 1_000, 'rejeitadas': [], 'comandos': 1}
+
+
+# Teste de bissecção: a linha ruim em 10 mil é isolada em O(log n) comandos e as demais são confirmadas
+def test_bisseccao_isola_linha_ruim(engine):
+    linhas = [{'id': i, 'nome': f'SABOR {i}'} for i in range(2, 10_002)]
+    linhas[6_789]['nome'] = 'SABOR 1'
+    resultado = gravarLote(engine, ModelBase.metadata.tables['sabor'], linhas)
+    assert resultado['gravadas'] == 9_999
+    assert resultado['rejeitadas'] == [(6_789, 'UNIQUE constraint failed: sabor.nome')]
+    assert resultado['comandos'] <= 2 * math.ceil(math.log2(len(linhas))) + 1
+    assert _contar(engine, 'sabor') == 10_000
+
+
+# Teste de várias linhas ruins, com FK inexistente, no mesmo lote
+def test_bisseccao_varias_linhas_ruins(engine):
+    linhas = [{'id': i, 'preco': 1.5, 'sabor_fk': 1, 'tipo_embalagem_fk': 1, 'tipo_picole_fk': 1,
+               'sabor_tipoPicole_tipoEmbalagem': f'1_1_1_{i}'} for i in range(1, 1_001)]
+    for posicao in (10, 500, 999):
+        linhas[posicao]['sabor_fk'] = 99
+    resultado = gravarLote(engine, ModelBase.metadata.tables['picole'], linhas)
+    assert [posicao for posicao, _ in resultado['rejeitadas']] == [10, 500, 999]
+    assert all(motivo == 'FOREIGN KEY constraint failed' for _, motivo in resultado['rejeitadas'])
+    assert resultado['gravadas'] == 997 and _contar(engine, 'picole') == 997
+
+
+# Teste dos erros isolados por bissecção: no postgres, a chave repetida no mesmo comando é um ProgrammingError
+def test_erro_de_linha():
+    class ErroDriver(Exception):
+        def __init__(self, pgcode):
+            super().__init__(pgcode)
+            self.pgcode = pgcode
+
+    assert erroDeLinha(sa.exc.IntegrityError('INSERT', {}, ErroDriver('23505')))
+    assert erroDeLinha(sa.exc.ProgrammingError('INSERT', {}, ErroDriver('21000')))
+    assert not erroDeLinha(sa.exc.ProgrammingError('INSERT', {}, ErroDriver('42P01')))
+    assert not erroDeLinha(sa.exc.OperationalError('INSERT', {}, ErroDriver(None)))
+
+
+# Teste do ajuste AIMD: dobra enquanto rápido, cai pela metade no lote lento e depois cresce somando o incremento
+def test_lote_adaptativo():
+    controle = LoteAdaptativo(inicial=10, maximo=100, alvo_ms=100)
+    tamanhos = [controle.registrar(controle.tamanho, segundos) for segundos in (0.01, 0.01, 0.01, 0.2, 0.01, 0.01)]
+    assert tamanhos == [20, 40, 80, 40, 50, 60]
+    for _ in range(10):
+        controle.registrar(controle.tamanho, 0.01)
+    assert controle.tamanho == 100
+    estatisticas = controle.estatisticas()
+    assert estatisticas['tamanho_lote'] == 100 and len(estatisticas['curva']) == 16
+    assert estatisticas['curva'][3] == {'tamanho': 80, 'linhas': 80, 'ms': 200.0, 'linhas_seg': 400.0}
+
+    with pytest.raises(ValueError):
+        LoteAdaptativo(inicial=10, minimo=20)
+
+
+# Teste de gravação em lotes ajustados: o tamanho cresce a partir do inicial sem passar do limite de parâmetros, e as
+# posições das rejeitadas são as das linhas na entrada
+def test_gravar_em_lotes(engine):
+    tabela = ModelBase.metadata.tables['sabor']
+    maximo = maximoLinhasPorComando(engine, len(tabela.columns))
+    assert maximo == 32_766 // 4 or maximo == 999 // 4
+
+    linhas = ({'id': i, 'nome': 'SABOR 1' if i == 3_000 else f'SABOR {i}'} for i in range(2, 20_002))
+    resultado = gravarEmLotes(engine, tabela, linhas, alvo_ms=10_000)
+    assert resultado['gravadas'] == 19_999 and resultado['rejeitadas'][0][0] == 2_998
+    assert resultado['curva'][0]['tamanho'] == 64 and resultado['curva'][1]['tamanho'] == 128
+    assert max(ponto['tamanho'] for ponto in resultado['curva']) <= maximo
+    assert resultado['lotes'] == len(resultado['curva']) and resultado['linhas_seg'] > 0
+
+    fixo = gravarEmLotes(engine, tabela, [{'nome': f'NOVO {i}'} for i in range(250)], chave=['nome'], tamanho_lote=100)
+    assert fixo['lotes'] == 3 and fixo['tamanho_lote'] == 100
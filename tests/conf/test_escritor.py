@@ -0,0 +1,119 @@
+import threading
+import uuid
+
+import pytest
+from conf.db_session import createEngine, disposeEngine
+from conf.escritor import EscritorUnico
+from models.sabor import Sabor
+
+# a escritora confirma os grupos na sua própria conexão, fora da transação desfeita ao final de cada teste
+pytestmark = pytest.mark.sem_transacao
+
+
+def _nome():
+    return f'ESCRITOR {uuid.uuid4().hex[:12]}'
+
+
+# Teste de inserções agrupadas: cada chamador recebe o próprio resultado, já confirmado no banco
+def test_grupo_confirmado():
+    nomes = [_nome() for _ in range(20)]
+    with EscritorUnico(intervalo_ms=50, max_operacoes=100) as escritor:
+        futuros = [escritor.submeter(Sabor.insertSabor, nome=nome) for nome in nomes]
+        sabores = [futuro.result(timeout=30) for futuro in futuros]
+
+    assert [sabor.nome for sabor in sabores] == [nome.upper() for nome in nomes]
+    assert escritor.grupos_confirmados < len(nomes)
+    for sabor in sabores:
+        assert Sabor.selectSaborPorId(id=sabor.id) is not None
+        Sabor.deleteSaborById(id_sabor=sabor.id)
+
+
+# Teste de isolamento: a falha de uma operação é entregue no seu Future e não desfaz as demais do grupo
+def test_falha_isolada_no_grupo():
+    nome = _nome()
+    with EscritorUnico(intervalo_ms=50) as escritor:
+        primeiro = escritor.submeter(Sabor.insertSabor, nome=nome)
+        duplicado = escritor.submeter(Sabor.insertSabor, nome=nome)
+        outro = escritor.submeter(Sabor.insertSabor, nome=_nome())
+
+        sabor = primeiro.result(timeout=30)
+        with pytest.raises(RuntimeError) as exc_info:
+            duplicado.result(timeout=30)
+        sabor_outro = outro.result(timeout=30)
+
+    assert f"Já existe um Sabor com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
+    assert Sabor.selectSaborPorId(id=sabor_outro.id) is not None
+    Sabor.deleteSaborById(id_sabor=sabor.id)
+    Sabor.deleteSaborById(id_sabor=sabor_outro.id)
+
+
+# Teste de erro ao submeter sem iniciar a thread escritora
+def test_submeter_sem_iniciar():
+    with pytest.raises(RuntimeError) as exc_info:
+        EscritorUnico().submeter(Sabor.insertSabor, nome=_nome())
+    assert 'EscritorUnico não iniciado' in str(exc_info.value)
+
+
+class _ErroFatal(BaseException):
+    """Erro que não é Exception: escapa do tratamento das operações e encerra a thread escritora"""
+
+
+# Teste de falha ao conectar: a escritora morre antes de receber operações, e as submetidas depois falham em vez de
+# deixar os chamadores esperando para sempre
+def test_falha_ao_conectar(tmp_path, banco_de_testes):
+    disposeEngine()
+    # um diretório no lugar do arquivo do banco faz a conexão falhar
+    createEngine(sqlite=True, db_path=str(tmp_path))
+    try:
+        escritor = EscritorUnico()
+        escritor.iniciar()
+        escritor._thread.join(timeout=30)
+        assert not escritor._thread.is_alive()
+
+        with pytest.raises(RuntimeError) as exc_info:
+            escritor.submeter(Sabor.insertSabor, nome=_nome())
+        assert 'EscritorUnico encerrado por erro' in str(exc_info.value)
+        assert 'unable to open database file' in str(exc_info.value)
+        escritor.parar()
+    finally:
+        disposeEngine()
+        createEngine(sqlite=True, db_path=banco_de_testes)
+
+
+# Teste da operação pendente quando a escritora morre: o Future que aguardava na fila falha com o erro da escritora
+def test_pendente_falha_quando_escritora_morre():
+    em_execucao = threading.Event()
+    liberar = threading.Event()
+
+    def _encerrar_escritora():
+        em_execucao.set()
+        liberar.wait(timeout=30)
+        raise _ErroFatal('falha fatal')
+
+    escritor = EscritorUnico(intervalo_ms=0)
+    escritor.iniciar()
+    try:
+        fatal = escritor.submeter(_encerrar_escritora)
+        assert em_execucao.wait(timeout=30)
+        # a escritora está presa na operação anterior, então esta fica pendente na fila
+        pendente = escritor.submeter(Sabor.insertSabor, nome=_nome())
+        assert not pendente.done()
+        liberar.set()
+
+        with pytest.raises(RuntimeError) as exc_info:
+            pendente.result(timeout=30)
+        assert 'EscritorUnico encerrado por erro: falha fatal' in str(exc_info.value)
+        assert isinstance(exc_info.value.__cause__, _ErroFatal)
+        with pytest.raises(RuntimeError):
+            fatal.result(timeout=30)
+    finally:
+        liberar.set()
+        escritor.parar(timeout=30)
+
+
+# Teste de erro nos parâmetros do escritor
+def test_parametros_invalidos():
+    with pytest.raises(ValueError):
+        EscritorUnico(max_operacoes=0)
+    with pytest.raises(ValueError):
+        EscritorUnico(intervalo_ms=-1)
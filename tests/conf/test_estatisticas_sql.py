@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from conf import estatisticas_sql
+from conf.estatisticas_sql import EstatisticasSql, normalizar_sql
+from models.sabor import Sabor
+
+
+# Teste de normalização: valores diferentes do mesmo comando geram o mesmo texto
+def test_normalizar_sql():
+    assert (normalizar_sql("SELECT * FROM sabor WHERE id = 10 AND nome = 'it''s'") ==
+            normalizar_sql("SELECT  *  FROM sabor\nWHERE id = 2 AND nome = 'X'") ==
+            'SELECT * FROM sabor WHERE id = ? AND nome = ?')
+    assert normalizar_sql('SELECT a FROM t WHERE x IN (?, ?, ?)') == 'SELECT a FROM t WHERE x IN (...)'
+    assert normalizar_sql('SELECT a FROM t WHERE x IN (?)') == 'SELECT a FROM t WHERE x IN (...)'
+    assert normalizar_sql('SELECT t_1.a FROM t AS t_1 WHERE t_1.b = %(b_1)s') == \
+           'SELECT t_1.a FROM t AS t_1 WHERE t_1.b = ?'
+
+
+# Teste de acumulação por fingerprint, histograma e log de consultas lentas
+def test_registrar():
+    estatisticas = EstatisticasSql(limite_lento_ms=10)
+    estatisticas.registrar('SELECT * FROM sabor WHERE id = 1', 2.0, linhas=1)
+    estatisticas.registrar('SELECT * FROM sabor WHERE id = 2', 20.0, linhas=1)
+    estatisticas.registrar('SELECT * FROM sabor WHERE id = 3', 1.0, erro=True)
+
+    [comando] = estatisticas.comandos()
+    assert comando.chamadas == 3
+    assert comando.erros == 1
+    assert comando.linhas == 2
+    assert comando.tempo_max_ms == 20.0
+    assert comando.tempo_min_ms == 1.0
+    assert sum(comando.histograma) == 3
+    assert len(estatisticas.consultas_lentas) == 1
+
+    documento = json.loads(estatisticas.paraJson())
+    assert documento['comandos'][0]['tempo_total_ms'] == 23.0
+    assert comando.fingerprint in estatisticas.tabela()
+
+
+# Teste de ordem desconhecida
+def test_ordem_invalida():
+    with pytest.raises(ValueError):
+        EstatisticasSql().comandos(ordem='nome')
+
+
+# Teste de integração com os eventos da engine: as linhas lidas do SELECT são contadas
+def test_habilitar_registra_comandos():
+    estatisticas = estatisticas_sql.habilitar()
+    estatisticas.limpar()
+    try:
+        Sabor.selectAllSabores()
+    finally:
+        estatisticas_sql.desabilitar()
+
+    selects = [comando for comando in estatisticas.comandos() if comando.sql.startswith('SELECT sabor.id')]
+    assert len(selects) == 1
+    assert selects[0].chamadas == 1
+    assert selects[0].linhas == len(Sabor.selectAllSabores())
+    assert not estatisticas_sql.habilitado()
@@ -0,0 +1,65 @@
+import csv
+import gzip
+import json
+import tracemalloc
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+from conf.exportacao import exportar, formatoDoArquivo
+from models.sabor import Sabor
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "exportacao.sqlite"}')
+    Sabor.__table__.create(engine)
+    agora = datetime(2024, 5, 1, 12, 30)
+    with engine.begin() as conexao:
+        conexao.execute(Sabor.__table__.insert(), [{'id': i, 'nome': f'SABOR {i}', 'data_criacao': agora,
+                                                    'data_atualizacao': agora} for i in range(1, 20_001)])
+    yield engine
+    engine.dispose()
+
+
+# Teste de exportação para CSV compactado, a partir do modelo
+def test_exportar_csv_gz(engine, tmp_path):
+    relatorio = exportar(Sabor, str(tmp_path / 'sabor.csv.gz'), tamanho_lote=1_000, engine=engine)
+    assert relatorio['linhas'] == 20_000 and relatorio['linhas_seg'] > 0
+
+    with gzip.open(tmp_path / 'sabor.csv.gz', 'rt', encoding='utf-8', newline='') as arquivo:
+        linhas = list(csv.reader(arquivo))
+    assert linhas[0] == ['id', 'nome', 'data_criacao', 'data_atualizacao']
+    assert linhas[1] == ['1', 'SABOR 1', '2024-05-01T12:30:00', '2024-05-01T12:30:00']
+    assert len(linhas) == 20_001
+
+
+# Teste de exportação de uma consulta filtrada para JSONL
+def test_exportar_consulta_jsonl(engine, tmp_path):
+    tabela = Sabor.__table__
+    consulta = sa.select(tabela.c.id, tabela.c.nome).where(tabela.c.id <= 3).order_by(tabela.c.id)
+    exportar(consulta, str(tmp_path / 'sabor.jsonl'), engine=engine)
+
+    linhas = [json.loads(linha) for linha in (tmp_path / 'sabor.jsonl').read_text(encoding='utf-8').splitlines()]
+    assert linhas == [{'id': 1, 'nome': 'SABOR 1'}, {'id': 2, 'nome': 'SABOR 2'}, {'id': 3, 'nome': 'SABOR 3'}]
+
+
+# Teste de memória: o pico não cresce com a quantidade de linhas exportadas
+def test_memoria_constante(engine, tmp_path):
+    tabela = Sabor.__table__
+    picos = []
+    for limite in (2_000, 20_000):
+        consulta = sa.select(tabela).where(tabela.c.id <= limite).order_by(tabela.c.id)
+        tracemalloc.start()
+        exportar(consulta, str(tmp_path / f'sabor_{limite}.jsonl'), tamanho_lote=500, engine=engine)
+        picos.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert picos[1] < picos[0] * 2
+
+
+# Teste de formato não suportado
+def test_formato_invalido(engine, tmp_path):
+    assert formatoDoArquivo('a/b.jsonl.gz') == ('jsonl', True)
+    with pytest.raises(ValueError):
+        exportar(Sabor, str(tmp_path / 'sabor.xlsx'), engine=engine)
+    assert not (tmp_path / 'sabor.xlsx').exists()
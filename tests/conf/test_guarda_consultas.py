@@ -0,0 +1,45 @@
+import warnings
+
+import pytest
+from conf.guarda_consultas import ConsultasExcedidasError, ContagemConsultas, PossivelNMais1Warning
+from models.sabor import Sabor
+
+
+# Teste de contagem: um select por id executa um único comando, sem contar o PRAGMA da sessão
+def test_conta_comandos(contar_consultas):
+    with contar_consultas(maximo=1) as contagem:
+        Sabor.selectAllSabores()
+    assert contagem.total == 1
+    assert contagem.comandos[0].startswith('SELECT')
+
+
+# Teste de limite excedido
+def test_maximo_excedido(contar_consultas):
+    with pytest.raises(ConsultasExcedidasError) as exc_info:
+        with contar_consultas(maximo=1):
+            Sabor.selectAllSabores()
+            Sabor.selectAllSabores()
+    assert 'Esperados no máximo 1 comandos SQL' in str(exc_info.value)
+
+
+# Teste de N+1: o mesmo SELECT repetido no bloco é apontado, com falha quando exigido
+def test_n_mais_1(contar_consultas):
+    with pytest.raises(ConsultasExcedidasError) as exc_info:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', PossivelNMais1Warning)
+            with contar_consultas(limite_repeticoes=3, falhar_em_n_mais_1=True) as contagem:
+                for id_sabor in range(1, 4):
+                    Sabor.selectSaborPorId(id=id_sabor)
+    assert len(contagem.suspeitas) == 1
+    assert 'test_guarda_consultas.py' in contagem.suspeitas[0]['pilha']
+    assert 'N+1 detectado' in str(exc_info.value)
+
+
+# Teste do aviso emitido ao atingir o limite de repetições
+def test_aviso_n_mais_1():
+    contagem = ContagemConsultas(limite_repeticoes=2)
+    with pytest.warns(PossivelNMais1Warning):
+        contagem.registrar('SELECT * FROM sabor WHERE id = 1')
+        contagem.registrar('SELECT * FROM sabor WHERE id = 2')
+    contagem.registrar('PRAGMA foreign_keys=ON')
+    assert contagem.total == 2
@@ -0,0 +1,106 @@
+import csv
+import gzip
+import json
+
+import pytest
+import sqlalchemy as sa
+from conf.importacao import importar, normalizarRegistro
+from models.model_base import ModelBase
+
+TABELAS = ['revendedor', 'nota_fiscal', 'sabor', 'tipo_embalagem', 'tipo_picole', 'picole', 'aditivo_nutritivo']
+
+
+@pytest.fixture
+def engine(tmp_path):
+    import models.__all_models
+
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "importacao.sqlite"}')
+    sa.event.listen(engine, 'connect', lambda conexao, registro: conexao.execute('PRAGMA foreign_keys=ON'))
+    tabelas = ModelBase.metadata.tables
+    ModelBase.metadata.create_all(engine, tables=[tabelas[tabela] for tabela in TABELAS])
+    with engine.begin() as conexao:
+        conexao.execute(tabelas['revendedor'].insert(), [
+            {'id': 7, 'nome': 'REVENDEDOR', 'cnpj': '11222333000181', 'razao_social': 'REVENDEDOR LTDA',
+             'contato': 'CONTATO'}])
+    yield engine
+    engine.dispose()
+
+
+def _linhas(engine, tabela, *colunas):
+    tabela = ModelBase.metadata.tables[tabela]
+    with engine.connect() as conexao:
+        return conexao.execute(sa.select(*[tabela.c[coluna] for coluna in colunas]).order_by(tabela.c.id)).all()
+
+
+def _erros(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo]
+
+
+# Teste de normalização como nos métodos insert* dos modelos
+def test_normalizar_registro():
+    assert normalizarRegistro('nota_fiscal', {'numero_serie': ' ns-1 ', 'descricao': 'nota', 'valor': '10.456',
+                                              'revendedor_cnpj': '11222333000181'}) == \
+        {'numero_serie': 'NS-1', 'descricao': 'NOTA', 'valor': 10.46, 'revendedor_cnpj': '11222333000181'}
+    with pytest.raises(ValueError, match='não informado'):
+        normalizarRegistro('sabor', {'nome': '   '})
+    with pytest.raises(ValueError, match='14 caracteres'):
+        normalizarRegistro('revendedor', {'nome': 'a', 'cnpj': '123', 'razao_social': 'b', 'contato': 'c'})
+
+
+# Teste de importação de CSV em lotes: os nomes repetidos viram um só sabor, e importar de novo não duplica
+def test_importar_csv(engine, tmp_path):
+    caminho = tmp_path / 'sabores.csv'
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(['nome'])
+        escritor.writerows([[f' sabor {i} '] for i in range(1, 26)] + [['Sabor 3'], ['']])
+
+    relatorio = importar('sabor', str(caminho), tamanho_lote=10, engine=engine)
+    assert relatorio['lidas'] == 27 and relatorio['lotes'] == 3
+    assert relatorio['gravadas'] == 26 and relatorio['rejeitadas'] == 1
+    assert _erros(relatorio['arquivo_erros']) == [{'linha': 28, 'motivo': 'nome de sabor não informado!',
+                                                   'registro': {'nome': ''}}]
+    nomes = [linha.nome for linha in _linhas(engine, 'sabor', 'nome')]
+    assert nomes == [f'SABOR {i}' for i in range(1, 26)]
+
+    ids = _linhas(engine, 'sabor', 'id')
+    importar('sabor', str(caminho), tamanho_lote=10, engine=engine)
+    assert _linhas(engine, 'sabor', 'id') == ids
+
+
+# Teste de importação de JSONL compactado com as FKs resolvidas pela chave natural e os registros rejeitados no
+# arquivo de erros, sem interromper a importação
+def test_importar_jsonl_com_fks(engine, tmp_path):
+    registros = [{'numero_serie': f'ns-{i}', 'descricao': 'nota', 'valor': i + 0.456,
+                  'revendedor_cnpj': '11222333000181'} for i in range(1, 6)]
+    registros[1]['revendedor_cnpj'] = '99999999999999'
+    registros[3]['valor'] = 'dez'
+    caminho = tmp_path / 'notas.jsonl.gz'
+    with gzip.open(caminho, 'wt', encoding='utf-8') as arquivo:
+        arquivo.writelines(json.dumps(registro) + '\n' for registro in registros)
+        arquivo.write('{nao e json\n')
+
+    erros = tmp_path / 'erros' / 'notas.jsonl'
+    relatorio = importar('nota_fiscal', str(caminho), tamanho_lote=2, arquivo_erros=str(erros), engine=engine)
+    assert relatorio['gravadas'] == 3 and relatorio['rejeitadas'] == 3
+    assert [(erro['linha'], erro['motivo']) for erro in _erros(erros)] == [
+        (2, 'revendedor com cnpj 99999999999999 não encontrado!'), (4, 'valor de nota_fiscal deve ser um número!'),
+        (6, "JSON inválido: Expecting property name enclosed in double quotes")]
+    assert _linhas(engine, 'nota_fiscal', 'numero_serie', 'valor', 'revendedor_fk') == [
+        ('NS-1', 1.46, 7), ('NS-3', 3.46, 7), ('NS-5', 5.46, 7)]
+
+
+# Teste de rejeição pelo banco: a fórmula repetida viola o unique e só o registro dela é rejeitado
+def test_rejeicao_pelo_banco(engine, tmp_path):
+    caminho = tmp_path / 'aditivos.jsonl'
+    registros = [{'nome': f'aditivo {i}', 'formula_quimica': f'f{i}'} for i in range(1, 6)]
+    registros[2]['formula_quimica'] = 'f1'
+    caminho.write_text(''.join(json.dumps(registro) + '\n' for registro in registros), encoding='utf-8')
+
+    relatorio = importar('aditivo_nutritivo', str(caminho), engine=engine)
+    assert relatorio['gravadas'] == 4 and relatorio['rejeitadas'] == 1
+    assert relatorio['curva'][0]['tamanho'] == 64 and 'tamanho_lote' in relatorio
+    erro, = _erros(relatorio['arquivo_erros'])
+    assert erro['linha'] == 3 and 'UNIQUE' in erro['motivo']
+    assert len(_linhas(engine, 'aditivo_nutritivo', 'id')) == 4
@@ -0,0 +1,99 @@
+import gzip
+import json
+
+import pytest
+import sqlalchemy as sa
+from conf.db_session import createTables
+from conf.ingestao_notas import ESTAGIOS, ingerirNotasFiscais
+from models.model_base import ModelBase
+
+# as notas são emitidas pelas threads do pipeline, fora da transação do teste, então o teste usa um banco próprio
+pytestmark = pytest.mark.sem_transacao
+
+CNPJ = '11222333000181'
+
+
+@pytest.fixture
+def banco(banco_temporario):
+    createTables(sqlite=True)
+    tabelas = ModelBase.metadata.tables
+    with banco_temporario.begin() as conexao:
+        conexao.execute(tabelas['revendedor'].insert(), {'id': 1, 'nome': 'REVENDEDOR', 'cnpj': CNPJ,
+                                                         'razao_social': 'REVENDEDOR LTDA', 'contato': 'CONTATO'})
+        conexao.execute(tabelas['sabor'].insert(), {'id': 1, 'nome': 'SABOR'})
+        conexao.execute(tabelas['tipo_embalagem'].insert(), {'id': 1, 'nome': 'EMBALAGEM'})
+        conexao.execute(tabelas['tipo_picole'].insert(), {'id': 1, 'nome': 'TIPO'})
+        conexao.execute(tabelas['picole'].insert(), {'id': 1, 'preco': 1.5, 'sabor_fk': 1, 'tipo_embalagem_fk': 1,
+                                                     'tipo_picole_fk': 1, 'sabor_tipoPicole_tipoEmbalagem': '1_1_1'})
+        conexao.execute(tabelas['lote'].insert(), [{'id': i, 'picole_fk': 1, 'quantidade': 10}
+                                                   for i in range(1, 5_003)])
+        conexao.execute(tabelas['nota_fiscal'].insert(), {'id': 1, 'valor': 1.0, 'numero_serie': 'NS-EXISTENTE',
+                                                          'descricao': 'NOTA', 'revendedor_fk': 1})
+        conexao.execute(tabelas['lote_nota_fiscal'].insert(), {'nota_fiscal_fk': 1, 'lote_fk': 1,
+                                                               'lote_nota_fiscal': '1-1'})
+    return banco_temporario
+
+
+def _contar(engine, tabela):
+    with engine.connect() as conexao:
+        return conexao.execute(sa.select(sa.func.count()).select_from(ModelBase.metadata.tables[tabela])).scalar()
+
+
+# Teste do pipeline: as notas válidas são emitidas com os seus lotes e cada rejeição vai para o arquivo de erros com o
+# motivo do estágio que a rejeitou
+def test_ingerir_notas_fiscais(banco, tmp_path):
+    registros = [{'cnpj': CNPJ, 'numero_serie': f'ns-{i}', 'valor': 10.456, 'lotes': [2 * i + 2, 2 * i + 3]}
+                 for i in range(2_500)]
+    registros += [
+        {'cnpj': '99999999999999', 'numero_serie': 'ns-a', 'valor': 1.0, 'lotes': [5_002]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-b', 'valor': 'dez', 'lotes': [5_002]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-c', 'valor': 1.0, 'lotes': [1]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-d', 'valor': 1.0, 'lotes': [9_999]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-e', 'valor': 1.0, 'lotes': [2]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-7', 'valor': 1.0, 'lotes': [5_002]},
+        {'cnpj': CNPJ, 'numero_serie': 'ns-existente', 'valor': 1.0, 'lotes': [5_002]},
+    ]
+    caminho = tmp_path / 'notas.jsonl.gz'
+    with gzip.open(caminho, 'wt', encoding='utf-8') as arquivo:
+        arquivo.writelines(json.dumps(registro) + '\n' for registro in registros)
+        arquivo.write('[1, 2]\n')
+
+    relatorio = ingerirNotasFiscais(str(caminho), tamanho_bloco=100, tamanho_lote=300, tamanho_fila=2,
+                                    intervalo_progresso=0)
+    assert relatorio['lidas'] == 2_508 and relatorio['gravadas'] == 2_500 and relatorio['rejeitadas'] == 8
+    assert _contar(banco, 'nota_fiscal') == 2_501 and _contar(banco, 'lote_nota_fiscal') == 5_001
+
+    with open(relatorio['arquivo_erros'], encoding='utf-8') as arquivo:
+        motivos = {erro['linha']: erro['motivo'] for erro in map(json.loads, arquivo)}
+    assert motivos == {2_501: 'revendedor com cnpj 99999999999999 não encontrado!',
+                       2_502: 'valor de nota_fiscal deve ser um número!',
+                       2_503: 'lotes já vinculados a outra nota fiscal: [1]',
+                       2_504: 'lotes não encontrados: [9999]',
+                       2_505: 'lotes já usados por outra nota do arquivo: [2]',
+                       2_506: 'número de série NS-7 repetido no arquivo!',
+                       2_507: 'número de série NS-EXISTENTE já cadastrado!',
+                       2_508: 'o registro deve ser um objeto JSON'}
+
+    estagios = relatorio['estagios']
+    assert list(estagios) == list(ESTAGIOS)
+    assert [estagio['rejeitadas'] for estagio in estagios.values()] == [1, 1, 3, 3, 0]
+    assert all(estagio['fila_max'] <= 2 and estagio['fila'] == 0 for estagio in estagios.values())
+    assert estagios['gravacao']['saidas'] == 2_500 and estagios['gravacao']['capacidade'] > 0
+
+
+# Teste de falha do banco na gravação: não é tratada como rejeição das notas, e a ingestão é interrompida
+def test_falha_do_banco_interrompe(banco, tmp_path):
+    with banco.begin() as conexao:
+        # a tabela do gatilho não existe, então cada insert em nota_fiscal falha com OperationalError
+        conexao.exec_driver_sql('CREATE TRIGGER falha_nota AFTER INSERT ON nota_fiscal '
+                                'BEGIN INSERT INTO tabela_inexistente VALUES (1); END')
+    caminho = tmp_path / 'notas.jsonl'
+    caminho.write_text(''.join(json.dumps({'cnpj': CNPJ, 'numero_serie': f'ns-{i}', 'valor': 1.0, 'lotes': [i + 2]})
+                               + '\n' for i in range(10)), encoding='utf-8')
+
+    with pytest.raises(RuntimeError) as exc_info:
+        ingerirNotasFiscais(str(caminho), intervalo_progresso=0)
+    assert 'Erro inesperado ao emitir notas fiscais' in str(exc_info.value)
+    assert _contar(banco, 'nota_fiscal') == 1
+    erros = tmp_path / 'notas.jsonl.erros.jsonl'
+    assert not erros.exists() or erros.read_text(encoding='utf-8') == ''
@@ -0,0 +1,72 @@
+import urllib.request
+
+import pytest
+from conf import metricas
+from conf.metricas import Contador, Histograma, Medidor, RegistroMetricas, restricaoViolada
+from models.sabor import Sabor
+
+
+# Teste do formato texto do Prometheus para contadores, medidores e histogramas
+def test_renderizar_formato_prometheus():
+    registro = RegistroMetricas()
+    contador = registro.registrar(Contador('teste_total', 'Contador de teste.', ('tipo',)))
+    medidor = registro.registrar(Medidor('teste_atual', 'Medidor de teste.'))
+    histograma = registro.registrar(Histograma('teste_segundos', 'Histograma de teste.', buckets=(0.1, 1)))
+    contador.inc(tipo='a"b')
+    contador.inc(2, tipo='a"b')
+    medidor.set(7)
+    histograma.observar(0.05)
+    histograma.observar(0.5)
+    histograma.observar(5)
+
+    texto = registro.renderizar()
+    assert '# TYPE teste_total counter' in texto
+    assert 'teste_total{tipo="a\\"b"} 3' in texto
+    assert 'teste_atual 7' in texto
+    assert 'teste_segundos_bucket{le="0.1"} 1' in texto
+    assert 'teste_segundos_bucket{le="1"} 2' in texto
+    assert 'teste_segundos_bucket{le="+Inf"} 3' in texto
+    assert 'teste_segundos_count 3' in texto
+
+
+# Teste de rótulos diferentes dos declarados
+def test_rotulos_invalidos():
+    with pytest.raises(ValueError):
+        Contador('teste_total', 'Contador de teste.', ('tipo',)).inc(outro='x')
+
+
+# Teste da base das métricas: uma métrica sem _linhas não pode ser instanciada
+def test_metrica_sem_linhas():
+    class SemLinhas(metricas._Metrica):
+        tipo = 'gauge'
+
+    with pytest.raises(TypeError):
+        SemLinhas('teste_sem_linhas', 'Métrica sem linhas.')
+
+
+# Teste de identificação da restrição violada nas mensagens do sqlite
+def test_restricao_violada():
+    assert restricaoViolada(Exception('UNIQUE constraint failed: sabor.nome')) == ('unique', 'sabor.nome')
+    assert restricaoViolada(Exception('FOREIGN KEY constraint failed')) == ('foreign_key', '')
+    assert restricaoViolada(Exception('outro erro')) == ('unknown', '')
+
+
+# Teste de integração: eventos da engine e dos métodos de CRUD alimentam as métricas expostas por HTTP
+def test_metricas_expostas():
+    metricas.habilitar()
+    servidor = metricas.iniciarServidor(porta=0)
+    try:
+        comandos_antes = metricas.SQL_COMANDOS.valor(tipo='SELECT')
+        chamadas_antes = metricas.CRUD_DURACAO.contagem(modelo='Sabor', metodo='selectAllSabores')
+        Sabor.selectAllSabores()
+
+        assert metricas.SQL_COMANDOS.valor(tipo='SELECT') == comandos_antes + 1
+        assert metricas.CRUD_DURACAO.contagem(modelo='Sabor', metodo='selectAllSabores') == chamadas_antes + 1
+
+        url = f'http://127.0.0.1:{servidor.server_address[1]}/metrics'
+        texto = urllib.request.urlopen(url).read().decode('utf-8')
+        assert 'picoles_crud_duration_seconds_count{modelo="Sabor",metodo="selectAllSabores"}' in texto
+        assert 'picoles_pool_checkouts_total' in texto
+    finally:
+        servidor.shutdown()
+        metricas.desabilitar()
@@ -0,0 +1,76 @@
+import cProfile
+
+import pytest
+from conf import perfil
+from models.sabor import Sabor
+
+
+@pytest.fixture
+def perfil_ativo():
+    perfil.limpar()
+    perfil.habilitar(usar_tracemalloc=True)
+    yield perfil
+    perfil.desabilitar()
+    perfil.limpar()
+
+
+# Teste de medição: tempo, tempo no banco, comandos SQL e bytes por método
+def test_mede_metodos_crud(perfil_ativo):
+    Sabor.selectAllSabores()
+    Sabor.selectAllSabores()
+
+    [medicao] = [r for r in perfil.estatisticas() if r['metodo'] == 'Sabor.selectAllSabores']
+    assert medicao['chamadas'] == 2
+    assert medicao['comandos_sql'] >= 2
+    assert 0 < medicao['tempo_banco_ms'] <= medicao['tempo_total_ms']
+    assert medicao['pico_bytes'] > 0
+
+
+# Teste de observador: recebe cada chamada medida, inclusive com o perfil desativado
+def test_observador():
+    recebidas = []
+    observador = lambda metodo, medicao: recebidas.append((metodo, medicao['erro']))
+    perfil.adicionarObservador(observador)
+    try:
+        with pytest.raises(TypeError):
+            Sabor.selectSaborPorId(id='1')
+    finally:
+        perfil.removerObservador(observador)
+    assert recebidas == [('Sabor.selectSaborPorId', True)]
+
+
+# Teste do decorador: apenas os métodos de CRUD são envolvidos
+def test_instrumentar_crud():
+    @perfil.instrumentarCrud
+    class Modelo:
+        @staticmethod
+        def selectTudo():
+            return 'tudo'
+
+        @staticmethod
+        def auxiliar():
+            return 'auxiliar'
+
+    assert Modelo.selectTudo() == 'tudo'
+    assert Modelo.selectTudo.__wrapped__ is not None
+    assert not hasattr(Modelo.auxiliar, '__wrapped__')
+
+
+# Teste da conversão do cProfile em pilhas colapsadas
+def test_pilhas_colapsadas():
+    def folha():
+        return sum(range(20_000))
+
+    def raiz():
+        return folha() + folha()
+
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    raiz()
+    perfilador.disable()
+
+    pilhas = perfil.pilhasColapsadas(perfilador)
+    linha_folha = folha.__code__.co_firstlineno
+    assert any(pilha.endswith(f':raiz;test_perfil:{linha_folha}:folha;<built-in_method_builtins.sum>')
+               for pilha in pilhas)
+    assert all(tempo > 0 for tempo in pilhas.values())
@@ -0,0 +1,72 @@
+import os
+
+import models.__all_models
+import pytest
+import sqlalchemy as sa
+from conf import registro_alteracoes
+from conf.db_session import createEngine, disposeEngine
+from conf.registro_alteracoes import compactar, lerDesde, ultimoSeq
+from models.model_base import ModelBase
+from models.sabor import Sabor
+
+
+@pytest.fixture
+def todas_operacoes():
+    registro_alteracoes.habilitar(('insert', 'update', 'delete'))
+    yield
+    registro_alteracoes.habilitar(('delete',))
+
+
+# Teste do padrão: apenas as exclusões feitas pelos métodos dos modelos são registradas
+def test_registra_exclusoes():
+    offset = ultimoSeq()
+    sabor = Sabor.insertSabor(nome='Sabor do log')
+    Sabor.deleteSaborById(id_sabor=sabor.id)
+
+    entradas = lerDesde(offset)
+    assert [(e.tabela, e.id_registro, e.operacao) for e in entradas] == [('sabor', sabor.id, 'delete')]
+    assert lerDesde(entradas[-1].seq) == []
+
+
+# Teste de compactação: de cada linha fica apenas a entrada mais recente
+def test_compactar(todas_operacoes):
+    offset = ultimoSeq()
+    sabor = Sabor.insertSabor(nome='Sabor compactado')
+    Sabor.updateSabor(id_sabor=sabor.id, nome='Sabor compactado 2')
+    Sabor.deleteSaborById(id_sabor=sabor.id)
+    assert [e.operacao for e in lerDesde(offset, tabelas=['sabor'])] == ['insert', 'update', 'delete']
+
+    resultado = compactar()
+    assert resultado['substituidas'] >= 2
+    assert [e.operacao for e in lerDesde(offset, tabelas=['sabor'])] == ['delete']
+
+    resultado = compactar(retencao_dias=0)
+    assert resultado['seq_expirado_ate'] >= offset + 3
+    assert lerDesde(offset) == []
+
+
+# Teste de operação inválida
+def test_operacao_invalida():
+    with pytest.raises(ValueError):
+        registro_alteracoes.habilitar(('truncate',))
+
+
+# Teste da troca do arquivo do banco por outro criado antes do log: as exclusões continuam registradas
+@pytest.mark.sem_transacao
+def test_banco_substituido(banco_temporario, tmp_path):
+    db_path = banco_temporario.url.database
+    ModelBase.metadata.create_all(banco_temporario)
+    sabor = Sabor.insertSabor(nome='Sabor antes da troca')
+    Sabor.deleteSaborById(id_sabor=sabor.id)
+
+    antigo = sa.create_engine(f'sqlite:///{tmp_path / "antigo.sqlite"}')
+    ModelBase.metadata.create_all(antigo, tables=[tabela for nome, tabela in ModelBase.metadata.tables.items()
+                                                  if nome != 'registro_alteracao'])
+    antigo.dispose()
+    disposeEngine()
+    os.replace(tmp_path / 'antigo.sqlite', db_path)
+    createEngine(sqlite=True, db_path=db_path)
+
+    sabor = Sabor.insertSabor(nome='Sabor depois da troca')
+    Sabor.deleteSaborById(id_sabor=sabor.id)
+    assert [(e.tabela, e.id_registro) for e in lerDesde(0)] == [('sabor', sabor.id)]
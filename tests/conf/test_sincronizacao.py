@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from conf.sincronizacao import criarIndicesSincronizacao, reiniciarMarcas, sincronizar, tabelasSincronizaveis
+from models.model_base import ModelBase
+from models.picole import Picole
+
+TABELAS = ['sabor', 'tipo_embalagem', 'tipo_picole', 'picole']
+
+
+def _engine(caminho):
+    engine = sa.create_engine(f'sqlite:///{caminho}')
+    sa.event.listen(engine, 'connect', lambda conexao, registro: conexao.execute('PRAGMA foreign_keys=ON'))
+    return engine
+
+
+@pytest.fixture
+def bancos(tmp_path):
+    import models.__all_models
+
+    origem = _engine(tmp_path / 'origem.sqlite')
+    destino = _engine(tmp_path / 'destino.sqlite')
+    tabelas = ModelBase.metadata.tables
+    ModelBase.metadata.create_all(origem, tables=[tabelas[tabela] for tabela in TABELAS])
+    data = datetime(2024, 1, 1)
+    datas = {'data_criacao': data, 'data_atualizacao': data}
+    with origem.begin() as conexao:
+        conexao.execute(tabelas['sabor'].insert(), [{'id': i, 'nome': f'SABOR {i}', **datas} for i in range(1, 26)])
+        conexao.execute(tabelas['tipo_embalagem'].insert(), {'id': 1, 'nome': 'EMBALAGEM', **datas})
+        conexao.execute(tabelas['tipo_picole'].insert(), {'id': 1, 'nome': 'TIPO', **datas})
+        conexao.execute(tabelas['picole'].insert(), [
+            {'id': i, 'preco': 1.5, 'sabor_fk': i, 'tipo_embalagem_fk': 1, 'tipo_picole_fk': 1,
+             'sabor_tipoPicole_tipoEmbalagem': f'{i}_1_1', **datas} for i in range(1, 26)])
+    yield origem, destino
+    origem.dispose()
+    destino.dispose()
+
+
+def _contar(engine, tabela):
+    with engine.connect() as conexao:
+        return conexao.execute(sa.select(sa.func.count()).select_from(ModelBase.metadata.tables[tabela])).scalar()
+
+
+# Teste da ordem das FKs: as tabelas referenciadas vêm antes das que as referenciam
+def test_ordem_das_fks():
+    estagios = tabelasSincronizaveis(TABELAS)
+    assert estagios == [['sabor', 'tipo_embalagem', 'tipo_picole'], ['picole']]
+
+
+# Teste de carga inicial em lotes e de execução seguinte sem alterações
+def test_sincronizacao_incremental(bancos):
+    origem, destino = bancos
+    resultados = sincronizar(origem, destino, tabelas=TABELAS, tamanho_lote=10)
+    assert resultados['sabor']['linhas'] == 25 and resultados['sabor']['lotes'] == 3
+    assert _contar(destino, 'picole') == 25
+
+    resultados = sincronizar(origem, destino, tabelas=TABELAS, tamanho_lote=10)
+    assert all(resultado['linhas'] == 0 for resultado in resultados.values())
+
+    # apenas a linha alterada depois da marca d'água é copiada, e atualizada no destino
+    sabor = ModelBase.metadata.tables['sabor']
+    with origem.begin() as conexao:
+        conexao.execute(sabor.update().where(sabor.c.id == 3)
+                        .values(nome='SABOR ALTERADO', data_atualizacao=datetime(2024, 1, 1) + timedelta(days=1)))
+    resultados = sincronizar(origem, destino, tabelas=TABELAS, tamanho_lote=10)
+    assert resultados['sabor']['linhas'] == 1 and resultados['picole']['linhas'] == 0
+    with destino.connect() as conexao:
+        assert conexao.execute(sa.select(sabor.c.nome).where(sabor.c.id == 3)).scalar() == 'SABOR ALTERADO'
+
+
+# Teste de confirmação fora de ordem: a linha confirmada depois de outra mais nova, com a marca d'água já além da sua
+# data_atualizacao, é copiada pela releitura da janela de segurança
+def test_confirmacao_fora_de_ordem(bancos):
+    origem, destino = bancos
+    sabor = ModelBase.metadata.tables['sabor']
+    data = datetime(2024, 1, 1)
+    with origem.begin() as conexao:
+        conexao.execute(sabor.insert(), {'id': 30, 'nome': 'SABOR NOVO', 'data_criacao': data,
+                                         'data_atualizacao': data + timedelta(seconds=10)})
+    sincronizar(origem, destino, tabelas=TABELAS, janela_seguranca=60)
+
+    # gravada antes (data_atualizacao menor), mas confirmada só depois da sincronização
+    with origem.begin() as conexao:
+        conexao.execute(sabor.insert(), {'id': 31, 'nome': 'SABOR ATRASADO', 'data_criacao': data,
+                                         'data_atualizacao': data + timedelta(seconds=5)})
+    assert sincronizar(origem, destino, tabelas=TABELAS, janela_seguranca=0)['sabor']['linhas'] == 0
+    assert _contar(destino, 'sabor') == 26
+
+    resultados = sincronizar(origem, destino, tabelas=TABELAS, janela_seguranca=60)
+    assert resultados['sabor']['linhas'] == 0 and resultados['sabor']['relidas'] == 27
+    assert _contar(destino, 'sabor') == 27
+    with destino.connect() as conexao:
+        assert conexao.execute(sa.select(sabor.c.nome).where(sabor.c.id == 31)).scalar() == 'SABOR ATRASADO'
+
+
+# Teste de exclusões: as registradas no log da origem são aplicadas no destino, e uma linha apagada e inserida de novo
+# com o mesmo id volta pela cópia
+def test_sincroniza_exclusoes(bancos):
+    origem, destino = bancos
+    sincronizar(origem, destino, tabelas=TABELAS)
+    with Session(bind=origem) as session:
+        session.delete(session.get(Picole, 5))
+        session.delete(session.get(Picole, 6))
+        session.commit()
+        session.add(Picole(id=6, preco=2.0, sabor_fk=6, tipo_embalagem_fk=1, tipo_picole_fk=1,
+                           sabor_tipoPicole_tipoEmbalagem='6_1_1'))
+        session.commit()
+
+    resultados = sincronizar(origem, destino, tabelas=TABELAS)
+    assert resultados['registro_alteracao']['linhas'] == 2
+    assert resultados['picole']['linhas'] == 1
+    picole = ModelBase.metadata.tables['picole']
+    with destino.connect() as conexao:
+        ids = {linha.id for linha in conexao.execute(sa.select(picole.c.id))}
+    assert 5 not in ids and 6 in ids and len(ids) == 24
+
+    resultados = sincronizar(origem, destino, tabelas=TABELAS)
+    assert resultados['registro_alteracao']['linhas'] == 0
+
+
+# Teste de reinício das marcas d'água: a tabela é copiada de novo por inteiro
+def test_reiniciar_marcas(bancos):
+    origem, destino = bancos
+    sincronizar(origem, destino, tabelas=TABELAS)
+    assert reiniciarMarcas(destino, ['sabor']) == 1
+    resultados = sincronizar(origem, destino, tabelas=TABELAS)
+    assert resultados['sabor']['linhas'] == 25 and resultados['picole']['linhas'] == 0
+
+
+# Teste de criação dos índices usados na leitura por keyset
+def test_indices_sincronizacao(bancos):
+    origem, _ = bancos
+    nomes = criarIndicesSincronizacao(origem, ['sabor'])
+    criarIndicesSincronizacao(origem, ['sabor'])
+    assert nomes == ['ix_sabor_data_atualizacao_id']
+    assert 'ix_sabor_data_atualizacao_id' in [indice['name'] for indice in sa.inspect(origem).get_indexes('sabor')]
@@ -0,0 +1,139 @@
+# Isolamento dos testes: a sessão de testes usa um banco sqlite temporário, com o esquema criado uma única vez e
+# algumas linhas base (id 1 em cada tabela referenciada por FK) para os testes dos modelos. Cada teste roda dentro de
+# uma transação desfeita ao final: os métodos dos modelos usam a sessão do teste como sessão ambiente
+# (conf.db_session.ambientSession) e cada with createSession() vira um SAVEPOINT. Assim os testes não dependem da
+# ordem de execução, não deixam dados para os seguintes e db/picoles.sqlite nunca é tocado.
+#
+# O banco é um arquivo temporário, e não :memory:, porque os testes com várias threads (EscritorUnico) precisam de
+# conexões independentes; esses testes usam a marca sem_transacao e limpam os próprios dados.
+#
+# Em paralelo (pytest-xdist, pytest -n auto), cada processo trabalhador recebe o próprio arquivo, copiado com a API de
+# backup do sqlite de um banco modelo construído uma única vez no diretório temporário compartilhado pelos
+# trabalhadores. A camada de acesso é apontada para a cópia pela variável de ambiente PICOLES_DB_PATH.
+
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+from conf.db_session import ambientSession, createEngine, disposeEngine, savepointConnection
+from conf.guarda_consultas import contarConsultas
+from models.model_base import ModelBase
+from sqlalchemy.orm import Session
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'sem_transacao: o teste não roda na transação desfeita ao final, usa o banco '
+                                       'de testes diretamente e deve limpar os próprios dados')
+
+
+def _criar_modelo(db_path: Path) -> None:
+    """Cria em db_path o esquema e as linhas base. O arquivo é montado com outro nome e renomeado ao final, para que
+    os trabalhadores que chegarem ao mesmo tempo nunca copiem um modelo incompleto.
+    """
+    import models.__all_models
+
+    provisorio = db_path.with_name(f'{db_path.name}.{os.getpid()}.tmp')
+    engine = sa.create_engine(f'sqlite:///{provisorio}')
+    ModelBase.metadata.create_all(engine)
+    tabelas = ModelBase.metadata.tables
+    agora = datetime.now()
+    datas = {'data_criacao': agora, 'data_atualizacao': agora}
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql('PRAGMA foreign_keys=ON')
+        conexao.execute(tabelas['sabor'].insert(), [{'id': 1, 'nome': 'SABOR BASE', **datas},
+                                                     {'id': 2, 'nome': 'SABOR BASE 2', **datas}])
+        conexao.execute(tabelas['tipo_embalagem'].insert(), {'id': 1, 'nome': 'EMBALAGEM BASE', **datas})
+        conexao.execute(tabelas['tipo_picole'].insert(), {'id': 1, 'nome': 'TIPO BASE', **datas})
+        conexao.execute(tabelas['ingrediente'].insert(), {'id': 1, 'nome': 'INGREDIENTE BASE', **datas})
+        conexao.execute(tabelas['conservante'].insert(), {'id': 1, 'nome': 'CONSERVANTE BASE',
+                                                          'descricao': 'CONSERVANTE DOS TESTES', **datas})
+        conexao.execute(tabelas['aditivo_nutritivo'].insert(), {'id': 1, 'nome': 'ADITIVO BASE',
+                                                                'formula_quimica': 'C1', **datas})
+        # o picolé base usa o sabor 2 para não ocupar a combinação 1_1_1 inserida pelos testes de Picole
+        conexao.execute(tabelas['picole'].insert(), {'id': 1, 'preco': 1.0, 'sabor_fk': 2, 'tipo_embalagem_fk': 1,
+                                                     'tipo_picole_fk': 1, 'sabor_tipoPicole_tipoEmbalagem': '2_1_1',
+                                                     **datas})
+        conexao.execute(tabelas['lote'].insert(), {'id': 1, 'picole_fk': 1, 'quantidade': 1, **datas})
+        conexao.execute(tabelas['revendedor'].insert(), {'id': 1, 'nome': 'REVENDEDOR BASE', 'cnpj': '00000000000000',
+                                                         'razao_social': 'REVENDEDOR BASE LTDA',
+                                                         'contato': '00 0000-0000', **datas})
+        conexao.execute(tabelas['nota_fiscal'].insert(), {'id': 1, 'valor': 1.0, 'numero_serie': 'NOTA BASE',
+                                                          'descricao': 'NOTA BASE', 'revendedor_fk': 1, **datas})
+    engine.dispose()
+    os.replace(provisorio, db_path)
+
+
+def _clonar_banco(origem: Path, destino: Path) -> None:
+    """Copia o banco origem para destino com a API de backup do sqlite"""
+    conexao_origem = sqlite3.connect(origem)
+    conexao_destino = sqlite3.connect(destino)
+    try:
+        conexao_origem.backup(conexao_destino)
+    finally:
+        conexao_destino.close()
+        conexao_origem.close()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def banco_de_testes(tmp_path_factory):
+    """Banco sqlite temporário usado por toda a sessão de testes, uma cópia do banco modelo por trabalhador"""
+    trabalhador = os.environ.get('PYTEST_XDIST_WORKER')
+    # com o xdist, cada trabalhador tem o próprio basetemp dentro de um diretório comum a todos
+    raiz = tmp_path_factory.getbasetemp()
+    if trabalhador is not None:
+        raiz = raiz.parent
+    modelo = raiz / 'picoles_modelo.sqlite'
+    if not modelo.exists():
+        _criar_modelo(modelo)
+
+    db_path = tmp_path_factory.mktemp('db') / f'picoles_{trabalhador or "testes"}.sqlite'
+    _clonar_banco(modelo, db_path)
+    os.environ['PICOLES_DB_PATH'] = str(db_path)
+    disposeEngine()
+    createEngine(sqlite=True)
+    yield str(db_path)
+    disposeEngine()
+    os.environ.pop('PICOLES_DB_PATH', None)
+
+
+@pytest.fixture(autouse=True)
+def transacao_desfeita(request, banco_de_testes):
+    """Roda o teste em uma transação desfeita ao final, exceto nos marcados com sem_transacao"""
+    if request.node.get_closest_marker('sem_transacao') is not None:
+        yield None
+        return
+    with savepointConnection() as conexao:
+        transacao = conexao.begin()
+        session = Session(bind=conexao, expire_on_commit=False)
+        try:
+            with ambientSession(session, savepoint=True):
+                yield session
+        finally:
+            session.close()
+            transacao.rollback()
+
+
+@pytest.fixture
+def banco_temporario(tmp_path, banco_de_testes):
+    """Aponta a camada de acesso para um banco novo e vazio durante o teste, para testes que recriam o esquema. Use
+    junto com a marca sem_transacao. Ao final, volta ao banco de testes.
+    """
+    disposeEngine()
+    engine = createEngine(sqlite=True, db_path=str(tmp_path / 'picoles.sqlite'))
+    yield engine
+    disposeEngine()
+    createEngine(sqlite=True, db_path=banco_de_testes)
+
+
+@pytest.fixture
+def contar_consultas():
+    """Devolve conf.guarda_consultas.contarConsultas, para limitar os comandos SQL de um trecho do teste:
+
+        def test_exemplo(contar_consultas):
+            with contar_consultas(maximo=1, falhar_em_n_mais_1=True):
+                Sabor.selectSaborPorId(id=1)
+    """
+    return contarConsultas
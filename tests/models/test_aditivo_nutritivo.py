@@ -32,6 +32,7 @@ def test_inserir_aditivo_nutritivo():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    AditivoNutritivo.insertAditivoNutritivo(nome='VITAMIna D', formula_quimica='C27H44O')
     nome = 'VITAMIna D'
     formula_quimica = 'dsajfaljf4517194781324290840faskdfkahf982389374918'  # formula quimica invalida
     with pytest.raises(RuntimeError) as exc_info:
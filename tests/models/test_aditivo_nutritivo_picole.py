@@ -23,6 +23,8 @@ def test_inserir_aditivo_nutritivo():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    AditivoNutritivoPicole.insertAditivoNutritivoPicole(picole_fk=picole_fk,
+                                                        aditivo_nutritivo_fk=aditivo_nutritivo_fk)
     with pytest.raises(RuntimeError) as exc_info:
         AditivoNutritivoPicole.insertAditivoNutritivoPicole(picole_fk=picole_fk,
                                                             aditivo_nutritivo_fk=aditivo_nutritivo_fk)
@@ -57,6 +59,8 @@ def test_tipo_dados_incorretos():
 
 # teste inserir combinação de picole_fk e aditivo_nutritivo_fk que já existe
 def test_inserir_aditivo_nutritivo_combinacao_existente():
+    AditivoNutritivoPicole.insertAditivoNutritivoPicole(picole_fk=1,
+                                                        aditivo_nutritivo_fk=1)
     with pytest.raises(RuntimeError) as exc_info:
         AditivoNutritivoPicole.insertAditivoNutritivoPicole(picole_fk=1,
                                                             aditivo_nutritivo_fk=1)
@@ -28,6 +28,7 @@ def test_inserir_conservante():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    Conservante.insertConservante(nome=nome, descricao=descricao)
     with pytest.raises(RuntimeError) as exc_info:
         Conservante.insertConservante(nome=nome, descricao=descricao)
     assert f"Já existe um Conservante com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
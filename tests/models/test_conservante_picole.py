@@ -22,6 +22,7 @@ def test_inserir_conservante_picole():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    ConservantePicole.insertConservantePicole(picole_fk=picole_fk, conservante_fk=conservante_fk)
     with pytest.raises(RuntimeError) as exc_info:
         ConservantePicole.insertConservantePicole(picole_fk=picole_fk, conservante_fk=conservante_fk)
     assert 'Já existe um ConservantePicole com a mesma combinação de picole_fk e conservante_fk' in str(exc_info.value)
@@ -51,6 +52,7 @@ def test_tipo_dados_incorretos():
 
 # teste inserir combinação de picole_fk e conservante_fk que já existe
 def test_inserir_conservante_picole_combinacao_existente():
+    ConservantePicole.insertConservantePicole(picole_fk=1, conservante_fk=1)
     with pytest.raises(RuntimeError) as exc_info:
         ConservantePicole.insertConservantePicole(picole_fk=1, conservante_fk=1)
     assert (f"Já existe um ConservantePicole com a mesma combinação de picole_fk e conservante_fk: {picole_fk=} | "
@@ -1,15 +1,26 @@
 import pytest
-from conf.db_session import createEngine, createTables
+import sqlalchemy as sa
+from conf.db_session import createEngine, createTables, unitOfWork
+from models.lote import Lote
+from models.lote_nota_fiscal import LoteNotaFiscal
+from models.nota_fiscal import NotaFiscal
+from models.picole import Picole
+from models.revendedor import Revendedor
+from models.sabor import Sabor
+from models.tipo_embalagem import TipoEmbalagem
+from models.tipo_picole import TipoPicole
 from sqlalchemy import inspect
 from sqlalchemy.engine.base import Engine
 
+# createTables apaga e recria as tabelas, então estes testes usam um banco próprio, fora da transação dos demais
+pytestmark = pytest.mark.sem_transacao
+
 
 @pytest.mark.order(1)
-@pytest.fixture(scope="module")
-def engine():
+@pytest.fixture
+def engine(banco_temporario):
     engine = createEngine(sqlite=True)  # SQLite engine for testing
     yield engine
-    engine.dispose()  # Close the connection after the test module finishes
 
 
 def test_create_engine():
@@ -45,5 +56,56 @@ def test_create_tables(engine):
     assert 'tipo_picole' in tables
 
 
+@pytest.fixture
+def commits(engine):
+    createTables(sqlite=True)
+    contagem = []
+
+    def _contar(conexao):
+        contagem.append(conexao)
+
+    sa.event.listen(engine, 'commit', _contar)
+    yield contagem
+    sa.event.remove(engine, 'commit', _contar)
+
+
+# Teste da unidade de trabalho: a nota, os lotes e os vínculos são gravados em uma única transação
+def test_unit_of_work_confirma_uma_vez(commits):
+    with unitOfWork():
+        sabor = Sabor.insertSabor(nome='sabor uow')
+        embalagem = TipoEmbalagem.insertTipoEmbalagem(nome='embalagem uow')
+        tipo = TipoPicole.insertTipoPicole(nome='tipo uow')
+        picole = Picole.insertPicole(preco=2.5, sabor_fk=sabor.id, tipo_embalagem_fk=embalagem.id,
+                                     tipo_picole_fk=tipo.id)
+        revendedor = Revendedor.insertRevendedor(nome='rev', cnpj='11222333000181', razao_social='rev ltda',
+                                                 contato='contato')
+        nota = NotaFiscal.insertNotaFiscal(valor=30.0, numero_serie='NS-UOW', descricao='nota',
+                                           revendedor_fk=revendedor.id)
+        for _ in range(3):
+            lote = Lote.insertLote(picole_fk=picole.id, quantidade=10)
+            with unitOfWork():
+                LoteNotaFiscal.insertLoteNotaFiscal(nota_fiscal_fk=nota.id, lote_fk=lote.id)
+        assert commits == []
+    assert len(commits) == 1
+    assert len(LoteNotaFiscal.selectAllLoteNotaFiscal()) == 3
+
+
+# Teste de atomicidade: uma exceção no bloco desfaz tudo, e um método que falha desfaz apenas o que ele fez, sem
+# invalidar a unidade
+def test_unit_of_work_atomica(commits):
+    with pytest.raises(RuntimeError):
+        with unitOfWork():
+            Sabor.insertSabor(nome='desfeito')
+            raise RuntimeError('falha no meio da unidade')
+    assert Sabor.selectAllSabores() == []
+
+    with unitOfWork():
+        assert Sabor.insertSabor(nome='repetido') is not None
+        with pytest.raises(RuntimeError):
+            Sabor.insertSabor(nome='repetido')
+        assert Sabor.insertSabor(nome='outro') is not None
+    assert sorted(sabor.nome for sabor in Sabor.selectAllSabores()) == ['OUTRO', 'REPETIDO']
+
+
 if __name__ == '__main__':
     pytest.main()
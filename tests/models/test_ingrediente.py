@@ -27,6 +27,7 @@ def test_inserir_ingrediente():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    Ingrediente.insertIngrediente(nome=nome)
     with pytest.raises(RuntimeError) as exc_info:
         Ingrediente.insertIngrediente(nome=nome)
     assert f"Já existe um Ingrediente com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
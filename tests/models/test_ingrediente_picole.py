@@ -22,6 +22,7 @@ def test_inserir_ingrediente_picole():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    IngredientePicole.insertIngredientePicole(picole_fk=picole_fk, ingrediente_fk=ingrediente_fk)
     with pytest.raises(RuntimeError) as exc_info:
         IngredientePicole.insertIngredientePicole(picole_fk=picole_fk, ingrediente_fk=ingrediente_fk)
     assert 'Já existe um IngredientePicole com a mesma combinação de picole_fk e ingrediente_fk' in str(exc_info.value)
@@ -51,6 +52,7 @@ def test_tipo_dados_incorretos():
 
 # teste inserir combinação de picole_fk e ingrediente_fk já existente
 def test_inserir_ingrediente_picole_combinacao_existente():
+    IngredientePicole.insertIngredientePicole(picole_fk=picole_fk, ingrediente_fk=ingrediente_fk)
     with pytest.raises(RuntimeError) as exc_info:
         IngredientePicole.insertIngredientePicole(picole_fk=picole_fk, ingrediente_fk=ingrediente_fk)
     assert f'Já existe um IngredientePicole com a mesma combinação de picole_fk e ingrediente_fk: {picole_fk=} | {ingrediente_fk=}' in str(
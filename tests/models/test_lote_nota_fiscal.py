@@ -1,5 +1,7 @@
 import pytest
+from models.lote import Lote
 from models.lote_nota_fiscal import LoteNotaFiscal
+from models.nota_fiscal import NotaFiscal
 
 
 # @pytest.fixture
@@ -31,6 +33,7 @@ def test_inserir_lote_nota_fiscal():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    LoteNotaFiscal.insertLoteNotaFiscal(nota_fiscal_fk=nota_fiscal_fk, lote_fk=lote_fk)
     with pytest.raises(RuntimeError) as exc_info:
         LoteNotaFiscal.insertLoteNotaFiscal(nota_fiscal_fk=nota_fiscal_fk, lote_fk=lote_fk)
     assert (f"Já existe um LoteNotaFiscal com a mesma combinação de lote e nota fiscal: "
@@ -57,5 +60,55 @@ def test_fk_nao_existe():
     assert f"Verifique se as FKs fornecidas existem: {nota_fiscal_fk=} | {lote_fk=}" in str(exc_info.value)
 
 
+def _novos_lotes(quantidade):
+    return [Lote.insertLote(picole_fk=1, quantidade=10).id for _ in range(quantidade)]
+
+
+# Teste de emissão de uma nota fiscal com os seus lotes
+def test_emitir_nota_fiscal(contar_consultas):
+    lotes = _novos_lotes(3)
+    with contar_consultas(maximo=3):
+        id_nota = LoteNotaFiscal.emitirNotaFiscal(valor=10.456, numero_serie=' ns-emitida ', descricao='nota',
+                                                  revendedor_fk=1, lotes_fk=lotes)
+    vinculos = LoteNotaFiscal.selectAllLoteNotaFiscalPorNotaFiscal(nota_fiscal_fk=id_nota)
+    assert sorted(vinculo.lote_fk for vinculo in vinculos) == lotes
+    assert vinculos[0].nota_fiscal.numero_serie == 'NS-EMITIDA' and vinculos[0].nota_fiscal.valor == 10.46
+
+
+# Teste de emissão em lote: o número de comandos não depende da quantidade de notas
+def test_emitir_notas_fiscais_em_lote(contar_consultas):
+    lotes = _novos_lotes(200)
+    notas = [{'valor': 1.0, 'numero_serie': f'NS-LOTE-{i}', 'descricao': 'nota', 'revendedor_fk': 1,
+              'lotes_fk': lotes[2 * i:2 * i + 2]} for i in range(100)]
+    with contar_consultas(maximo=4):
+        ids = LoteNotaFiscal.emitirNotasFiscais(notas)
+    assert len(set(ids)) == 100
+    assert [vinculo.lote_fk for vinculo in LoteNotaFiscal.selectAllLoteNotaFiscalPorNotaFiscal(ids[7])] == \
+        lotes[14:16]
+
+
+# Teste da validação antes da gravação: nada é emitido se algum lote já estiver em outra nota ou não existir
+def test_emitir_nota_fiscal_invalida():
+    lote_livre, lote_usado = _novos_lotes(2)
+    LoteNotaFiscal.emitirNotaFiscal(valor=1.0, numero_serie='NS-USADA', descricao='nota', revendedor_fk=1,
+                                    lotes_fk=[lote_usado])
+    with pytest.raises(RuntimeError) as exc_info:
+        LoteNotaFiscal.emitirNotasFiscais([
+            {'valor': 1.0, 'numero_serie': 'NS-NOVA', 'descricao': 'nota', 'revendedor_fk': 1,
+             'lotes_fk': [lote_livre, lote_usado, 9999]},
+            {'valor': 1.0, 'numero_serie': 'ns-usada', 'descricao': 'nota', 'revendedor_fk': 9999,
+             'lotes_fk': [lote_livre]}])
+    mensagem = str(exc_info.value)
+    assert f'lotes em mais de uma nota: [{lote_livre}]' in mensagem
+    assert 'revendedores não encontrados: [9999]' in mensagem and 'lotes não encontrados: [9999]' in mensagem
+    assert f'lotes já vinculados a outra nota fiscal: [{lote_usado}]' in mensagem
+    assert "números de série já cadastrados: ['NS-USADA']" in mensagem
+    assert NotaFiscal.selectNotaFiscalPorNumeroSerie(numero_serie='NS-NOVA') is None
+
+    with pytest.raises(ValueError, match='lotes_fk da NotaFiscal não informados!'):
+        LoteNotaFiscal.emitirNotaFiscal(valor=1.0, numero_serie='NS-X', descricao='nota', revendedor_fk=1,
+                                        lotes_fk=[])
+
+
 if __name__ == '__main__':
     pytest.main()
@@ -0,0 +1,41 @@
+import pytest
+from models.picole import Picole
+from models.sabor import Sabor
+from models.tipo_picole import TipoPicole
+
+
+def _picoles_do_tipo(precos):
+    tipo = TipoPicole.insertTipoPicole(nome='Tipo contagem')
+    for i, preco in enumerate(precos):
+        sabor = Sabor.insertSabor(nome=f'Sabor contagem {i}')
+        Picole.insertPicole(preco=preco, sabor_fk=sabor.id, tipo_embalagem_fk=1, tipo_picole_fk=tipo.id)
+    return tipo.id
+
+
+# Teste das contagens: um comando por chamada, sem montar os objetos
+def test_count_exists(contar_consultas):
+    tipo = _picoles_do_tipo([1.5, 2.5, 2.5])
+    with contar_consultas(maximo=4):
+        assert Picole.count(tipo_picole_fk=tipo) == 3
+        assert Picole.count(tipo_picole_fk=tipo, preco=[2.5, 9.9]) == 2
+        assert Picole.exists(tipo_picole_fk=tipo, preco=1.5) is True
+        assert Picole.exists(tipo_picole_fk=tipo, preco=9.9) is False
+    assert Picole.count() == len(Picole.selectAllPicoles())
+    assert Sabor.exists(nome='SABOR CONTAGEM 0') and not Sabor.exists(nome='Sabor inexistente')
+
+
+def test_count_by():
+    tipo = _picoles_do_tipo([1.5, 2.5, 2.5])
+    assert Picole.countBy('preco', tipo_picole_fk=tipo) == {1.5: 1, 2.5: 2}
+    assert Picole.countBy(Picole.tipo_picole_fk)[tipo] == 3
+    assert Picole.countBy('tipo_picole_fk', tipo_picole_fk=-1) == {}
+
+
+def test_coluna_inexistente():
+    with pytest.raises(ValueError) as exc_info1:
+        Picole.count(sabor=1)
+    assert 'Coluna sabor não encontrada em Picole!' in str(exc_info1.value)
+
+    with pytest.raises(ValueError) as exc_info2:
+        Sabor.countBy('cor')
+    assert 'Coluna cor não encontrada em Sabor!' in str(exc_info2.value)
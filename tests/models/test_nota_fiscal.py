@@ -37,6 +37,8 @@ def test_inserir_nota_fiscal():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    NotaFiscal.insertNotaFiscal(valor=valor, numero_serie=numero_serie, descricao=descricao,
+                                revendedor_fk=revendedor_fk)
     with pytest.raises(RuntimeError) as exc_info:
         NotaFiscal.insertNotaFiscal(valor=valor, numero_serie=numero_serie, descricao=descricao,
                                     revendedor_fk=revendedor_fk)
@@ -1,5 +1,12 @@
+import math
+
 import pytest
+import sqlalchemy as sa
+from conf.db_session import createSession, createTables
+from models.model_base import ModelBase
 from models.picole import Picole
+from models.sabor import Sabor
+from models.tipo_picole import TipoPicole
 
 
 # @pytest.fixture
@@ -91,6 +98,8 @@ def test_fk_nao_existe():
 
 # verificar se combinação já existe
 def test_combinacao_ja_existe():
+    Picole.insertPicole(preco=preco, sabor_fk=sabor_fk, tipo_embalagem_fk=tipo_embalagem_fk,
+                 tipo_picole_fk=tipo_picole_fk)
     with pytest.raises(RuntimeError) as exc_info:
         Picole.insertPicole(preco=preco, sabor_fk=sabor_fk, tipo_embalagem_fk=tipo_embalagem_fk,
                      tipo_picole_fk=tipo_picole_fk)
@@ -98,5 +107,123 @@ def test_combinacao_ja_existe():
             in str(exc_info.value))
 
 
+def _picoles_com_composicao(session, quantidade):
+    """Insere os picolés com um ingrediente, um conservante e um aditivo cada, em comandos únicos por tabela"""
+    tabelas = ModelBase.metadata.tables
+    inicio = session.execute(sa.select(sa.func.max(tabelas['sabor'].c.id))).scalar() + 1
+    ids = list(range(inicio, inicio + quantidade))
+    session.execute(tabelas['sabor'].insert(), [{'id': id, 'nome': f'SABOR COMPOSICAO {id}'} for id in ids])
+    session.execute(tabelas['picole'].insert(), [
+        {'id': id, 'preco': preco, 'sabor_fk': id, 'tipo_embalagem_fk': tipo_embalagem_fk,
+         'tipo_picole_fk': tipo_picole_fk, 'sabor_tipoPicole_tipoEmbalagem': f'{id}_1_1'} for id in ids])
+    session.execute(tabelas['ingrediente_picole'].insert(), [
+        {'picole_fk': id, 'ingrediente_fk': 1, 'ingrediente_picole': f'1-{id}'} for id in ids])
+    session.execute(tabelas['conservante_picole'].insert(), [
+        {'picole_fk': id, 'conservante_fk': 1, 'conservante_picole': f'1-{id}'} for id in ids])
+    session.execute(tabelas['aditivo_nutritivo_picole'].insert(), [
+        {'picole_fk': id, 'aditivo_nutritivo_fk': 1, 'picole_aditivo_nutritivo': f'{id}-1'} for id in ids])
+    return ids
+
+
+# Teste da composição de vários picolés: uma consulta para os picolés e uma por coleção a cada bloco de 500 picolés
+@pytest.mark.parametrize('quantidade', [1, 20, 501])
+def test_select_composicao(transacao_desfeita, contar_consultas, quantidade):
+    ids = _picoles_com_composicao(transacao_desfeita, quantidade)
+    with contar_consultas(maximo=1 + 3 * math.ceil(quantidade / 500)) as contagem:
+        picoles = Picole.selectComposicao(list(reversed(ids)) + [999_999])
+        composicoes = [(picole.id, picole.sabor.nome,
+                        [item.ingrediente.nome for item in picole.ingredientes_picole],
+                        [item.conservante.nome for item in picole.conservantes_picole],
+                        [item.aditivo_nutritivo.nome for item in picole.aditivos_nutritivos_picole],
+                        picole.ingredientes_picole[0].picole is picole) for picole in picoles]
+    assert contagem.total == 1 + 3 * math.ceil(quantidade / 500)
+    assert [composicao[0] for composicao in composicoes] == list(reversed(ids))
+    assert all(len(ingredientes) == len(conservantes) == len(aditivos) == 1 and mesmo
+               for _, _, ingredientes, conservantes, aditivos, mesmo in composicoes)
+
+
+def test_select_composicao_tipo_incorreto():
+    assert Picole.selectComposicao([]) == []
+    with pytest.raises(TypeError) as exc_info:
+        Picole.selectComposicao(['1'])
+    assert 'ids dos Picoles devem ser uma lista de inteiros!' in str(exc_info.value)
+
+
+def _picoles_com_precos(precos):
+    tipo = TipoPicole.insertTipoPicole(nome='Tipo busca')
+    for i, preco_picole in enumerate(precos):
+        sabor = Sabor.insertSabor(nome=f'Sabor busca {i}')
+        Picole.insertPicole(preco=preco_picole, sabor_fk=sabor.id, tipo_embalagem_fk=tipo_embalagem_fk,
+                            tipo_picole_fk=tipo.id)
+    return tipo.id
+
+
+# Teste da busca combinando tipo, faixa de preço, ordem e limite em uma consulta
+def test_select_picoles(contar_consultas):
+    tipo = _picoles_com_precos([9.5, 3.25, 7.0, 1.5, 5.75, 3.25])
+    with contar_consultas(maximo=1):
+        baratos = Picole.selectPicoles(tipo_picole_fk=tipo, limite=3)
+    assert [picole.preco for picole in baratos] == [1.5, 3.25, 3.25]
+    assert baratos[1].id < baratos[2].id
+
+    faixa = Picole.selectPicoles(tipo_picole_fk=tipo, tipo_embalagem_fk=tipo_embalagem_fk, preco_min=3.25,
+                                 preco_max=7.0, ordem='-preco')
+    assert [picole.preco for picole in faixa] == [7.0, 5.75, 3.25, 3.25]
+    assert Picole.selectPicoles(sabor_fk=baratos[0].sabor_fk) == [baratos[0]]
+    assert Picole.selectPicoles(tipo_picole_fk=tipo, preco_min=100) == []
+
+
+# Teste do plano da busca: os mais baratos de um tipo são lidos do índice, sem ordenar em memória
+def test_select_picoles_usa_indice():
+    tipo = _picoles_com_precos([2.0, 1.0])
+    comandos = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append((statement, parameters))
+
+    sa.event.listen(sa.engine.Engine, 'before_cursor_execute', _capturar)
+    try:
+        Picole.selectPicoles(tipo_picole_fk=tipo, limite=10)
+    finally:
+        sa.event.remove(sa.engine.Engine, 'before_cursor_execute', _capturar)
+    statement, parameters = next(comando for comando in comandos if comando[0].startswith('SELECT'))
+    with createSession() as session:
+        plano = ' '.join(linha[-1] for linha in session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', parameters))
+    assert 'ix_picole_tipo_picole_preco' in plano and 'TEMP B-TREE' not in plano
+
+
+def test_select_picoles_parametros_incorretos():
+    with pytest.raises(TypeError) as exc_info1:
+        Picole.selectPicoles(tipo_picole_fk='1')
+    assert 'tipo_picole_fk do Picole deve ser um inteiro!' in str(exc_info1.value)
+
+    with pytest.raises(TypeError) as exc_info2:
+        Picole.selectPicoles(preco_min='1')
+    assert 'preco_min do Picole deve ser numérico!' in str(exc_info2.value)
+
+    with pytest.raises(ValueError) as exc_info3:
+        Picole.selectPicoles(ordem='sabor')
+    assert 'ordem sabor não suportada, use preco ou -preco!' in str(exc_info3.value)
+
+    with pytest.raises(ValueError) as exc_info4:
+        Picole.selectPicoles(preco_min=5, preco_max=1)
+    assert 'preco_min não pode ser maior que preco_max!' in str(exc_info4.value)
+
+
+# Teste de criação dos índices da busca em um banco criado antes deles
+@pytest.mark.sem_transacao
+def test_criar_indices_picole(banco_temporario):
+    createTables(sqlite=True)
+    with banco_temporario.begin() as conexao:
+        for indice in Picole.__table__.indexes:
+            conexao.exec_driver_sql(f'DROP INDEX {indice.name}')
+
+    nomes = Picole.criarIndicesPicole()
+    assert Picole.criarIndicesPicole() == nomes
+    assert nomes == ['ix_picole_sabor_preco', 'ix_picole_tipo_embalagem_preco', 'ix_picole_tipo_picole_preco']
+    assert sorted(indice['name'] for indice in sa.inspect(banco_temporario).get_indexes('picole')) == nomes
+
+
 if __name__ == '__main__':
     pytest.main()
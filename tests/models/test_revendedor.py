@@ -30,6 +30,7 @@ def test_inserir_revendedor():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    Revendedor.insertRevendedor(nome=nome, cnpj=cnpj, razao_social=razao_social, contato=contato)
     with pytest.raises(RuntimeError) as exc_info:
         Revendedor.insertRevendedor(nome=nome, cnpj=cnpj, razao_social=razao_social, contato=contato)
     assert f"Já existe um Revendedor com o CNPJ '{cnpj}' cadastrado." in str(exc_info.value)
@@ -27,6 +27,7 @@ def test_inserir_sabor():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    Sabor.insertSabor(nome=nome)
     with pytest.raises(RuntimeError) as exc_info:
         Sabor.insertSabor(nome=nome)
     assert f"Já existe um Sabor com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
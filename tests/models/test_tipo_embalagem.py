@@ -27,6 +27,7 @@ def test_inserir_tipo_embalagem():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    TipoEmbalagem.insertTipoEmbalagem(nome=nome)
     with pytest.raises(RuntimeError) as exc_info:
         TipoEmbalagem.insertTipoEmbalagem(nome=nome)
     assert f"Já existe um TipoEmbalagem com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
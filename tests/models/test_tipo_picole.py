@@ -26,6 +26,7 @@ def test_inserir_tipo_picole():
 
 # Teste de erro de integridade ao tentar inserir o mesmo registro duas vezes
 def test_erro_integridade_mesma_combinacao():
+    TipoPicole.insertTipoPicole(nome=nome)
     with pytest.raises(RuntimeError) as exc_info:
         TipoPicole.insertTipoPicole(nome=nome)
     assert f"Já existe um TipoPicole com o nome '{nome.upper()}' cadastrado" in str(exc_info.value)
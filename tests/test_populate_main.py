@@ -0,0 +1,130 @@
+import pytest
+import sqlalchemy as sa
+from conf.db_session import createTables
+from conf.helpers import gerar_int
+from models.controle_carga import ControleCarga
+from models.model_base import ModelBase
+from models.sabor import Sabor
+from populate_main import POPULADORES, CargaEmLotes, _caminho_critico, popular, populate_sabor
+from ScriptsAuxiliares.DataBaseFeatures import DataBaseFeatures
+
+QUANTIDADE = 4
+
+
+def _contar(engine, tabela):
+    with engine.connect() as conexao:
+        return conexao.execute(sa.select(sa.func.count()).select_from(ModelBase.metadata.tables[tabela])).scalar()
+
+
+# Teste da ordem dos estágios: nenhuma tabela fica em um estágio anterior ao de uma tabela que ela referencia
+def test_estagios_em_ordem_topologica():
+    dependencias = DataBaseFeatures.getDependenciasFk()
+    estagios = DataBaseFeatures.getEstagiosFk()
+    posicao = {tabela: indice for indice, estagio in enumerate(estagios) for tabela in estagio}
+    assert sorted(posicao) == sorted(dependencias)
+    for tabela, referenciadas in dependencias.items():
+        assert all(posicao[referenciada] < posicao[tabela] for referenciada in referenciadas), tabela
+    assert posicao['picole'] > posicao['sabor'] and posicao['lote_nota_fiscal'] > posicao['lote']
+
+
+def test_estagios_dependencia_circular():
+    with pytest.raises(RuntimeError) as exc_info:
+        DataBaseFeatures.getEstagiosFk(dependencias={'a': set(), 'b': {'c'}, 'c': {'b'}})
+    assert "Dependência circular entre as tabelas: ['b', 'c']" in str(exc_info.value)
+
+
+# Teste do caminho crítico em um grafo montado à mão: a cadeia com a maior soma de durações
+def test_caminho_critico():
+    dependencias = {'a': set(), 'b': set(), 'c': {'a'}, 'd': {'a', 'b'}, 'e': {'c', 'd'}}
+    duracoes = {'a': 1.0, 'b': 3.0, 'c': 5.0, 'd': 1.0, 'e': 2.0}
+    tempos = {tabela: {'inicio': 0.0, 'fim': duracao, 'duracao': duracao} for tabela, duracao in duracoes.items()}
+    assert _caminho_critico(dependencias, tempos) == (['a', 'c', 'e'], 8.0)
+
+    tempos['b']['duracao'] = 7.0
+    assert _caminho_critico(dependencias, tempos) == (['b', 'd', 'e'], 10.0)
+
+
+# Teste da população paralela: todas as tabelas são carregadas, cada uma só depois das que ela referencia
+@pytest.mark.sem_transacao
+def test_popular_paralelo(banco_temporario):
+    createTables(sqlite=True)
+    tempos = popular(paralelo=True, quantidade=QUANTIDADE)
+
+    assert sorted(tempos) == sorted(POPULADORES)
+    assert all(_contar(banco_temporario, tabela) > 0 for tabela in POPULADORES)
+    dependencias = DataBaseFeatures.getDependenciasFk()
+    for tabela, tempo in tempos.items():
+        assert all(tempo['inicio'] >= tempos[referenciada]['fim']
+                   for referenciada in dependencias[tabela] if referenciada in tempos), tabela
+
+
+# Teste do checkpoint: cada lote é confirmado na mesma transação do seu checkpoint, e um lote que falha não avança
+# nem as linhas nem o checkpoint
+@pytest.mark.sem_transacao
+def test_checkpoint_na_transacao_do_lote(banco_temporario):
+    createTables(sqlite=True)
+    carga = CargaEmLotes(tabela='sabor', quantidade=6, tamanho_lote=2)
+    for linha in carga.pendentes():
+        if linha > 4:
+            break
+        carga.adicionar(linha=linha, objeto=Sabor(nome=f'SABOR LOTE {linha}'))
+        assert ControleCarga.selectLinhasConfirmadas('sabor') == _contar(banco_temporario, 'sabor')
+    assert carga.confirmadas == 4
+
+    carga.adicionar(linha=5, objeto=Sabor(nome='SABOR LOTE 1'))
+    with pytest.raises(Exception):
+        carga.finalizar()
+    assert ControleCarga.selectLinhasConfirmadas('sabor') == 4
+    assert _contar(banco_temporario, 'sabor') == 4
+
+
+# Teste da retomada: uma carga interrompida continua do último lote confirmado, sem duplicar linhas
+@pytest.mark.sem_transacao
+def test_retomar_carga_interrompida(banco_temporario):
+    createTables(sqlite=True)
+    carga = CargaEmLotes(tabela='sabor', quantidade=6, tamanho_lote=2)
+    for linha in range(1, 6):
+        carga.adicionar(linha=linha, objeto=Sabor(nome=f'SABOR INTERROMPIDO {linha}'))
+    # a linha 5 ficou no lote que não foi confirmado antes da interrupção
+    assert _contar(banco_temporario, 'sabor') == 4
+
+    retomada = CargaEmLotes(tabela='sabor', quantidade=6, tamanho_lote=2)
+    assert retomada.confirmadas == 4
+    assert retomada.pendentes() == range(5, 7)
+
+    populate_sabor(quantidade=6, tamanho_lote=2)
+    assert _contar(banco_temporario, 'sabor') == 6
+    assert ControleCarga.selectLinhasConfirmadas('sabor') == 6
+
+
+# Teste do reiniciar: popular(reiniciar=True) descarta os checkpoints e recarrega as tabelas já concluídas
+@pytest.mark.sem_transacao
+def test_popular_reiniciar(banco_temporario):
+    createTables(sqlite=True)
+    with banco_temporario.begin() as conexao:
+        conexao.execute(sa.insert(ControleCarga.__table__), [
+            {'nome_carga': tabela, 'linhas_confirmadas': QUANTIDADE, 'total_linhas': QUANTIDADE, 'concluida': True}
+            for tabela in POPULADORES])
+
+    popular(quantidade=QUANTIDADE)
+    assert all(_contar(banco_temporario, tabela) == 0 for tabela in POPULADORES)
+
+    popular(quantidade=QUANTIDADE, reiniciar=True)
+    assert all(_contar(banco_temporario, tabela) > 0 for tabela in POPULADORES)
+    assert all(ControleCarga.selectLinhasConfirmadas(tabela) == QUANTIDADE for tabela in POPULADORES)
+    assert ControleCarga.deleteControleCarga('sabor') == 1
+    assert ControleCarga.selectLinhasConfirmadas('sabor') == 0
+
+
+# Teste das FKs: gerar_int(maximo=quantidade) mantém as chaves estrangeiras dentro das linhas carregadas
+@pytest.mark.sem_transacao
+def test_fks_dentro_da_quantidade(banco_temporario):
+    assert all(1 <= gerar_int(maximo=3) <= 3 for _ in range(200))
+
+    createTables(sqlite=True)
+    popular(quantidade=QUANTIDADE)
+    for tabela in POPULADORES:
+        for chave in ModelBase.metadata.tables[tabela].foreign_keys:
+            with banco_temporario.connect() as conexao:
+                maior = conexao.execute(sa.select(sa.func.max(chave.parent))).scalar()
+            assert 1 <= maior <= QUANTIDADE, chave.parent